@@ -4,15 +4,17 @@ import argparse
 import copy
 import json
 import os
+import signal
+import sys
 
-from tools.exceptions import ValidationError, PushoverNotificationError, TelegramNotificationError
-from tools.its import ImpfterminService
+from tools.abbruch import Abbruch
+from tools.exceptions import Abgebrochen, ValidationError, PushoverNotificationError, TelegramNotificationError
 from tools.kontaktdaten import decode_wochentag, encode_wochentag, get_kontaktdaten, \
     validate_kontaktdaten, validate_datum
+from tools.pinquelle import pinquelle_erstellen
 from tools.utils import create_missing_dirs, get_current_version, \
     get_latest_version, pushover_validation, remove_prefix, \
     telegram_validation, unique, update_available
-from tools.chromium_downloader import check_chromium, download_chromium, check_webdriver, download_webdriver, current_platform
 
 PATH = os.path.dirname(os.path.realpath(__file__))
 
@@ -240,7 +242,7 @@ def input_kontaktdaten_key(
             print(f"\n{str(exc)}\n")
 
 
-def run_search_interactive(kontaktdaten_path, configure_notifications, check_delay):
+def run_search_interactive(kontaktdaten_path, configure_notifications, check_delay, backoff=None):
     """
     Interaktives Setup für die Terminsuche:
     1. Ggf. zuerst Eingabe, ob Kontaktdaten aus kontaktdaten.json geladen
@@ -252,6 +254,7 @@ def run_search_interactive(kontaktdaten_path, configure_notifications, check_del
 
     :param kontaktdaten_path: Pfad zur JSON-Datei mit Kontaktdaten. Default: data/kontaktdaten.json im aktuellen Ordner
     :param configure_notifications: Wird durchgereicht zu update_kontaktdaten_interactive()
+    :param backoff: Wird durchgereicht zu run_search()
     """
 
     print(
@@ -269,14 +272,18 @@ def run_search_interactive(kontaktdaten_path, configure_notifications, check_del
     print()
     kontaktdaten = update_kontaktdaten_interactive(
         kontaktdaten, "search", configure_notifications, kontaktdaten_path)
-    return run_search(kontaktdaten, check_delay)
+    return run_search(kontaktdaten, check_delay, kontaktdaten_path, backoff)
 
 
-def run_search(kontaktdaten, check_delay):
+def run_search(kontaktdaten, check_delay, kontaktdaten_path=None, backoff=None):
     """
     Nicht-interaktive Terminsuche
 
     :param kontaktdaten: Dictionary mit Kontaktdaten
+    :param kontaktdaten_path: Pfad zur JSON-Datei mit Kontaktdaten. Falls
+        angegeben, werden Änderungen an der Datei während der Suche übernommen.
+    :param backoff: Einstellungen für Wiederholungen nach Fehlern von der
+        Kommandozeile, überschreiben den Abschnitt "backoff" der Kontaktdaten
     """
 
     try:
@@ -298,23 +305,37 @@ def run_search(kontaktdaten, check_delay):
         notifications = kontaktdaten.get("notifications", {})
 
         zeitrahmen = kontaktdaten["zeitrahmen"]
+
+        backoff = {**kontaktdaten.get("backoff", {}), **(backoff or {})}
     except KeyError as exc:
         raise ValueError(
             "Kontaktdaten konnten nicht aus 'kontaktdaten.json' geladen werden.\n"
             "Bitte überprüfe, ob sie im korrekten JSON-Format sind oder gebe "
             "deine Daten beim Programmstart erneut ein.\n") from exc
 
-    ImpfterminService.terminsuche(
-        codes=codes,
-        plz_impfzentren=plz_impfzentren,
-        kontakt=kontakt,
-        notifications=notifications,
-        zeitrahmen=zeitrahmen,
-        check_delay=check_delay,
-        PATH=PATH)
-
+    from tools.its import ImpfterminService
 
-def gen_code_interactive(kontaktdaten_path):
+    # Bei SIGTERM, z. B. durch systemd oder docker stop, die Suche beenden
+    # und den Browser schließen
+    abbruch = Abbruch()
+    abbruch.bei_signal(signal.SIGTERM)
+    try:
+        ImpfterminService.terminsuche(
+            codes=codes,
+            plz_impfzentren=plz_impfzentren,
+            kontakt=kontakt,
+            notifications=notifications,
+            zeitrahmen=zeitrahmen,
+            check_delay=check_delay,
+            PATH=PATH,
+            kontaktdaten_pfad=kontaktdaten_path,
+            backoff=backoff,
+            abbruch=abbruch)
+    except Abgebrochen as exc:
+        print(f"\nSuche beendet: {exc}")
+
+
+def gen_code_interactive(kontaktdaten_path, pin_source=None):
     """
     Interaktives Setup für die Codegenerierung:
     1. Ggf. zuerst Eingabe, ob Kontaktdaten aus kontaktdaten.json geladen
@@ -325,6 +346,7 @@ def gen_code_interactive(kontaktdaten_path):
     4. Codegenerierung
 
     :param kontaktdaten_path: Pfad zur JSON-Datei mit Kontaktdaten. Default: kontaktdaten.json im aktuellen Ordner
+    :param pin_source: Quelle für den SMS-Code zusätzlich zum Browser, siehe gen_code
     """
 
     print(
@@ -343,14 +365,16 @@ def gen_code_interactive(kontaktdaten_path):
     print()
     kontaktdaten = update_kontaktdaten_interactive(
         kontaktdaten, "code", False, kontaktdaten_path)
-    return gen_code(kontaktdaten)
+    return gen_code(kontaktdaten, pin_source=pin_source)
 
 
-def gen_code(kontaktdaten):
+def gen_code(kontaktdaten, pin_source=None):
     """
     Codegenerierung ohne interaktive Eingabe der Kontaktdaten
 
     :param kontaktdaten: Dictionary mit Kontaktdaten
+    :param pin_source: Quelle für den SMS-Code zusätzlich zum Browser, siehe
+        tools.pinquelle.pinquelle_erstellen. Default: Terminal, falls vorhanden
     """
 
     try:
@@ -365,12 +389,16 @@ def gen_code(kontaktdaten):
             "Bitte überprüfe, ob sie im korrekten JSON-Format sind oder gebe "
             "deine Daten beim Programmstart erneut ein.\n") from exc
 
-    its = ImpfterminService([], {}, PATH)
+    from tools.its import ImpfterminService
+
+    abbruch = Abbruch()
+    abbruch.bei_signal(signal.SIGTERM)
+    its = ImpfterminService([], {}, PATH, abbruch=abbruch)
 
-    # Einmal Chrome starten, um früh einen Fehler zu erzeugen, falls die
-    # erforderliche Software nicht installiert ist.
+    # Früh einen Fehler erzeugen, falls die erforderliche Software nicht
+    # installiert ist.
     its.log.info("Prüfen von Chromium und Chromedriver")
-    its.get_chromedriver(headless=True).quit()
+    its.browser_pruefen()
 
     print("\nBitte trage nachfolgend dein Geburtsdatum im Format DD.MM.YYYY ein.\n"
           "Beispiel: 02.03.1982\n")
@@ -383,27 +411,54 @@ def gen_code(kontaktdaten):
             print("Das Datum entspricht nicht dem richtigen Format (DD.MM.YYYY). "
                   "Bitte erneut versuchen.")
 
+    if pin_source is None:
+        pin_source = "stdin" if sys.stdin.isatty() else "browser"
+    pin_quelle = pinquelle_erstellen(pin_source, log=its.log, abbruch=its.abbruch)
+
     # code anfordern via selenium
     try:
-        if its.selenium_code_anfordern(mail, telefonnummer, plz_impfzentrum, geburtsdatum):
+        if its.selenium_code_anfordern(mail, telefonnummer, plz_impfzentrum, geburtsdatum,
+                                       pin_quelle=pin_quelle):
             return True
     except RuntimeError as exc:
         print(
             f"\nDie Code-Generierung war leider nicht erfolgreich:\n{str(exc)}")
         return False
+    except Abgebrochen as exc:
+        print(f"\nCode-Generierung beendet: {exc}")
+        return False
+    finally:
+        if pin_quelle is not None:
+            pin_quelle.schliessen()
 
     print("Die Code-Generierung war leider nicht erfolgreich.")
     return False
 
 
+def backoff_aus_args(args):
+    """
+    :return: Auf der Kommandozeile gesetzte Einstellungen für Wiederholungen
+        nach Fehlern im Format des Abschnitts "backoff" der Kontaktdaten
+    """
+
+    backoff = {}
+    if getattr(args, "backoff_max_sec", None) is not None:
+        backoff["maximum"] = args.backoff_max_sec
+    if getattr(args, "backoff_threshold", None) is not None:
+        backoff["schwelle"] = args.backoff_threshold
+    return backoff
+
+
 def subcommand_search(args):
     if args.configure_only:
         update_kontaktdaten_interactive(
             get_kontaktdaten(args.file), "search", args.configure_notifications, args.file)
     elif args.read_only:
-        run_search(get_kontaktdaten(args.file), check_delay=args.retry_sec)
+        run_search(get_kontaktdaten(args.file), check_delay=args.retry_sec, kontaktdaten_path=args.file,
+                   backoff=backoff_aus_args(args))
     else:
-        run_search_interactive(args.file, args.configure_notifications, check_delay=args.retry_sec)
+        run_search_interactive(args.file, args.configure_notifications, check_delay=args.retry_sec,
+                               backoff=backoff_aus_args(args))
 
 
 def subcommand_code(args):
@@ -411,22 +466,22 @@ def subcommand_code(args):
         update_kontaktdaten_interactive(
             get_kontaktdaten(args.file), "code", args.configure_notifications, args.file)
     elif args.read_only:
-        gen_code(get_kontaktdaten(args.file))
+        gen_code(get_kontaktdaten(args.file), pin_source=args.pin_source)
     else:
-        gen_code_interactive(args.file)
+        gen_code_interactive(args.file, pin_source=args.pin_source)
 
 
 def subcommand_install_chromium():
+    from tools.chromium_downloader import check_chromium, current_platform, download_missing
+
     # Mac_Arm currently not working
     if current_platform() == 'mac-arm':
         print('Zur Zeit kann keine eigene Chromium Instanz auf einem Mac M1 installiert werden.')
     else:
-        if not check_chromium():
-            download_chromium()
-        else:
+        if check_chromium():
             print('Eigene Chromium Instanz bereits installiert.')
-        if not check_webdriver():
-            download_webdriver()
+        # Chromium und Chromedriver werden gleichzeitig geladen
+        download_missing()
 
 
 def validate_args(args):
@@ -474,11 +529,24 @@ def main():
         type=int,
         default=60,
         help="Wartezeit zwischen zwei Versuchen (in Sekunden)")
+    parser_search.add_argument(
+        "--backoff-max-sec",
+        type=float,
+        help="Maximale Pause eines gestörten Backends (in Sekunden). Überschreibt \"backoff\" in der JSON-Datei.")
+    parser_search.add_argument(
+        "--backoff-threshold",
+        type=int,
+        help="Fehler in Folge, nach denen alle Impfzentren eines Backends pausieren. Überschreibt \"backoff\" in der JSON-Datei.")
 
     parser_code = subparsers.add_parser(
         "code",
         parents=[base_subparser],
         help="Vermittlungscode generieren")
+    parser_code.add_argument(
+        "--pin-source",
+        help="Zusätzliche Quelle für den SMS-Code neben dem Browser-Fenster: stdin, browser (nur Browser), "
+             "file:PFAD (Datei, in die der Code geschrieben wird) oder socket:PFAD (lokaler Unix-Socket). "
+             "Default: stdin, falls ein Terminal vorhanden ist.")
 
     args = parser.parse_args()
 
@@ -492,6 +560,8 @@ def main():
         args.retry_sec = 60
     if not hasattr(args, "configure_notifications"):
         args.configure_notifications = False
+    if not hasattr(args, "pin_source"):
+        args.pin_source = None
 
     try:
         validate_args(args)
@@ -0,0 +1,84 @@
+"""
+Kooperativer Abbruch von Terminsuche, Buchung und Codegenerierung.
+
+Alle Wartezeiten des ImpfterminService laufen über Abbruch.warten. Wird
+abgebrochen, wachen wartende Threads sofort auf und erhalten die Exception
+Abgebrochen. Browser-Sitzungen werden in finally-Blöcken beendet, sodass
+keine Chrome- und Chromedriver-Prozesse zurückbleiben.
+
+Beispiel:
+    abbruch = Abbruch()
+    abbruch.bei_signal(signal.SIGTERM)
+    try:
+        ImpfterminService.terminsuche(..., abbruch=abbruch)
+    except Abgebrochen:
+        ...
+"""
+
+import signal
+import threading
+from typing import Optional
+
+from tools.exceptions import Abgebrochen
+from tools.uhr import Uhr
+
+
+class Abbruch:
+    """
+    Abbruch-Token, das von beliebigen Threads ausgelöst und abgefragt werden
+    kann. Ein ausgelöstes Token bleibt ausgelöst.
+    """
+
+    def __init__(self, uhr: Uhr = None):
+        """
+        :param uhr: Uhr, auf der gewartet wird. Default: echte Uhr
+        """
+        self.uhr = uhr or Uhr()
+        self._ereignis = threading.Event()
+        self.grund: Optional[str] = None
+
+    @property
+    def abgebrochen(self) -> bool:
+        return self._ereignis.is_set()
+
+    def abbrechen(self, grund: str = "Abgebrochen"):
+        """
+        Löst den Abbruch aus und weckt alle wartenden Threads.
+
+        :param grund: Text der Exception Abgebrochen
+        """
+        if self.grund is None:
+            self.grund = grund
+        self._ereignis.set()
+
+    def pruefen(self):
+        """
+        :raise Abgebrochen: Abbruch wurde ausgelöst
+        """
+        if self._ereignis.is_set():
+            raise Abgebrochen(self.grund)
+
+    def warten(self, sekunden: float):
+        """
+        Ersatz für time.sleep, der beim Abbruch sofort zurückkehrt.
+
+        :raise Abgebrochen: Abbruch wurde vor oder während der Wartezeit ausgelöst
+        """
+        if self.uhr.warten(self._ereignis, sekunden):
+            raise Abgebrochen(self.grund)
+
+    def bei_signal(self, *signale: int):
+        """
+        Löst den Abbruch aus, sobald der Prozess eines der Signale erhält,
+        z. B. SIGTERM von Process.terminate. Muss im Hauptthread aufgerufen
+        werden.
+        """
+
+        def behandeln(signum, frame):
+            # Der Signal-Handler läuft im Hauptthread, der womöglich gerade
+            # den Lock des Events hält. Daher aus einem eigenen Thread setzen.
+            threading.Thread(target=self.abbrechen, args=(f"Signal {signum} erhalten",),
+                             daemon=True).start()
+
+        for signum in signale:
+            signal.signal(signum, behandeln)
@@ -0,0 +1,354 @@
+"""
+Wiederholungen mit exponentiellem Backoff und Schutzschaltern je Backend.
+
+Fehler werden nach Art unterschieden (Verbindung, Timeout, kein JSON,
+Serverfehler), jede Art hat eine eigene Basis-Wartezeit. Je Host
+(z. B. 001-iz.impfterminservice.de) merkt sich ein Schutzschalter die
+Fehler in Folge:
+
+- geschlossen: Anfragen laufen normal
+- offen: Nach schwelle Fehlern in Folge pausieren alle PLZ des Hosts
+  gemeinsam, die Pause wächst exponentiell mit jeder erneuten Öffnung
+- halboffen: Nach Ablauf der Pause darf eine Probe-Anfrage laufen. Gelingt
+  sie, sind sofort alle PLZ des Hosts wieder freigegeben, sonst öffnet der
+  Schalter mit längerer Pause.
+
+Konfiguration über den Abschnitt "backoff" der kontaktdaten.json, siehe
+tools.kontaktdaten.validate_backoff, oder über die Kommandozeile.
+"""
+
+import random
+import time
+from enum import Enum
+from json import JSONDecodeError
+from typing import Callable, Dict, Iterable, Optional
+from urllib.parse import urlparse
+
+
+class Fehlerart(Enum):
+    VERBINDUNG = "verbindung"
+    TIMEOUT = "timeout"
+    KEIN_JSON = "kein_json"
+    SERVER = "server"
+
+
+# Basis-Wartezeit je Fehlerart in Sekunden. Eine Nicht-JSON-Antwort deutet
+# auf eine gesperrte IP, den Warteraum oder Wartungsarbeiten hin und wird
+# daher länger pausiert.
+DEFAULT_BASIS = {
+    Fehlerart.VERBINDUNG: 5,
+    Fehlerart.TIMEOUT: 2,
+    Fehlerart.KEIN_JSON: 30,
+    Fehlerart.SERVER: 10,
+}
+DEFAULT_FAKTOR = 2
+DEFAULT_MAXIMUM = 10 * 60
+
+# Fehler in Folge, nach denen ein Host pausiert wird
+DEFAULT_SCHWELLE = 3
+
+GESCHLOSSEN = "geschlossen"
+OFFEN = "offen"
+HALBOFFEN = "halboffen"
+
+
+class Richtlinie:
+    """
+    Berechnet Wartezeiten mit exponentiellem Backoff und Jitter.
+    """
+
+    def __init__(self, basis: Dict[Fehlerart, float] = None, faktor: float = DEFAULT_FAKTOR,
+                 maximum: float = DEFAULT_MAXIMUM, schwelle: int = DEFAULT_SCHWELLE,
+                 zufall: random.Random = None):
+        """
+        :param basis: Wartezeit vor der ersten Wiederholung je Fehlerart
+        :param faktor: Faktor, um den die Wartezeit je Versuch wächst
+        :param maximum: Obergrenze der Wartezeit in Sekunden
+        :param schwelle: Fehler in Folge, nach denen ein Host pausiert wird
+        :param zufall: Zufallsgenerator für den Jitter, Default: random
+        """
+        self.basis = dict(DEFAULT_BASIS)
+        self.basis.update(basis or {})
+        self.faktor = faktor
+        self.maximum = maximum
+        self.schwelle = max(1, schwelle)
+        self._zufall = zufall or random
+
+    @classmethod
+    def aus_config(cls, config: Optional[Dict], **kwargs) -> "Richtlinie":
+        """
+        :param config: Abschnitt "backoff" der Kontaktdaten, z. B.
+            {"basis": {"server": 20}, "maximum": 300, "schwelle": 5}.
+            Eine Zahl als "basis" gilt für alle Fehlerarten.
+        :param kwargs: Weitere Parameter für den Konstruktor
+        """
+        config = config or {}
+        basis = config.get("basis")
+        if isinstance(basis, (int, float)):
+            basis = {art: basis for art in Fehlerart}
+        elif isinstance(basis, dict):
+            basis = {Fehlerart(art): wert for art, wert in basis.items()}
+        return cls(basis=basis,
+                   faktor=config.get("faktor", DEFAULT_FAKTOR),
+                   maximum=config.get("maximum", DEFAULT_MAXIMUM),
+                   schwelle=config.get("schwelle", DEFAULT_SCHWELLE),
+                   **kwargs)
+
+    def verzoegerung(self, art: Fehlerart, versuch: int) -> float:
+        """
+        :param art: Art des letzten Fehlers
+        :param versuch: Nummer des Versuchs, beginnend bei 1
+        :return: Wartezeit in Sekunden, zufällig zwischen der Hälfte und dem
+            Ganzen der exponentiell wachsenden Obergrenze. So wiederholen
+            mehrere Prozesse nicht im Gleichtakt, aber nie sofort.
+        """
+        exponent = min(max(versuch, 1) - 1, 64)
+        obergrenze = min(self.maximum, self.basis[art] * self.faktor ** exponent)
+        return obergrenze / 2 + self._zufall.uniform(0, obergrenze / 2)
+
+
+class Schutzschalter:
+    """
+    Schutzschalter für einen Backend-Host.
+    """
+
+    def __init__(self, richtlinie: Richtlinie, uhr: Callable[[], float] = time.monotonic):
+        self.richtlinie = richtlinie
+        self._uhr = uhr
+        self.zustand = GESCHLOSSEN
+        self.fehler_in_folge = 0
+        self.oeffnungen = 0
+        self.freigabe = 0.0
+        self.letzte_art: Optional[Fehlerart] = None
+
+    def bereit(self) -> bool:
+        """
+        :return: True, falls eine Anfrage laufen darf. Nach Ablauf der Pause
+            wechselt der Schalter in den Zustand halboffen.
+        """
+        if self.zustand == OFFEN and self._uhr() >= self.freigabe:
+            self.zustand = HALBOFFEN
+        return self.zustand != OFFEN
+
+    def fehler(self, art: Fehlerart) -> Optional[float]:
+        """
+        :return: Dauer der Pause in Sekunden, falls der Schalter geöffnet wurde
+        """
+        self.fehler_in_folge += 1
+        self.letzte_art = art
+        if self.zustand != HALBOFFEN and self.fehler_in_folge < self.richtlinie.schwelle:
+            return None
+        self.oeffnungen += 1
+        dauer = self.richtlinie.verzoegerung(art, self.oeffnungen)
+        self.zustand = OFFEN
+        self.freigabe = self._uhr() + dauer
+        return dauer
+
+    def erfolg(self) -> bool:
+        """
+        :return: True, falls der Schalter zuvor offen oder halboffen war
+        """
+        war_gestoert = self.zustand != GESCHLOSSEN
+        self.zustand = GESCHLOSSEN
+        self.fehler_in_folge = 0
+        self.oeffnungen = 0
+        self.freigabe = 0.0
+        return war_gestoert
+
+
+class Backoff:
+    """
+    Verwaltet die Schutzschalter aller Backend-Hosts.
+
+    Beispiel:
+        backoff = Backoff(Richtlinie.aus_config(kontaktdaten.get("backoff")), log=log)
+        if backoff.bereit(url):
+            try:
+                res = session.get(url, timeout=5)
+            except RequestException as exc:
+                backoff.fehler(url, klassifizieren(exc))
+            else:
+                backoff.erfolg(url)
+    """
+
+    def __init__(self, richtlinie: Richtlinie = None, log=None, metriken=None,
+                 uhr: Callable[[], float] = time.monotonic,
+                 schlafen: Callable[[float], None] = time.sleep):
+        """
+        :param richtlinie: Richtlinie für Wartezeiten und Schwelle
+        :param log: Optionaler CLogger
+        :param metriken: Optionale tools.metriken.Metriken
+        :param uhr: Monotone Uhr für die Pausen
+        :param schlafen: Funktion zum Warten in warten
+        """
+        self.richtlinie = richtlinie or Richtlinie()
+        self.log = log
+        self.metriken = metriken
+        self._uhr = uhr
+        self._schlafen = schlafen
+        self._schalter: Dict[str, Schutzschalter] = {}
+
+    def konfigurieren(self, richtlinie: Richtlinie):
+        """
+        Ersetzt die Richtlinie, der Zustand der Schutzschalter bleibt erhalten.
+        """
+        self.richtlinie = richtlinie
+        for schalter in self._schalter.values():
+            schalter.richtlinie = richtlinie
+
+    def schalter(self, url: str) -> Schutzschalter:
+        host = urlparse(url).netloc or url
+        schalter = self._schalter.get(host)
+        if schalter is None:
+            schalter = self._schalter[host] = Schutzschalter(self.richtlinie, self._uhr)
+        return schalter
+
+    def bereit(self, url: str) -> bool:
+        """
+        :return: True, falls für den Host der URL eine Anfrage laufen darf
+        """
+        return self.schalter(url).bereit()
+
+    def freigabe(self, url: str) -> float:
+        """
+        :return: Zeitpunkt, ab dem der Host wieder angefragt werden darf;
+            0, falls er nicht pausiert ist
+        """
+        schalter = self.schalter(url)
+        return schalter.freigabe if schalter.zustand == OFFEN else 0.0
+
+    def fehler(self, url: str, art: Optional[Fehlerart]) -> Optional[float]:
+        """
+        Zählt einen Fehler für den Host der URL.
+
+        :param art: Art des Fehlers, None wird ignoriert
+        :return: Dauer der Pause in Sekunden, falls der Host pausiert wurde
+        """
+        if art is None:
+            return None
+        host = urlparse(url).netloc or url
+        dauer = self.schalter(url).fehler(art)
+        if dauer is not None:
+            self._melden("warn", f"{host} gestört ({art.value}), "
+                                 f"pausiere alle Impfzentren für {dauer:.0f} Sekunden")
+            if self.metriken is not None:
+                self.metriken.zaehlen("schutzschalter_total", host=host, art=art.value)
+        return dauer
+
+    def erfolg(self, url: str):
+        """
+        Setzt den Schutzschalter des Hosts der URL zurück.
+        """
+        if self.schalter(url).erfolg():
+            host = urlparse(url).netloc or url
+            self._melden("success", f"{host} wieder erreichbar")
+
+    def zustand(self) -> Dict[str, Dict]:
+        """
+        :return: Zustand aller gestörten Hosts als JSON-fähiges Dictionary.
+            Freigabezeitpunkte beziehen sich auf die Uhr des Backoff.
+        """
+        return {
+            host: {
+                "zustand": schalter.zustand,
+                "fehler_in_folge": schalter.fehler_in_folge,
+                "oeffnungen": schalter.oeffnungen,
+                "freigabe": schalter.freigabe,
+                "letzte_art": schalter.letzte_art.value if schalter.letzte_art else None,
+            }
+            for host, schalter in self._schalter.items()
+            if schalter.zustand != GESCHLOSSEN or schalter.fehler_in_folge
+        }
+
+    def zustand_laden(self, zustand: Dict[str, Dict]):
+        """
+        Übernimmt einen mit zustand gesicherten Stand. Ist die Pause eines
+        Hosts inzwischen abgelaufen, darf zunächst eine Probe-Anfrage laufen.
+        """
+        for host, daten in zustand.items():
+            schalter = self.schalter(host)
+            schalter.zustand = daten.get("zustand", GESCHLOSSEN)
+            schalter.fehler_in_folge = daten.get("fehler_in_folge", 0)
+            schalter.oeffnungen = daten.get("oeffnungen", 0)
+            schalter.freigabe = daten.get("freigabe", 0.0)
+            art = daten.get("letzte_art")
+            schalter.letzte_art = Fehlerart(art) if art else None
+
+    def naechste_freigabe(self, urls: Iterable[str]) -> Optional[float]:
+        """
+        :return: Frühester Zeitpunkt, ab dem einer der Hosts wieder
+            angefragt werden darf. None, falls keine URL übergeben wurde.
+        """
+        freigaben = [self.freigabe(url) for url in urls]
+        if not freigaben:
+            return None
+        return max(min(freigaben), self._uhr())
+
+    def warten(self, url: str, art: Fehlerart) -> float:
+        """
+        Zählt einen Fehler und wartet vor der nächsten Wiederholung, z. B.
+        in Schleifen außerhalb der Terminsuche. Ist der Host pausiert, wird
+        bis zur Freigabe gewartet, sonst gemäß Richtlinie.
+
+        :return: Gewartete Zeit in Sekunden
+        """
+        self.fehler(url, art)
+        schalter = self.schalter(url)
+        if schalter.zustand == OFFEN:
+            dauer = max(0.0, schalter.freigabe - self._uhr())
+        else:
+            dauer = self.richtlinie.verzoegerung(art, schalter.fehler_in_folge)
+        self._melden("info", f"Erneuter Versuch in {dauer:.0f} Sekunden")
+        self._schlafen(dauer)
+        return dauer
+
+    def _melden(self, level: str, msg: str):
+        if self.log is not None:
+            getattr(self.log, level)(msg)
+
+
+def klassifizieren(exc: BaseException) -> Optional[Fehlerart]:
+    """
+    Folgt der Kette von __cause__, sodass auch in RuntimeError verpackte
+    Fehler von requests erkannt werden, z. B. aus JsonCache.laden.
+
+    :return: Fehlerart einer Exception von requests oder beim Decodieren,
+        None für sonstige Fehler
+    """
+    gesehen = set()
+    while exc is not None and id(exc) not in gesehen:
+        art = _fehlerart(exc)
+        if art is not None:
+            return art
+        gesehen.add(id(exc))
+        exc = exc.__cause__
+    return None
+
+
+def _fehlerart(exc: BaseException) -> Optional[Fehlerart]:
+    import builtins
+    from requests.exceptions import ConnectionError, ConnectTimeout, RequestException, Timeout
+
+    # Zuerst prüfen: requests.exceptions.JSONDecodeError (ab requests 2.27)
+    # ist zugleich RequestException und damit OSError
+    if isinstance(exc, JSONDecodeError):
+        return Fehlerart.KEIN_JSON
+    if isinstance(exc, ConnectTimeout):
+        return Fehlerart.VERBINDUNG
+    if isinstance(exc, (Timeout, TimeoutError)):
+        return Fehlerart.TIMEOUT
+    if isinstance(exc, (ConnectionError, builtins.ConnectionError)):
+        return Fehlerart.VERBINDUNG
+    if isinstance(exc, RequestException):
+        # Sonstige Fehler der Übertragung, z. B. abgebrochene Antworten
+        return Fehlerart.VERBINDUNG
+    return None
+
+
+def art_der_antwort(res) -> Optional[Fehlerart]:
+    """
+    :return: Fehlerart.SERVER bei 429 und 5xx, sonst None
+    """
+    if res.status_code == 429 or res.status_code >= 500:
+        return Fehlerart.SERVER
+    return None
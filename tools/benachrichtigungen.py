@@ -0,0 +1,199 @@
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from tools.exceptions import DesktopNotificationError, PushoverNotificationError, TelegramNotificationError
+from tools.utils import desktop_notification, pushover_notification, telegram_notification
+
+# Maximale Anzahl wartender Benachrichtigungen. Ist die Warteschlange voll,
+# werden neue Benachrichtigungen verworfen statt die Terminsuche aufzuhalten.
+DEFAULT_MAXSIZE = 32
+
+# Timeout je Anfrage an einen Anbieter in Sekunden
+DEFAULT_TIMEOUT = 10
+
+# Anzahl Versuche je Anbieter und Benachrichtigung
+DEFAULT_VERSUCHE = 3
+
+_ENDE = object()
+
+
+class Benachrichtiger:
+    """
+    Verschickt Benachrichtigungen in einem Hintergrund-Thread, damit die
+    Terminsuche und insbesondere die Buchung nie auf einen langsamen
+    Anbieter warten.
+
+    - Benachrichtigungen landen in einer begrenzten Warteschlange; senden
+      blockiert nie.
+    - Je Anbieter wird eine eigene requests-Session wiederverwendet.
+    - Jede Anfrage hat ein festes Timeout. Verbindungsfehler, 429 und 5xx
+      werden mit wachsendem Abstand wiederholt.
+    - Das Ergebnis jeder Zustellung wird über den Logger gemeldet.
+
+    Beispiel:
+        benachrichtiger = Benachrichtiger(notifications, "windows", log)
+        benachrichtiger.senden("Termin gefunden:", msg)
+        ...
+        benachrichtiger.leeren(timeout=30)
+    """
+
+    def __init__(self, notifications: Dict, operating_system: str, log=None, metriken=None,
+                 maxsize: int = DEFAULT_MAXSIZE, timeout: float = DEFAULT_TIMEOUT,
+                 versuche: int = DEFAULT_VERSUCHE, schlafen: Callable[[float], None] = time.sleep):
+        """
+        :param notifications: Daten zur Authentifizierung bei
+            Benachrichtigungs-Providern, siehe tools.kontaktdaten.validate_notifications
+        :param operating_system: Betriebssystem wie platform.system().lower()
+        :param log: Optionaler CLogger für die Ergebnisse der Zustellung
+        :param metriken: Optionale tools.metriken.Metriken
+        """
+        self.notifications = notifications
+        self.operating_system = operating_system
+        self.log = log
+        self.metriken = metriken
+        self.timeout = timeout
+        self.versuche = max(1, versuche)
+        self._schlafen = schlafen
+
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._sessions = {}
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+
+    def anbieter(self) -> List[Tuple[str, Callable[[str, str], None]]]:
+        """
+        :return: Namen und Sendefunktionen aller konfigurierten Anbieter
+        """
+        anbieter = []
+        if "windows" in self.operating_system:
+            anbieter.append(("desktop", self._desktop))
+        if "pushover" in self.notifications:
+            anbieter.append(("pushover", self._pushover))
+        if "telegram" in self.notifications:
+            anbieter.append(("telegram", self._telegram))
+        return anbieter
+
+    def senden(self, title: str, message: str) -> bool:
+        """
+        Reiht eine Benachrichtigung ein, ohne zu blockieren.
+
+        :return: False, falls die Warteschlange voll ist und die
+            Benachrichtigung verworfen wurde
+        """
+        if not self.anbieter():
+            return True
+        self._starten()
+        try:
+            self._queue.put_nowait((title, message))
+            return True
+        except queue.Full:
+            self._melden("warn", f"Benachrichtigung verworfen, Warteschlange voll: {title}")
+            return False
+
+    def leeren(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wartet, bis alle eingereihten Benachrichtigungen zugestellt oder
+        endgültig gescheitert sind, z. B. vor dem Beenden des Programms.
+
+        :return: False, falls das Timeout vorher abgelaufen ist
+        """
+        with self._queue.all_tasks_done:
+            return self._queue.all_tasks_done.wait_for(
+                lambda: self._queue.unfinished_tasks == 0, timeout)
+
+    def schliessen(self, timeout: Optional[float] = None):
+        """
+        Stellt ausstehende Benachrichtigungen zu und beendet den Thread.
+        """
+        self.leeren(timeout)
+        with self._thread_lock:
+            if self._thread is not None and self._thread.is_alive():
+                try:
+                    self._queue.put_nowait(_ENDE)
+                except queue.Full:
+                    pass
+
+    def _starten(self):
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._arbeiten, name="benachrichtigungen", daemon=True)
+                self._thread.start()
+
+    def _arbeiten(self):
+        while True:
+            eintrag = self._queue.get()
+            try:
+                if eintrag is _ENDE:
+                    return
+                title, message = eintrag
+                for name, funktion in self.anbieter():
+                    self._zustellen(name, funktion, title, message)
+            finally:
+                self._queue.task_done()
+
+    def _zustellen(self, name: str, funktion: Callable[[str, str], None], title: str, message: str):
+        for versuch in range(1, self.versuche + 1):
+            start = time.perf_counter()
+            try:
+                funktion(title, message)
+                self._melden("info", f"Benachrichtigung über {name} zugestellt "
+                                     f"({(time.perf_counter() - start) * 1000:.0f} ms)")
+                self._zaehlen(name, "zugestellt")
+                return
+            except Exception as exc:
+                wiederholen = versuch < self.versuche and _wiederholbar(exc)
+                self._melden("error", f"Benachrichtigung über {name} fehlgeschlagen "
+                                      f"(Versuch {versuch}/{self.versuche}): {_beschreibung(exc)}")
+                if not wiederholen:
+                    self._zaehlen(name, "fehlgeschlagen")
+                    return
+                self._schlafen(2 ** (versuch - 1))
+
+    def _session(self, name: str):
+        # Sessions werden nur im Hintergrund-Thread verwendet
+        session = self._sessions.get(name)
+        if session is None:
+            import requests
+            session = self._sessions[name] = requests.Session()
+        return session
+
+    def _desktop(self, title: str, message: str):
+        desktop_notification(self.operating_system, title, message, blockierend=True)
+
+    def _pushover(self, title: str, message: str):
+        pushover_notification(self.notifications["pushover"], title, message,
+                              session=self._session("pushover"), timeout=self.timeout)
+
+    def _telegram(self, title: str, message: str):
+        telegram_notification(self.notifications["telegram"], title + "\n" + message,
+                              session=self._session("telegram"), timeout=self.timeout)
+
+    def _melden(self, level: str, msg: str):
+        if self.log is not None:
+            getattr(self.log, level)(msg)
+
+    def _zaehlen(self, anbieter: str, ergebnis: str):
+        if self.metriken is not None:
+            self.metriken.zaehlen("benachrichtigungen_total", anbieter=anbieter, ergebnis=ergebnis)
+
+
+def _wiederholbar(exc: Exception) -> bool:
+    """
+    :return: True bei Verbindungsfehlern, 429 und 5xx. Andere Antworten
+        deuten auf falsche Zugangsdaten hin und werden nicht wiederholt.
+    """
+    if isinstance(exc, (PushoverNotificationError, TelegramNotificationError)):
+        status = exc.args[0] if exc.args else None
+        return status == 429 or (isinstance(status, int) and status >= 500)
+    if isinstance(exc, DesktopNotificationError):
+        return False
+    return True
+
+
+def _beschreibung(exc: Exception) -> str:
+    if isinstance(exc, (PushoverNotificationError, TelegramNotificationError)) and len(exc.args) == 2:
+        return f"{exc.args[0]} {exc.args[1]}"
+    return f"{exc.__class__.__name__}: {str(exc)}".splitlines()[0]
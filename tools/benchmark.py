@@ -0,0 +1,352 @@
+"""
+End-to-End-Benchmarks der Terminsuche gegen den lokalen Stand-in-Server
+(tools.its_standin). Läuft vollständig offline.
+
+Aufruf:
+    python -m tools.benchmark latenz --wiederholungen 5 --check-delay 0.5
+    python -m tools.benchmark dauerlauf --abfragen 2000
+    python -m tools.benchmark logging --aufrufe 20000
+    python -m tools.benchmark simulation --stunden 24 --seed 1
+
+- latenz: Zeit zwischen dem Erscheinen eines Terminpaars auf dem Server und
+  dem Eingang der Buchung (POST rest/buchung).
+- dauerlauf: CPU-Zeit und Speicherbedarf je Suchanfrage über viele
+  Anfragen, um Leaks und schleichende Verlangsamung zu erkennen.
+- logging: Kosten eines CLogger-Aufrufs im aufrufenden Thread, synchron
+  gegenüber dem Queue-basierten Backend.
+- simulation: Terminsuche über viele Stunden auf einer virtuellen Uhr
+  (tools.uhr). Über den Tag erscheinen Termine außerhalb des Zeitrahmens,
+  am Ende ein passender. Gemessen werden Suchanfragen und CPU-Zeit je
+  simulierter Stunde sowie die simulierte Latenz bis zur Buchung. Mit
+  demselben Seed ist das Ergebnis reproduzierbar.
+
+Mit --max-ms, --max-wachstum-kb bzw. --max-latenz-s ist der Rückgabewert 1,
+falls das Ergebnis die Grenze überschreitet.
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from typing import Dict, List, Optional
+
+from tools.abbruch import Abbruch
+from tools.clog import CLogger
+from tools.exceptions import Abgebrochen
+from tools.its import ImpfterminService
+from tools.its_standin import StandinServer
+from tools.uhr import VirtuelleUhr
+
+try:
+    import psutil
+
+    ENABLE_PSUTIL = True
+except ImportError:
+    ENABLE_PSUTIL = False
+
+PLZ = "68163"
+CODE = "BENC-HMAR-K001"
+KONTAKT = {
+    "anrede": "Divers",
+    "vorname": "Bench",
+    "nachname": "Mark",
+    "strasse": "Loopback",
+    "hausnummer": "1",
+    "plz": "12345",
+    "ort": "Localhost",
+    "phone": "+4915112345678",
+    "notificationChannel": "email",
+    "notificationReceiver": "benchmark@example.com"
+}
+
+
+def rss_bytes() -> int:
+    """
+    :return: Aktueller Speicherbedarf (Resident Set Size) des Prozesses
+    """
+    if ENABLE_PSUTIL:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+        # Spitzenwert statt aktuellem Wert, unter Linux in KiB
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class BenchmarkService(ImpfterminService):
+    """
+    ImpfterminService ohne Browser und Benachrichtigungen, der je
+    Suchanfrage CPU-Zeit und Speicherbedarf aufzeichnet.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.messungen: List[Dict] = []
+
+    def browser_pruefen(self):
+        pass
+
+    def get_cookies(self, url: str, manual: bool) -> dict:
+        return {}
+
+    def notify(self, title: str, msg: str):
+        pass
+
+    def reservierung_finden(self, zeitrahmen, plz: str) -> Optional[Dict]:
+        reservierung = super().reservierung_finden(zeitrahmen, plz)
+        self.messungen.append({
+            "cpu": time.thread_time(),
+            "rss": rss_bytes(),
+        })
+        return reservierung
+
+
+def _suchen(server: StandinServer, check_delay: float, frist: Optional[float] = None,
+            **kwargs) -> BenchmarkService:
+    """
+    Führt eine Terminsuche gegen den Server aus, bis ein Termin gebucht
+    wurde.
+
+    :param frist: Zeitpunkt auf der Uhr der Suche, nach dem auch ohne
+        Buchung abgebrochen wird
+    :param kwargs: Weitere Parameter für terminsuche
+    :return: Die verwendete Instanz samt Messungen
+    """
+
+    instanzen = []
+
+    class _Service(BenchmarkService):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            instanzen.append(self)
+
+        def reservierung_finden(self, zeitrahmen, plz: str) -> Optional[Dict]:
+            if frist is not None and self.uhr.monotonic() >= frist:
+                self.abbruch.abbrechen("Frist des Benchmarks abgelaufen")
+                return None
+            return super().reservierung_finden(zeitrahmen, plz)
+
+    with tempfile.TemporaryDirectory() as PATH:
+        try:
+            _Service.terminsuche(
+                codes=[CODE], plz_impfzentren=[PLZ], kontakt=KONTAKT, PATH=PATH,
+                check_delay=check_delay, basis_url=server.url, **kwargs)
+        except Abgebrochen:
+            pass
+    return instanzen[0]
+
+
+def latenz(args) -> Dict:
+    ergebnisse = []
+    for _ in range(args.wiederholungen):
+        with StandinServer(plz=[PLZ], latenz=args.server_latenz) as server:
+            # Erscheinen zufällig innerhalb der ersten zwei Perioden, damit die
+            # Phase zwischen Erscheinen und Suchanfrage nicht immer gleich ist
+            server.termine_anbieten(PLZ, nach_sekunden=random.uniform(0, 2 * args.check_delay) + 0.5)
+            _suchen(server, args.check_delay)
+            ergebnisse.append(server.buchungen[0]["latenz"] * 1000)
+
+    bericht = {
+        "wiederholungen": len(ergebnisse),
+        "check_delay_s": args.check_delay,
+        "server_latenz_s": args.server_latenz,
+        "min_ms": min(ergebnisse),
+        "median_ms": statistics.median(ergebnisse),
+        "max_ms": max(ergebnisse),
+    }
+    bericht["ok"] = args.max_ms is None or bericht["median_ms"] <= args.max_ms
+    return bericht
+
+
+def dauerlauf(args) -> Dict:
+    with StandinServer(plz=[PLZ], latenz=args.server_latenz) as server:
+        server.termine_anbieten(PLZ, nach_anfragen=args.abfragen)
+        its = _suchen(server, args.check_delay)
+
+    messungen = its.messungen
+    cpu = [b["cpu"] - a["cpu"] for a, b in zip(messungen, messungen[1:])]
+    zehntel = max(1, len(cpu) // 10)
+    wachstum_kb = (messungen[-1]["rss"] - messungen[zehntel]["rss"]) / 1024
+    wachstum_kb_pro_1000 = wachstum_kb / max(1, len(messungen) - zehntel) * 1000
+
+    bericht = {
+        "abfragen": len(messungen),
+        "cpu_ms_pro_abfrage": statistics.mean(cpu) * 1000,
+        "cpu_ms_pro_abfrage_anfang": statistics.mean(cpu[:zehntel]) * 1000,
+        "cpu_ms_pro_abfrage_ende": statistics.mean(cpu[-zehntel:]) * 1000,
+        "rss_mb_anfang": messungen[0]["rss"] / 2 ** 20,
+        "rss_mb_ende": messungen[-1]["rss"] / 2 ** 20,
+        # Die ersten 10 % gelten als Aufwärmphase
+        "rss_wachstum_kb_pro_1000_abfragen": wachstum_kb_pro_1000,
+    }
+    bericht["ok"] = args.max_wachstum_kb is None or wachstum_kb_pro_1000 <= args.max_wachstum_kb
+    return bericht
+
+
+def logging_durchsatz(args) -> Dict:
+    bericht = {"aufrufe": args.aufrufe, "serie": args.serie}
+    with tempfile.TemporaryDirectory() as log_dir, open(os.devnull, "w") as devnull:
+        # Konsolenausgabe ins Leere, damit das Terminal nicht mitgemessen wird
+        stdout = sys.stdout
+        sys.stdout = devnull
+        try:
+            for asynchron in (False, True):
+                name = "asynchron" if asynchron else "synchron"
+                log = CLogger(f"benchmark-{name}", asynchron=asynchron, file_log_level=1,
+                              jsonl=args.jsonl, log_dir=log_dir)
+                log.set_prefix("68163 69124")
+                # Wie in reservierung_finden_mit_code kommen die Aufrufe in
+                # Serien, zwischen denen die Terminsuche wartet. Gemessen wird
+                # nur die Zeit im aufrufenden Thread.
+                dauer = 0.0
+                for i in range(0, args.aufrufe, args.serie):
+                    start = time.perf_counter()
+                    for j in range(i, min(i + args.serie, args.aufrufe)):
+                        log.info(f"Keine Termine verfügbar in 68163 ({j}, 100% ausgelastet)")
+                    dauer += time.perf_counter() - start
+                    time.sleep(args.pause)
+                bericht[f"{name}_us_pro_aufruf"] = dauer / args.aufrufe * 1e6
+                log.stop()
+                for handler in logging.getLogger(f"benchmark-{name}").handlers:
+                    handler.close()
+        finally:
+            sys.stdout = stdout
+    bericht["faktor"] = bericht["synchron_us_pro_aufruf"] / bericht["asynchron_us_pro_aufruf"]
+    bericht["ok"] = True
+    return bericht
+
+
+def simulation(args) -> Dict:
+    uhr = VirtuelleUhr(seed=args.seed)
+    dauer = args.stunden * 60 * 60
+    heute = uhr.jetzt()
+    zufall = uhr.zufall
+    # Der erste Termin muss frühestens in 14 Tagen liegen
+    zeitrahmen = {
+        "einhalten_bei": "1",
+        "von_datum": (heute + timedelta(days=14)).strftime("%d.%m.%Y"),
+    }
+
+    with StandinServer(plz=[PLZ], latenz=args.server_latenz, uhr=uhr.monotonic,
+                       schlafen=uhr.schlafen, zufall=zufall) as server:
+        # Über den Tag verteilt kurzzeitig sichtbare Termine, die abgelehnt
+        # werden, zum Schluss ein passender
+        angebote = round(args.termine_pro_stunde * args.stunden)
+        for _ in range(angebote):
+            tag = zufall.randint(1, 13)
+            server.termine_anbieten(
+                PLZ, server.terminpaar_erzeugen((tag, tag + 42), heute, zufall),
+                nach_sekunden=zufall.uniform(0, dauer), dauer=zufall.uniform(60, 30 * 60))
+        server.termine_anbieten(
+            PLZ, server.terminpaar_erzeugen((21, 63), heute, zufall), nach_sekunden=dauer)
+
+        start = time.perf_counter()
+        cpu = time.thread_time()
+        its = _suchen(server, args.check_delay, frist=dauer + 60 * 60, zeitrahmen=zeitrahmen,
+                      abbruch=Abbruch(uhr))
+        cpu = time.thread_time() - cpu
+        echt = time.perf_counter() - start
+
+    stunden = uhr.vergangen / (60 * 60)
+    suchanfragen = server.anfragen["rest/suche/impfterminsuche"]
+    bericht = {
+        "seed": args.seed,
+        "check_delay_s": args.check_delay,
+        "simulierte_stunden": stunden,
+        "echte_sekunden": echt,
+        "beschleunigung": uhr.vergangen / echt,
+        "angebote": angebote + 1,
+        "suchanfragen": suchanfragen,
+        "suchanfragen_pro_stunde": suchanfragen / stunden,
+        "cpu_ms_pro_simulierte_stunde": cpu / stunden * 1000,
+        "cpu_ms_pro_abfrage": cpu / max(1, len(its.messungen)) * 1000,
+        "gebucht": bool(server.buchungen),
+        "latenz_s": server.buchungen[0]["latenz"] if server.buchungen else None,
+    }
+    bericht["ok"] = bericht["gebucht"] and (
+        args.max_latenz_s is None or bericht["latenz_s"] <= args.max_latenz_s)
+    return bericht
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m tools.benchmark",
+        description="Benchmarks der Terminsuche gegen den lokalen Stand-in-Server")
+    parser.add_argument("--server-latenz", type=float, default=0.01,
+                        help="Verzögerung jeder Serverantwort in Sekunden")
+    parser.add_argument("--ausgabe", default=None,
+                        help="Ergebnis zusätzlich als JSON in diese Datei schreiben")
+    parser.add_argument("--mit-log", action="store_true",
+                        help="Ausgaben der Terminsuche nicht unterdrücken")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    parser_latenz = subparsers.add_parser(
+        "latenz", help="Zeit vom Erscheinen eines Termins bis zur Buchung")
+    parser_latenz.add_argument("--wiederholungen", type=int, default=5)
+    parser_latenz.add_argument("--check-delay", type=float, default=0.5,
+                               help="Periode der Terminsuche in Sekunden")
+    parser_latenz.add_argument("--max-ms", type=float, default=None,
+                               help="Obergrenze für den Median in Millisekunden")
+    parser_latenz.set_defaults(funktion=latenz)
+
+    parser_dauerlauf = subparsers.add_parser(
+        "dauerlauf", help="CPU-Zeit und Speicher je Suchanfrage über viele Anfragen")
+    parser_dauerlauf.add_argument("--abfragen", type=int, default=2000)
+    parser_dauerlauf.add_argument("--check-delay", type=float, default=0,
+                                  help="Periode der Terminsuche in Sekunden")
+    parser_dauerlauf.add_argument("--max-wachstum-kb", type=float, default=None,
+                                  help="Obergrenze für das RSS-Wachstum je 1000 Abfragen in KiB")
+    parser_dauerlauf.set_defaults(funktion=dauerlauf)
+
+    parser_logging = subparsers.add_parser(
+        "logging", help="Kosten eines Log-Aufrufs im aufrufenden Thread")
+    parser_logging.add_argument("--aufrufe", type=int, default=20000)
+    parser_logging.add_argument("--serie", type=int, default=12,
+                                help="Aufrufe je Serie")
+    parser_logging.add_argument("--pause", type=float, default=0.002,
+                                help="Pause zwischen zwei Serien in Sekunden")
+    parser_logging.add_argument("--jsonl", action="store_true",
+                                help="Strukturierte Ausgabe statt Text-Logdatei")
+    parser_logging.set_defaults(funktion=logging_durchsatz)
+
+    parser_simulation = subparsers.add_parser(
+        "simulation", help="Terminsuche über viele Stunden auf einer virtuellen Uhr")
+    parser_simulation.add_argument("--stunden", type=float, default=24.0,
+                                   help="Simulierte Dauer bis zum passenden Termin")
+    parser_simulation.add_argument("--check-delay", type=float, default=30.0,
+                                   help="Periode der Terminsuche in simulierten Sekunden")
+    parser_simulation.add_argument("--termine-pro-stunde", type=float, default=2.0,
+                                   help="Termine außerhalb des Zeitrahmens je Stunde")
+    parser_simulation.add_argument("--seed", type=int, default=0,
+                                   help="Seed des Zufallsgenerators")
+    parser_simulation.add_argument("--max-latenz-s", type=float, default=None,
+                                   help="Obergrenze für die simulierte Latenz bis zur Buchung")
+    parser_simulation.set_defaults(funktion=simulation)
+
+    args = parser.parse_args()
+
+    if not args.mit_log and args.benchmark != "logging":
+        logging.disable(logging.CRITICAL)
+
+    bericht = args.funktion(args)
+    bericht = {"benchmark": args.benchmark, **bericht}
+    for schluessel, wert in bericht.items():
+        if isinstance(wert, float):
+            wert = f"{wert:.2f}"
+        print(f"{schluessel:>36}: {wert}")
+    if args.ausgabe:
+        with open(args.ausgabe, "w", encoding="utf-8") as f:
+            json.dump(bericht, f, indent=4)
+    sys.exit(0 if bericht["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()
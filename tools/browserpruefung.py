@@ -0,0 +1,204 @@
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, Optional
+
+from tools.cache import ROOT_PATH, lese_json, schreibe_json_atomar
+
+_VERSION = re.compile(r"(\d+)\.(\d+)\.(\d+)\.(\d+)")
+
+# Timeout für "<binary> --version" in Sekunden
+_TIMEOUT_VERSION = 10
+
+
+def finde_chrome() -> Optional[str]:
+    """
+    Sucht eine systemweit installierte Chrome- bzw. Chromium-Installation
+    an denselben Stellen wie undetected_chromedriver.
+
+    :return: Pfad zur Programmdatei oder None
+    """
+
+    kandidaten = []
+    if sys.platform.startswith(("win", "msys", "cyg")):
+        for umgebungsvariable in ("PROGRAMFILES", "PROGRAMFILES(X86)", "LOCALAPPDATA"):
+            ordner = os.environ.get(umgebungsvariable)
+            if ordner:
+                kandidaten.append(os.path.join(ordner, "Google", "Chrome", "Application", "chrome.exe"))
+    else:
+        for name in ("google-chrome", "chromium", "chromium-browser", "chrome", "google-chrome-stable"):
+            pfad = shutil.which(name)
+            if pfad:
+                kandidaten.append(pfad)
+        if sys.platform.startswith("darwin"):
+            kandidaten += [
+                "/Applications/Google Chrome.app/Contents/MacOS/Google Chrome",
+                "/Applications/Chromium.app/Contents/MacOS/Chromium",
+            ]
+
+    for pfad in kandidaten:
+        if os.path.isfile(pfad) and os.access(pfad, os.X_OK):
+            return pfad
+    return None
+
+
+def lese_version(pfad: str) -> Optional[str]:
+    """
+    Ermittelt die Version einer Chrome- oder Chromedriver-Programmdatei,
+    ohne einen Browser zu starten.
+
+    :param pfad: Pfad zur Programmdatei
+    :return: Version, z. B. "91.0.4472.101", oder None
+    """
+
+    # chrome.exe ignoriert unter Windows --version und öffnet ein
+    # Browserfenster. Die Version steht dort im Namen eines Ordners neben
+    # der Programmdatei.
+    if sys.platform == "win32" and os.path.basename(pfad).lower() == "chrome.exe":
+        return _version_aus_ordner(pfad)
+
+    try:
+        res = subprocess.run(
+            [pfad, "--version"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            universal_newlines=True, timeout=_TIMEOUT_VERSION)
+        treffer = _VERSION.search(res.stdout)
+        if treffer:
+            return treffer.group(0)
+    except (OSError, subprocess.SubprocessError):
+        pass
+    return _version_aus_ordner(pfad)
+
+
+def _version_aus_ordner(pfad: str) -> Optional[str]:
+    """
+    :return: Höchste Version unter den Ordnern neben der Programmdatei,
+        deren Name eine Versionsnummer ist, oder None
+    """
+    try:
+        ordner = os.path.dirname(os.path.abspath(pfad))
+        versionen = [name for name in os.listdir(ordner) if _VERSION.fullmatch(name)]
+    except OSError:
+        return None
+    if not versionen:
+        return None
+    return max(versionen, key=lambda v: tuple(int(teil) for teil in v.split(".")))
+
+
+def hauptversion(version: str) -> int:
+    return int(version.split(".", 1)[0])
+
+
+def _dateistempel(pfad: Optional[str]) -> Optional[Dict]:
+    """
+    :return: Pfad, mtime und Größe der Datei als Schlüssel für den Cache.
+        None, falls die Datei nicht existiert.
+    """
+    if pfad is None:
+        return None
+    try:
+        stat = os.stat(pfad)
+    except OSError:
+        return None
+    return {
+        "pfad": os.path.realpath(pfad),
+        "mtime_ns": stat.st_mtime_ns,
+        "groesse": stat.st_size,
+    }
+
+
+class BrowserPruefung:
+    """
+    Prüft, ob Chrome und Chromedriver installiert und zueinander kompatibel
+    sind, ohne bei jedem Start einen Browser zu starten.
+
+    Das Ergebnis wird unter data/browserpruefung.json zwischengespeichert,
+    mit Pfad, mtime und Größe beider Programmdateien als Schlüssel. Solange
+    sich keine der Dateien ändert, kostet die Prüfung nur zwei stat-Aufrufe.
+    Erst wenn der Cache ungültig ist, werden die Versionen ausgelesen und
+    einmal ein echter Browser gestartet.
+
+    Beispiel:
+        pruefung = BrowserPruefung(PATH, log)
+        pruefung.pruefen(chrome_pfad, chromedriver_pfad,
+                         starten=lambda: its.get_chromedriver(headless=True).quit())
+    """
+
+    def __init__(self, PATH: Optional[str] = None, log=None):
+        """
+        :param PATH: Dateipfad zum vaccipy-Repo. Default: Elternordner von tools
+        :param log: Optionaler CLogger
+        """
+        if PATH is None:
+            PATH = ROOT_PATH
+        self.pfad = os.path.join(PATH, "data", "browserpruefung.json")
+        self.log = log
+
+    def pruefen(self, chrome_pfad: Optional[str], chromedriver_pfad: Optional[str],
+                starten: Callable[[], None]) -> Dict:
+        """
+        :param chrome_pfad: Chrome-Programmdatei, wie sie in
+            ImpfterminService.get_chrome_options gesetzt wird. Bei None wird
+            die systemweite Installation gesucht.
+        :param chromedriver_pfad: Chromedriver-Programmdatei, wie sie
+            ImpfterminService.get_chromedriver_path liefert. Bei None lädt
+            undetected_chromedriver selbst einen passenden Chromedriver.
+        :param starten: Startet und beendet einmal einen echten Browser.
+            Wird nur aufgerufen, wenn der Cache ungültig ist.
+        :return: Ergebnis der Prüfung mit Versionen und Zeitpunkt
+        :raise RuntimeError: Chrome und Chromedriver sind nicht kompatibel
+        """
+
+        if chrome_pfad is None:
+            chrome_pfad = finde_chrome()
+        schluessel = {
+            "chrome": _dateistempel(chrome_pfad),
+            "chromedriver": _dateistempel(chromedriver_pfad),
+        }
+
+        # Ohne auffindbares Chrome gibt es nichts, woran sich eine Änderung
+        # erkennen ließe. Dann entscheidet der echte Start.
+        cachebar = schluessel["chrome"] is not None
+
+        if cachebar:
+            ergebnis = lese_json(self.pfad)
+            if ergebnis is not None and ergebnis.get("schluessel") == schluessel:
+                return ergebnis
+
+        chrome_version = lese_version(chrome_pfad) if chrome_pfad else None
+        chromedriver_version = lese_version(chromedriver_pfad) if chromedriver_pfad else None
+        if chrome_version and chromedriver_version \
+                and hauptversion(chrome_version) != hauptversion(chromedriver_version):
+            raise RuntimeError(
+                f"Chromedriver {chromedriver_version} ({chromedriver_pfad}) passt nicht "
+                f"zu Chrome {chrome_version} ({chrome_pfad})")
+
+        if self.log is not None:
+            versionen = ", ".join(
+                f"{name} {version}" for name, version in
+                (("Chrome", chrome_version), ("Chromedriver", chromedriver_version))
+                if version)
+            self.log.info(f"Browser wird einmalig gestartet ({versionen or 'Version unbekannt'})")
+        starten()
+
+        ergebnis = {
+            "schluessel": schluessel,
+            "chrome_version": chrome_version,
+            "chromedriver_version": chromedriver_version,
+            "geprueft": time.time(),
+        }
+        if cachebar:
+            schreibe_json_atomar(self.pfad, ergebnis)
+        return ergebnis
+
+    def verwerfen(self):
+        """
+        Verwirft das gespeicherte Ergebnis, z. B. nachdem der Browser trotz
+        erfolgreicher Prüfung nicht gestartet werden konnte.
+        """
+        try:
+            os.remove(self.pfad)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,191 @@
+import json
+import os
+import re
+import tempfile
+import time
+from json import JSONDecodeError
+from typing import Any, Optional
+from urllib.parse import urlparse
+
+BASIS_URL = "https://www.impfterminservice.de/"
+IMPFZENTREN_URL = f"{BASIS_URL}assets/static/impfzentren.json"
+
+# Standard-Gültigkeit eines Snapshots in Sekunden, überschreibbar über die
+# Umgebungsvariable VACCIPY_CACHE_TTL
+DEFAULT_TTL = 60 * 60
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+
+def impfzentren_url(basis_url: str = BASIS_URL) -> str:
+    """
+    :param basis_url: URL des Impfterminservice, z. B. eines lokalen
+        Stand-in-Servers
+    :return: URL der impfzentren.json
+    """
+    return f"{basis_url}assets/static/impfzentren.json"
+
+
+def impfstoffe_url(url: str) -> str:
+    """
+    :param url: Backend-URL, z. B. https://001-iz.impfterminservice.de/
+    :return: URL der vaccination-list.json des Backends
+    """
+    return f"{url}assets/static/its/vaccination-list.json"
+
+
+def lese_json(pfad: str) -> Any:
+    """
+    :return: Deserialisierte JSON-Datei oder None, falls sie fehlt oder
+        beschädigt ist
+    """
+    try:
+        with open(pfad, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def schreibe_json_atomar(pfad: str, daten: Any):
+    """
+    Schreibt die JSON-Datei über eine temporäre Datei im selben Ordner, damit
+    parallel laufende Prozesse nie eine halb geschriebene Datei lesen.
+    """
+    ordner = os.path.dirname(pfad)
+    os.makedirs(ordner, exist_ok=True)
+    fd, tmp_pfad = tempfile.mkstemp(dir=ordner, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(daten, f, ensure_ascii=False)
+        os.replace(tmp_pfad, pfad)
+    except BaseException:
+        if os.path.exists(tmp_pfad):
+            os.remove(tmp_pfad)
+        raise
+
+
+class JsonCache:
+    """
+    Festplatten-Cache für statische JSON-Dateien des Impfterminservice
+    unter data/cache.
+
+    - Snapshots jünger als die TTL werden ohne Anfrage zurückgegeben.
+    - Ältere Snapshots werden per ETag / Last-Modified revalidiert, sodass
+      der Server im Normalfall nur mit 304 antwortet.
+    - Ist der Server nicht erreichbar, wird der letzte gültige Snapshot
+      verwendet.
+
+    Der Cache wird von der Konsolenanwendung, dem Impfzentren-Dialog der GUI
+    und jedem Suchprozess gemeinsam verwendet. Schreibzugriffe sind atomar,
+    damit parallele Prozesse keine halben Dateien lesen.
+    """
+
+    def __init__(self, PATH: Optional[str] = None, ttl: Optional[float] = None, log=None):
+        """
+        :param PATH: Dateipfad zum vaccipy-Repo. Default: Elternordner von tools
+        :param ttl: Gültigkeit eines Snapshots in Sekunden.
+            Default: VACCIPY_CACHE_TTL oder DEFAULT_TTL
+        :param log: Optionaler CLogger für Hinweise zum Offline-Fallback
+        """
+        if PATH is None:
+            PATH = ROOT_PATH
+        if ttl is None:
+            ttl = float(os.getenv("VACCIPY_CACHE_TTL", DEFAULT_TTL))
+        self.ordner = os.path.join(PATH, "data", "cache")
+        self.ttl = ttl
+        self.log = log
+
+    def laden(self, url: str, session=None, timeout: float = 15) -> Any:
+        """
+        Lädt eine JSON-Datei - aus dem Cache, falls möglich.
+
+        :param url: URL der JSON-Datei
+        :param session: requests-kompatible Session. Default: requests
+        :param timeout: Timeout der Anfrage in Sekunden
+        :return: Deserialisierte JSON-Datei
+        :raise RuntimeError: Datei kann weder geladen werden noch liegt ein
+            Snapshot vor
+        """
+
+        pfad_daten, pfad_meta = self._pfade(url)
+        meta = self._lese_json(pfad_meta)
+        daten = self._lese_json(pfad_daten) if meta is not None else None
+        snapshot_vorhanden = daten is not None
+
+        if snapshot_vorhanden and time.time() - meta.get("geladen", 0) < self.ttl:
+            return daten
+
+        headers = {}
+        if snapshot_vorhanden:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        try:
+            res = self._get(session, url, headers, timeout)
+            if res.status_code == 304 and snapshot_vorhanden:
+                meta["geladen"] = time.time()
+                self._schreibe_json(pfad_meta, meta)
+                return daten
+            if not res.ok:
+                raise RuntimeError(f"{res.status_code} {res.text}")
+            try:
+                neue_daten = res.json()
+            except JSONDecodeError as exc:
+                raise RuntimeError(f"JSONDecodeError: {str(exc)}") from exc
+        except RuntimeError as exc:
+            if not snapshot_vorhanden:
+                raise
+            if self.log is not None:
+                self.log.warn(
+                    f"{url} kann nicht aktualisiert werden ({str(exc)}), "
+                    "verwende gespeicherte Version")
+            return daten
+
+        self._schreibe_json(pfad_daten, neue_daten)
+        self._schreibe_json(pfad_meta, {
+            "url": url,
+            "etag": res.headers.get("ETag"),
+            "last_modified": res.headers.get("Last-Modified"),
+            "geladen": time.time(),
+        })
+        return neue_daten
+
+    def leeren(self):
+        """
+        Löscht alle Snapshots.
+        """
+        if not os.path.isdir(self.ordner):
+            return
+        for name in os.listdir(self.ordner):
+            if name.endswith(".json"):
+                os.remove(os.path.join(self.ordner, name))
+
+    @staticmethod
+    def _get(session, url: str, headers: dict, timeout: float):
+        # requests wird erst hier importiert, damit der Cache ohne
+        # Netzwerkzugriff keine Importzeit kostet.
+        from requests.exceptions import RequestException
+
+        if session is None:
+            import requests as session
+        try:
+            return session.get(url, headers=headers, timeout=timeout)
+        except RequestException as exc:
+            raise RuntimeError(str(exc)) from exc
+
+    def _pfade(self, url: str):
+        teile = urlparse(url)
+        name = re.sub(r"[^A-Za-z0-9.-]+", "_", f"{teile.netloc}{teile.path}").strip("_")
+        name = re.sub(r"\.json$", "", name)
+        return (os.path.join(self.ordner, f"{name}.json"),
+                os.path.join(self.ordner, f"{name}.meta.json"))
+
+    @staticmethod
+    def _lese_json(pfad: str):
+        return lese_json(pfad)
+
+    @staticmethod
+    def _schreibe_json(pfad: str, daten):
+        schreibe_json_atomar(pfad, daten)
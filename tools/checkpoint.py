@@ -0,0 +1,198 @@
+"""
+Sicherung des Suchstands für einen warmen Neustart der Terminsuche.
+
+Gesichert werden aussortierte und pausierte Vermittlungscodes je Backend
+sowie die Schutzschalter gestörter Backends. Die Datei liegt unter
+data/checkpoint/<schlüssel>.json, der Schlüssel ist ein Hash der
+Kontaktdaten. Eine neu gestartete Suche mit denselben Kontaktdaten schickt so
+keine Anfragen, die bekanntermaßen fehlschlagen.
+
+Zeitpunkte werden in der Datei als Systemzeit gespeichert und beim Laden auf
+die monotone Uhr des Prozesses umgerechnet, die nach einem Neustart bei einem
+anderen Wert beginnt.
+
+Beispiel:
+    checkpoint = Checkpoint(PATH, kontaktdaten, log=its.log)
+    checkpoint.laden(its)
+    while True:
+        ...
+        checkpoint.speichern(its)
+"""
+
+import hashlib
+import json
+import os
+import time
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import urlparse
+
+from tools.cache import ROOT_PATH, lese_json, schreibe_json_atomar
+
+VERSION = 1
+
+# Ältere Checkpoints werden ignoriert, da sich der Impfterminservice
+# inzwischen geändert haben kann
+DEFAULT_MAX_ALTER = 24 * 60 * 60
+
+
+class Checkpoint:
+    """
+    Liest und schreibt den Suchstand eines ImpfterminService. Geschrieben
+    wird nur, wenn sich der Stand seit dem letzten Speichern geändert hat,
+    und zwar atomar, sodass ein Absturz nie eine halbe Datei hinterlässt.
+    """
+
+    def __init__(self, PATH: Optional[str], kontaktdaten: Dict, log=None,
+                 max_alter: float = DEFAULT_MAX_ALTER,
+                 uhr: Callable[[], float] = time.monotonic,
+                 systemzeit: Callable[[], float] = time.time):
+        """
+        :param PATH: Dateipfad zum vaccipy-Repo. Default: Elternordner von tools
+        :param kontaktdaten: Kontaktdaten der Suche, bestimmen den Schlüssel
+        :param log: Optionaler CLogger
+        :param max_alter: Maximales Alter eines Checkpoints in Sekunden
+        :param uhr: Monotone Uhr von Scheduler und Backoff
+        :param systemzeit: Uhr für die in der Datei gespeicherten Zeitpunkte
+        """
+        if PATH is None:
+            PATH = ROOT_PATH
+        self.ordner = os.path.join(PATH, "data", "checkpoint")
+        self.log = log
+        self.max_alter = max_alter
+        self._uhr = uhr
+        self._systemzeit = systemzeit
+        self.schluessel = schluessel(kontaktdaten)
+        self._gespeichert: Optional[Dict] = None
+        self._geloescht = False
+
+    @property
+    def pfad(self) -> str:
+        return os.path.join(self.ordner, f"{self.schluessel}.json")
+
+    def laden(self, its) -> bool:
+        """
+        Übernimmt einen passenden Checkpoint in Scheduler und Backoff des
+        ImpfterminService.
+
+        :return: True, falls ein Checkpoint übernommen wurde
+        """
+        daten = lese_json(self.pfad)
+        if not isinstance(daten, dict) or daten.get("version") != VERSION \
+                or daten.get("schluessel") != self.schluessel:
+            return False
+        if self._systemzeit() - daten.get("gespeichert", 0) > self.max_alter:
+            return False
+
+        try:
+            codepoints = daten.get("codepoints", {})
+            backoff = daten.get("backoff", {})
+            its.codepoints.zustand_laden({
+                "entfernt": codepoints.get("entfernt", {}),
+                "pausiert": {
+                    url: {code: self._auf_uhr(bis) for code, bis in pausiert.items()}
+                    for url, pausiert in codepoints.get("pausiert", {}).items()
+                },
+            })
+            # Nur Hosts übernehmen, die in dieser Suche angefragt werden
+            hosts = {urlparse(url).netloc for url in its.codepoints.urls}
+            its.backoff.zustand_laden({
+                host: {**schalter, "freigabe": self._auf_uhr(schalter.get("freigabe", 0))}
+                for host, schalter in backoff.items() if host in hosts
+            })
+        except (AttributeError, KeyError, TypeError, ValueError) as exc:
+            self._melden("warn", f"Checkpoint {self.pfad} ist ungültig und wird ignoriert: {exc}")
+            return False
+
+        stand = self._stand(its)
+        self._gespeichert = stand
+        entfernt = sum(len(codes) for codes in stand["codepoints"]["entfernt"].values())
+        pausiert = sum(len(codes) for codes in stand["codepoints"]["pausiert"].values())
+        if entfernt or pausiert or stand["backoff"]:
+            self._melden("info", f"Suchstand wiederhergestellt: {entfernt} Code(s) aussortiert, "
+                                 f"{pausiert} Code(s) pausiert, {len(stand['backoff'])} Backend(s) gestört")
+        return True
+
+    def speichern(self, its) -> bool:
+        """
+        Schreibt den Suchstand, falls er sich seit dem letzten Aufruf geändert hat.
+
+        :return: True, falls geschrieben wurde
+        """
+        if self._geloescht:
+            return False
+        stand = self._stand(its)
+        if stand == self._gespeichert:
+            return False
+
+        schreibe_json_atomar(self.pfad, {
+            "version": VERSION,
+            "schluessel": self.schluessel,
+            "gespeichert": self._systemzeit(),
+            "codepoints": {
+                "entfernt": stand["codepoints"]["entfernt"],
+                "pausiert": {
+                    url: {code: self._auf_systemzeit(freigabe) for code, freigabe in pausiert.items()}
+                    for url, pausiert in stand["codepoints"]["pausiert"].items()
+                },
+            },
+            "backoff": {
+                host: {**schalter, "freigabe": self._auf_systemzeit(schalter["freigabe"])}
+                for host, schalter in stand["backoff"].items()
+            },
+        })
+        self._gespeichert = stand
+        return True
+
+    def schluessel_aendern(self, kontaktdaten: Dict):
+        """
+        Verknüpft den Checkpoint mit geänderten Kontaktdaten, z. B. nach dem
+        Nachladen. Der alte Checkpoint wird gelöscht, der neue beim nächsten
+        speichern geschrieben.
+        """
+        neu = schluessel(kontaktdaten)
+        if neu == self.schluessel:
+            return
+        self._entfernen()
+        self._gespeichert = None
+        self.schluessel = neu
+
+    def loeschen(self):
+        """
+        Löscht den Checkpoint nach einer erfolgreichen Buchung. Danach wird
+        nicht mehr gespeichert.
+        """
+        self._geloescht = True
+        self._entfernen()
+
+    def _entfernen(self):
+        try:
+            os.remove(self.pfad)
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def _stand(its) -> Dict[str, Any]:
+        return {"codepoints": its.codepoints.zustand(), "backoff": its.backoff.zustand()}
+
+    def _auf_systemzeit(self, zeitpunkt: float) -> float:
+        if not zeitpunkt:
+            return 0.0
+        return zeitpunkt - self._uhr() + self._systemzeit()
+
+    def _auf_uhr(self, zeitpunkt: float) -> float:
+        if not zeitpunkt:
+            return 0.0
+        return float(zeitpunkt) - self._systemzeit() + self._uhr()
+
+    def _melden(self, level: str, msg: str):
+        if self.log is not None:
+            getattr(self.log, level)(msg)
+
+
+def schluessel(kontaktdaten: Dict) -> str:
+    """
+    :return: Hash der Kontaktdaten. Formatierung und Reihenfolge der Keys in
+        der Datei spielen keine Rolle.
+    """
+    kanonisch = json.dumps(kontaktdaten, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(kanonisch.encode("utf-8")).hexdigest()[:16]
@@ -0,0 +1,380 @@
+"""
+Benutzerweiter Cache für Chromium und Chromedriver, den alle vaccipy-Kopien
+und Revisionen auf einem Rechner teilen.
+
+Entpackte Dateien werden nach ihrem SHA-256 unter objekte/ abgelegt. Eine
+Revision besteht aus einem Manifest unter manifeste/ und einem Verzeichnis
+unter revisionen/<plattform>/<revision>, dessen Dateien Hardlinks (oder
+Reflinks bzw. Kopien, falls das Dateisystem keine Hardlinks erlaubt) auf
+die Objekte sind. Unveränderte Dateien belegen daher über Revisionen hinweg
+nur einmal Platz, und eine bereits bekannte Revision ist ohne Download
+sofort wiederhergestellt.
+
+Aufruf:
+    python -m tools.chromium_cache liste
+    python -m tools.chromium_cache gc --behalten 2
+
+Der Ort des Caches kann über VACCIPY_CHROMIUM_CACHE geändert werden,
+VACCIPY_CHROMIUM_CACHE=0 schaltet den Cache ab.
+"""
+
+import argparse
+import hashlib
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from tools.cache import lese_json, schreibe_json_atomar
+
+# Linux: ioctl FICLONE, z. B. auf btrfs und XFS
+_FICLONE = 0x40049409
+
+# Temporäre Objekte, die jünger sind, schreibt womöglich gerade ein anderer
+# Prozess in aufnehmen
+TMP_KARENZ = 60 * 60
+
+
+def cache_verzeichnis() -> Optional[Path]:
+    """
+    :return: Verzeichnis des Caches oder None, falls er abgeschaltet ist
+    """
+    pfad = os.environ.get("VACCIPY_CHROMIUM_CACHE")
+    if pfad is not None:
+        if pfad.strip().lower() in ("", "0", "false"):
+            return None
+        return Path(pfad)
+
+    if sys.platform.startswith("win"):
+        basis = Path(os.environ.get("LOCALAPPDATA") or Path.home() / "AppData" / "Local")
+    elif sys.platform.startswith("darwin"):
+        basis = Path.home() / "Library" / "Caches"
+    else:
+        basis = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache")
+    return basis / "vaccipy" / "chromium"
+
+
+def _sha256(pfad: Path) -> str:
+    sha256 = hashlib.sha256()
+    with pfad.open("rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def _ausfuehrbar(pfad: Path) -> bool:
+    return bool(pfad.stat().st_mode & stat.S_IXUSR)
+
+
+def _reflink(quelle: Path, ziel: Path) -> bool:
+    """
+    Legt eine Copy-on-Write-Kopie an, falls das Dateisystem es unterstützt.
+
+    :return: False, falls keine Reflinks möglich sind
+    """
+    if sys.platform.startswith("linux"):
+        import fcntl
+        try:
+            with quelle.open("rb") as q, ziel.open("wb") as z:
+                fcntl.ioctl(z.fileno(), _FICLONE, q.fileno())
+            return True
+        except OSError:
+            if ziel.exists():
+                ziel.unlink()
+            return False
+    if sys.platform.startswith("darwin"):
+        import ctypes
+        libc = ctypes.CDLL(None, use_errno=True)
+        if not hasattr(libc, "clonefile"):
+            return False
+        return libc.clonefile(os.fsencode(quelle), os.fsencode(ziel), 0) == 0
+    return False
+
+
+def _verknuepfen(quelle: Path, ziel: Path):
+    """
+    Legt ziel als Hardlink, Reflink oder Kopie von quelle an.
+    """
+    try:
+        os.link(quelle, ziel)
+        return
+    except OSError:
+        pass
+    if not _reflink(quelle, ziel):
+        shutil.copy2(quelle, ziel)
+
+
+class ChromiumCache:
+    """
+    Inhaltsadressierter Cache entpackter Chromium- und Chromedriver-Dateien.
+
+    Beispiel:
+        cache = ChromiumCache()
+        if not cache.wiederherstellen("linux", "869685", "chrome-linux"):
+            ...  # herunterladen und nach cache.revision_pfad(...) entpacken
+            cache.aufnehmen("linux", "869685", "chrome-linux")
+    """
+
+    def __init__(self, wurzel: Path = None):
+        """
+        :param wurzel: Verzeichnis des Caches, standardmäßig cache_verzeichnis()
+        """
+        self.wurzel = Path(wurzel or cache_verzeichnis())
+        self.objekte = self.wurzel / "objekte"
+        self.manifeste = self.wurzel / "manifeste"
+        self.revisionen = self.wurzel / "revisionen"
+        self.downloads = self.wurzel / "downloads"
+        for ordner in (self.objekte, self.manifeste, self.revisionen, self.downloads):
+            ordner.mkdir(parents=True, exist_ok=True)
+
+    def revision_pfad(self, plattform: str, revision: str) -> Path:
+        """
+        :return: Verzeichnis der entpackten Revision, entspricht
+            tools/local-chromium/<revision>
+        """
+        return self.revisionen / plattform / revision
+
+    def _manifest_pfad(self, plattform: str, revision: str, unterordner: str) -> Path:
+        return self.manifeste / f"{plattform}-{revision}-{unterordner}.json"
+
+    def _objekt_pfad(self, sha256: str, ausfuehrbar: bool) -> Path:
+        # Hardlinks teilen sich die Rechte, ausführbare Dateien sind daher
+        # eigene Objekte
+        return self.objekte / sha256[:2] / (sha256 + (".x" if ausfuehrbar else ""))
+
+    def benutzt(self, plattform: str, revision: str):
+        """
+        Merkt sich die Verwendung einer Revision für gc().
+        """
+        stempel = self.revisionen / plattform / f"{revision}.benutzt"
+        try:
+            stempel.touch()
+        except OSError:
+            pass
+
+    def aufnehmen(self, plattform: str, revision: str, unterordner: str):
+        """
+        Legt alle Dateien aus revision_pfad()/unterordner als Objekte ab und
+        ersetzt sie durch Verknüpfungen auf bereits vorhandene Objekte mit
+        gleichem Inhalt. Anschließend wird das Manifest geschrieben.
+
+        :param unterordner: Oberster Ordner im Archiv, z. B. chrome-linux
+        """
+        basis = self.revision_pfad(plattform, revision)
+        eintraege = []
+        for wurzel, ordner, dateien in os.walk(basis / unterordner):
+            for name in ordner + dateien:
+                pfad = Path(wurzel) / name
+                relativ = pfad.relative_to(basis).as_posix()
+                if pfad.is_symlink():
+                    eintraege.append({"pfad": relativ, "link": os.readlink(pfad)})
+                elif pfad.is_file():
+                    eintraege.append(self._objekt_ablegen(pfad, relativ))
+
+        schreibe_json_atomar(str(self._manifest_pfad(plattform, revision, unterordner)), {
+            "plattform": plattform,
+            "revision": revision,
+            "dateien": eintraege,
+        })
+        self.benutzt(plattform, revision)
+
+    def _objekt_ablegen(self, pfad: Path, relativ: str) -> Dict:
+        sha256 = _sha256(pfad)
+        ausfuehrbar = _ausfuehrbar(pfad)
+        objekt = self._objekt_pfad(sha256, ausfuehrbar)
+        objekt.parent.mkdir(exist_ok=True)
+
+        if objekt.exists():
+            # Gleicher Inhalt aus einer anderen Revision: Datei durch eine
+            # Verknüpfung auf das vorhandene Objekt ersetzen
+            tmp = pfad.with_name(pfad.name + ".tmp")
+            _verknuepfen(objekt, tmp)
+            os.replace(tmp, pfad)
+        else:
+            tmp = objekt.with_name(objekt.name + f".{os.getpid()}.tmp")
+            _verknuepfen(pfad, tmp)
+            os.replace(tmp, objekt)
+
+        return {"pfad": relativ, "sha256": sha256, "ausfuehrbar": ausfuehrbar}
+
+    def wiederherstellen(self, plattform: str, revision: str, unterordner: str) -> bool:
+        """
+        Stellt eine Revision aus dem Manifest wieder her, falls sie bereits
+        im Cache war und alle Objekte noch vorhanden sind.
+
+        :return: True, falls revision_pfad()/unterordner danach vollständig ist
+        """
+        manifest = lese_json(str(self._manifest_pfad(plattform, revision, unterordner)))
+        if not manifest:
+            return False
+
+        dateien = manifest["dateien"]
+        if not all("link" in eintrag or self._objekt_pfad(eintrag["sha256"], eintrag["ausfuehrbar"]).exists()
+                   for eintrag in dateien):
+            return False
+
+        basis = self.revision_pfad(plattform, revision)
+        basis.mkdir(parents=True, exist_ok=True)
+        tmp = Path(tempfile.mkdtemp(prefix=f".{unterordner}-", dir=basis))
+        try:
+            for eintrag in dateien:
+                ziel = tmp / Path(eintrag["pfad"]).relative_to(unterordner)
+                ziel.parent.mkdir(parents=True, exist_ok=True)
+                if "link" in eintrag:
+                    os.symlink(eintrag["link"], ziel)
+                else:
+                    _verknuepfen(self._objekt_pfad(eintrag["sha256"], eintrag["ausfuehrbar"]), ziel)
+            try:
+                os.replace(tmp, basis / unterordner)
+            except OSError:
+                # Ein anderer Prozess war schneller
+                if not (basis / unterordner).is_dir():
+                    raise
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+        self.benutzt(plattform, revision)
+        return True
+
+    def liste(self) -> List[Dict]:
+        """
+        :return: Alle Revisionen im Cache, zuletzt benutzte zuerst
+        """
+        revisionen = []
+        for manifest_pfad in self.manifeste.glob("*.json"):
+            manifest = lese_json(str(manifest_pfad))
+            if not manifest:
+                continue
+            stempel = self.revisionen / manifest["plattform"] / f"{manifest['revision']}.benutzt"
+            revisionen.append({
+                "plattform": manifest["plattform"],
+                "revision": manifest["revision"],
+                "manifest": manifest_pfad,
+                "dateien": manifest["dateien"],
+                "benutzt": stempel.stat().st_mtime if stempel.exists() else manifest_pfad.stat().st_mtime,
+            })
+        revisionen.sort(key=lambda r: r["benutzt"], reverse=True)
+        return revisionen
+
+    def gc(self, behalten: int = 2, aktiv: List[str] = (), trocken: bool = False) -> Dict:
+        """
+        Entfernt selten benutzte Revisionen und nicht mehr benötigte Objekte.
+
+        :param behalten: Anzahl der zuletzt benutzten Revisionen je
+            Plattform, die erhalten bleiben
+        :param aktiv: Revisionen, die in jedem Fall erhalten bleiben
+        :param trocken: Nur berechnen, nichts löschen
+        :return: Entfernte Revisionen und freigegebene Bytes
+        """
+        revisionen = self.liste()
+
+        nach_plattform: Dict[str, List[str]] = {}
+        for r in revisionen:
+            bekannt = nach_plattform.setdefault(r["plattform"], [])
+            if r["revision"] not in bekannt:
+                bekannt.append(r["revision"])
+        zu_behalten = {
+            (plattform, revision)
+            for plattform, liste in nach_plattform.items()
+            for revision in liste[:behalten]
+        } | {(r["plattform"], r["revision"]) for r in revisionen if r["revision"] in aktiv}
+
+        entfernt = []
+        referenziert = set()
+        for r in revisionen:
+            schluessel = (r["plattform"], r["revision"])
+            if schluessel in zu_behalten:
+                referenziert.update(
+                    self._objekt_pfad(e["sha256"], e["ausfuehrbar"]).name
+                    for e in r["dateien"] if "link" not in e)
+                continue
+            entfernt.append(f"{r['plattform']}/{r['revision']}")
+            if not trocken:
+                r["manifest"].unlink()
+
+        # Hardlinks in den Verzeichnissen entfernter Revisionen. Ohne trocken
+        # sind diese bereits gelöscht und in st_nlink nicht mehr enthalten.
+        entfernte_links: Dict[tuple, int] = {}
+        for eintrag in set(entfernt):
+            plattform, revision = eintrag.split("/")
+            if trocken:
+                for ordner, _, dateien in os.walk(self.revision_pfad(plattform, revision)):
+                    for datei in dateien:
+                        info = os.lstat(os.path.join(ordner, datei))
+                        if stat.S_ISREG(info.st_mode):
+                            inode = (info.st_dev, info.st_ino)
+                            entfernte_links[inode] = entfernte_links.get(inode, 0) + 1
+            else:
+                shutil.rmtree(self.revision_pfad(plattform, revision), ignore_errors=True)
+                stempel = self.revisionen / plattform / f"{revision}.benutzt"
+                if stempel.exists():
+                    stempel.unlink()
+
+        freigegeben = 0
+        for objekt in self.objekte.glob("*/*"):
+            if objekt.name in referenziert:
+                continue
+            info = objekt.stat()
+            if objekt.suffix == ".tmp" and time.time() - info.st_mtime < TMP_KARENZ:
+                continue
+            # Weitere Hardlinks bedeuten, dass eine Revision es noch verwendet
+            if info.st_nlink - entfernte_links.get((info.st_dev, info.st_ino), 0) > 1:
+                continue
+            freigegeben += info.st_size
+            if not trocken:
+                objekt.unlink()
+
+        for download in self.downloads.glob("*"):
+            # Abgebrochene Downloads nach einer Woche verwerfen
+            if time.time() - download.stat().st_mtime > 7 * 24 * 60 * 60:
+                freigegeben += download.stat().st_size
+                if not trocken:
+                    download.unlink()
+
+        return {"entfernt": sorted(set(entfernt)), "freigegeben_bytes": freigegeben}
+
+    def groesse(self) -> int:
+        """
+        :return: Belegter Platz der Objekte in Bytes
+        """
+        return sum(objekt.stat().st_size for objekt in self.objekte.glob("*/*"))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m tools.chromium_cache",
+        description="Gemeinsamer Cache für Chromium und Chromedriver")
+    subparsers = parser.add_subparsers(dest="befehl", required=True)
+    subparsers.add_parser("liste", help="Revisionen und belegten Platz anzeigen")
+    parser_gc = subparsers.add_parser("gc", help="Alte Revisionen und unbenutzte Dateien entfernen")
+    parser_gc.add_argument("--behalten", type=int, default=2,
+                           help="Anzahl der zuletzt benutzten Revisionen je Plattform")
+    parser_gc.add_argument("--trocken", action="store_true",
+                           help="Nur anzeigen, was entfernt würde")
+    args = parser.parse_args()
+
+    if cache_verzeichnis() is None:
+        print("Der Cache ist über VACCIPY_CHROMIUM_CACHE abgeschaltet.")
+        return
+
+    cache = ChromiumCache()
+    if args.befehl == "liste":
+        print(f"Cache: {cache.wurzel}")
+        for r in cache.liste():
+            benutzt = time.strftime("%Y-%m-%d %H:%M", time.localtime(r["benutzt"]))
+            print(f"{r['plattform']:>8} {r['revision']:>8}  {r['manifest'].stem:<40} zuletzt benutzt {benutzt}")
+        print(f"Belegt: {cache.groesse() / 2 ** 20:.1f} MB")
+    else:
+        from tools.chromium_downloader import REVISION
+        ergebnis = cache.gc(behalten=args.behalten, aktiv=[REVISION], trocken=args.trocken)
+        for eintrag in ergebnis["entfernt"]:
+            print(f"Entfernt: {eintrag}")
+        print(f"Freigegeben: {ergebnis['freigegeben_bytes'] / 2 ** 20:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
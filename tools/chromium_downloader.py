@@ -8,13 +8,19 @@
 
 """Chromium download module."""
 
-from io import BytesIO
+import base64
+import functools
+import hashlib
+import threading
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from tools.cache import lese_json, schreibe_json_atomar
 from tools.clog import CLogger
 import os
 from pathlib import Path
 import stat
 import sys
 import platform
+from typing import Dict, List, Optional
 from zipfile import ZipFile
 import urllib3
 from tqdm import tqdm
@@ -64,6 +70,19 @@ NO_PROGRESS_BAR = os.environ.get('PYPPETEER_NO_PROGRESS_BAR', '')
 if NO_PROGRESS_BAR.lower() in ('1', 'true'):
     NO_PROGRESS_BAR = True  # type: ignore
 
+# Number of parallel range requests per file, 1 disables segmenting
+DOWNLOAD_SEGMENTS = max(1, int(os.environ.get('PYPPETEER_DOWNLOAD_SEGMENTS', 4)))
+# Files smaller than this are fetched with a single request
+MIN_SEGMENT_SIZE = 8 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+# Attempts per segment before the download is given up; the partial file
+# is kept and resumed on the next run
+DOWNLOAD_RETRIES = 5
+# Write the resume state after this many bytes per segment
+STATE_INTERVAL = 4 * 1024 * 1024
+# Wait before the n-th retry of a segment: RETRY_DELAY * 2 ** (n - 1) seconds
+RETRY_DELAY = 1.0
+
 # Windows archive name changed at r591479.
 windowsArchive = 'chrome-win' if int(REVISION) > 591479 else 'chrome-win32'
 
@@ -136,8 +155,188 @@ def get_url(binary: str) -> str:
         return downloadWebdriverURLs[current_platform()]
 
 
-def download_zip(url: str, binary: str) -> BytesIO:
-    """Download data from url."""
+def _remote_info(http: urllib3.PoolManager, url: str, binary: str) -> Dict:
+    """Get size, range support, validator and md5 of a remote file."""
+    r = http.request('HEAD', url)
+    if r.status >= 400:
+        raise OSError(
+            f'{binary} downloadable not found at {url}: '
+            f'Received status {r.status}.\n'
+        )
+    try:
+        size = int(r.headers['content-length'])
+    except (KeyError, ValueError):
+        size = None
+    return {
+        'size': size,
+        'ranges': r.headers.get('accept-ranges', '').lower() == 'bytes',
+        'validator': r.headers.get('etag') or r.headers.get('last-modified'),
+        'md5': _md5_from_headers(r.headers),
+    }
+
+
+def _md5_from_headers(headers) -> Optional[str]:
+    """Get the hex md5 from a Google Cloud Storage ``x-goog-hash`` header."""
+    for value in headers.get('x-goog-hash', '').split(','):
+        name, _, digest = value.strip().partition('=')
+        if name == 'md5' and digest:
+            try:
+                return base64.b64decode(digest).hex()
+            except ValueError:
+                return None
+    return None
+
+
+def _split(size: int, count: int) -> List[Dict]:
+    """Split ``size`` bytes into ``count`` segments."""
+    step = -(-size // count)
+    return [
+        {'start': start, 'end': min(start + step, size) - 1, 'done': 0}
+        for start in range(0, size, step)
+    ]
+
+
+def _load_state(state_path: Path, url: str, info: Dict,
+                part_path: Path) -> Optional[List[Dict]]:
+    """Get the segments of an interrupted download of the same file."""
+    state = lese_json(str(state_path))
+    if (
+        not state
+        or not part_path.exists()
+        or state.get('url') != url
+        or state.get('size') != info['size']
+        or state.get('validator') != info['validator']
+    ):
+        return None
+    return state['segments']
+
+
+class _FileChanged(OSError):
+    """The server answered an If-Range request with the whole file."""
+
+
+class _Stopped(Exception):
+    """Another segment failed, this one stopped early."""
+
+
+def _fetch_segment(http: urllib3.PoolManager, url: str, part_path: Path,
+                   segment: Dict, validator: Optional[str], progress,
+                   save_state, stop: threading.Event) -> None:
+    """Download one segment into its place in ``part_path``.
+
+    Dropped connections, 5xx and 429 are retried from the current offset.
+    Once ``stop`` is set, e.g. because another segment failed, the segment
+    returns after the current chunk.
+    """
+    length = segment['end'] - segment['start'] + 1
+    attempt = 0
+    while segment['done'] < length:
+        if stop.is_set():
+            raise _Stopped()
+        offset = segment['start'] + segment['done']
+        headers = {'Range': f'bytes={offset}-{segment["end"]}'}
+        if validator:
+            # Server sends the whole (changed) file instead of a wrong range
+            headers['If-Range'] = validator
+        try:
+            r = http.request('GET', url, headers=headers,
+                             preload_content=False, retries=False)
+        except urllib3.exceptions.HTTPError as e:
+            attempt = _retry(attempt, e, save_state, stop)
+            continue
+        try:
+            if r.status == 429 or r.status >= 500:
+                attempt = _retry(attempt, OSError(f'Received status {r.status}'),
+                                 save_state, stop)
+                continue
+            if r.status == 200 and validator:
+                raise _FileChanged(f'{url} changed since the download started.')
+            if r.status != 206:
+                save_state()
+                raise OSError(
+                    f'Range request for {url} failed: '
+                    f'Received status {r.status}.'
+                )
+            unsaved = 0
+            with part_path.open('r+b') as f:
+                f.seek(offset)
+                for chunk in r.stream(CHUNK_SIZE):
+                    f.write(chunk)
+                    segment['done'] += len(chunk)
+                    progress(len(chunk))
+                    unsaved += len(chunk)
+                    if unsaved >= STATE_INTERVAL:
+                        f.flush()
+                        save_state()
+                        unsaved = 0
+                    if stop.is_set():
+                        break
+        except urllib3.exceptions.HTTPError as e:
+            attempt = _retry(attempt, e, save_state, stop)
+        finally:
+            r.release_conn()
+
+
+def _retry(attempt: int, error: Exception, save_state, stop: threading.Event) -> int:
+    """Wait before the next attempt or give up after DOWNLOAD_RETRIES."""
+    attempt += 1
+    if attempt >= DOWNLOAD_RETRIES:
+        save_state()
+        raise OSError(f'Download abgebrochen: {error}') from error
+    log.warn(f'Download unterbrochen ({error}), setze fort ...')
+    stop.wait(RETRY_DELAY * 2 ** (attempt - 1))
+    return attempt
+
+
+def _fetch_whole(http: urllib3.PoolManager, url: str, part_path: Path,
+                 binary: str, progress) -> None:
+    """Download the file with a single request, without resume."""
+    r = http.request('GET', url, preload_content=False)
+    try:
+        if r.status >= 400:
+            raise OSError(
+                f'{binary} downloadable not found at {url}: '
+                f'Received status {r.status}.\n'
+            )
+        with part_path.open('wb') as f:
+            for chunk in r.stream(CHUNK_SIZE):
+                f.write(chunk)
+                progress(len(chunk))
+    finally:
+        r.release_conn()
+
+
+def _unlink(path: Path) -> None:
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def _md5(path: Path) -> str:
+    md5 = hashlib.md5()
+    with path.open('rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def download_zip(url: str, binary: str, folder: Path = None,
+                 segments: int = None, position: int = 0) -> Path:
+    """Download a zip file from url to disk and return its path.
+
+    Data is written to ``<name>.part`` next to the target while it is
+    downloaded. If the server supports range requests, the file is fetched
+    in parallel segments and an interrupted download is resumed on the next
+    call. The md5 from the ``x-goog-hash`` header is verified if present.
+    """
+    folder = Path(folder or DOWNLOADS_FOLDER / REVISION)
+    folder.mkdir(parents=True, exist_ok=True)
+    zip_path = folder / url.rsplit('/', 1)[-1]
+    part_path = zip_path.with_name(zip_path.name + '.part')
+    state_path = zip_path.with_name(zip_path.name + '.part.json')
+    segments = segments or DOWNLOAD_SEGMENTS
+
     log.info(
         f'Starte den Download von {binary}. Dieser Vorgang kann einige Minuten dauern.'
     )
@@ -149,56 +348,125 @@ def download_zip(url: str, binary: str) -> BytesIO:
     # for more.
     # urllib3.disable_warnings()
 
-    with urllib3.PoolManager() as http:
-        # Get data from url.
-        # set preload_content=False means using stream later.
-        r = http.request('GET', url, preload_content=False)
-        if r.status >= 400:
-            raise OSError(
-                f'{binary} downloadable not found at {url}: '
-                f'Received {r.data.decode()}.\n'
-            )
-
-        # 10 * 1024
-        _data = BytesIO()
-        if NO_PROGRESS_BAR:
-            for chunk in r.stream(10240):
-                _data.write(chunk)
-        else:
-            try:
-                total_length = int(r.headers['content-length'])
-            except (KeyError, ValueError, AttributeError):
-                total_length = 0
-            process_bar = tqdm(total=total_length)
-            for chunk in r.stream(10240):
-                _data.write(chunk)
-                process_bar.update(len(chunk))
-            process_bar.close()
-
-    print()
+    with urllib3.PoolManager(maxsize=segments) as http:
+        try:
+            info = _fetch(http, url, binary, part_path, state_path, segments, position)
+        except _FileChanged:
+            # Partial data belongs to the old file, start over once
+            log.warn(f'{binary} wurde auf dem Server geändert, starte den Download neu.')
+            _unlink(part_path)
+            _unlink(state_path)
+            info = _fetch(http, url, binary, part_path, state_path, segments, position)
+
+    if info['size'] and part_path.stat().st_size != info['size']:
+        part_path.unlink()
+        _unlink(state_path)
+        raise OSError(f'Download von {binary} unvollständig.')
+    if info['md5'] and _md5(part_path) != info['md5']:
+        part_path.unlink()
+        _unlink(state_path)
+        raise OSError(f'Prüfsumme von {binary} stimmt nicht, bitte erneut versuchen.')
+
+    os.replace(part_path, zip_path)
+    _unlink(state_path)
     log.info(f'Download von {binary} abgeschlossen.')
-    return _data
-
-
-def extract_zip(data: BytesIO, path: Path, binary: str) -> None:
-    """Extract zipped data to path."""
+    return zip_path
+
+
+def _fetch(http: urllib3.PoolManager, url: str, binary: str, part_path: Path,
+           state_path: Path, segments: int, position: int) -> Dict:
+    """Download ``url`` to ``part_path`` and return the remote info.
+
+    :raise _FileChanged: The file changed since the state was written
+    """
+    info = _remote_info(http, url, binary)
+
+    progress_bar = None
+    if not NO_PROGRESS_BAR:
+        progress_bar = tqdm(total=info['size'] or 0, desc=binary,
+                            unit='B', unit_scale=True, position=position)
+    progress_lock = threading.Lock()
+
+    def progress(n: int) -> None:
+        if progress_bar is not None:
+            with progress_lock:
+                progress_bar.update(n)
+
+    try:
+        if not info['ranges'] or not info['size']:
+            _fetch_whole(http, url, part_path, binary, progress)
+            return info
+
+        parts = _load_state(state_path, url, info, part_path)
+        if parts is None:
+            count = min(segments, max(1, info['size'] // MIN_SEGMENT_SIZE))
+            parts = _split(info['size'], count)
+            with part_path.open('wb') as f:
+                f.truncate(info['size'])
+        else:
+            done = sum(part['done'] for part in parts)
+            log.info(f'Setze Download von {binary} bei {done // 2 ** 20} MB fort.')
+            progress(done)
+
+        state_lock = threading.Lock()
+
+        def save_state() -> None:
+            with state_lock:
+                schreibe_json_atomar(str(state_path), {
+                    'url': url,
+                    'size': info['size'],
+                    'validator': info['validator'],
+                    'segments': parts,
+                })
+
+        save_state()
+        stop = threading.Event()
+        with ThreadPoolExecutor(max_workers=len(parts)) as executor:
+            futures = [
+                executor.submit(_fetch_segment, http, url, part_path,
+                                part, info['validator'], progress,
+                                save_state, stop)
+                for part in parts
+            ]
+            # Stop the other segments on the first failure instead of
+            # waiting for them to finish
+            wait(futures, return_when=FIRST_EXCEPTION)
+            stop.set()
+        errors = [
+            future.exception() for future in futures
+            if future.exception() is not None
+            and not isinstance(future.exception(), _Stopped)
+        ]
+        save_state()
+        if errors:
+            raise errors[0]
+        return info
+    finally:
+        if progress_bar is not None:
+            progress_bar.close()
+
+
+def extract_zip(zip_path: Path, path: Path, binary: str) -> None:
+    """Extract a zip file on disk to path and remove it.
+
+    The zip central directory sits at the end of the archive, so extraction
+    starts once the download is complete, but reads from disk instead of
+    holding the archive in memory.
+    """
+    if not path.exists():
+        path.mkdir(parents=True)
     # On mac zipfile module cannot extract correctly, so use unzip instead.
     if current_platform() == 'mac':
         import subprocess
         import shutil
 
-        zip_path = path / 'temp.zip'
-        if not path.exists():
-            path.mkdir(parents=True)
-        with zip_path.open('wb') as f:
-            f.write(data.getvalue())
         if not shutil.which('unzip'):
             raise OSError(
                 f'Failed to automatically extract {binary}.'
                 f'Please unzip {zip_path} manually.'
             )
         proc = subprocess.run(
-            ['unzip', str(zip_path)],
+            ['unzip', '-o', str(zip_path)],
             cwd=str(path),
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
@@ -206,49 +474,119 @@ def extract_zip(data: BytesIO, path: Path, binary: str) -> None:
         if proc.returncode != 0:
             log.error(proc.stdout.decode())
             raise OSError(f'Failed to unzip {zip_path}.')
-        if chromium_executable().exists() and zip_path.exists():
-            zip_path.unlink()
     else:
-        with ZipFile(data) as zf:
+        with ZipFile(zip_path) as zf:
             zf.extractall(str(path))
-    if binary == 'chromium':
-        exec_path = chromium_executable()
-    elif binary == 'webdriver':
-        exec_path = webdriver_executable()
+    exec_path = path / _relative_executable(binary)
     if not exec_path.exists():
         raise IOError(f'Failed to extract {binary}.')
     exec_path.chmod(
         exec_path.stat().st_mode | stat.S_IXOTH | stat.S_IXGRP | stat.S_IXUSR
     )
+    zip_path.unlink()
     log.info(f"{binary} exportiert nach '{path}'")
 
 
-def download_chromium(binary='chromium') -> None:
+def download_chromium(binary='chromium', position: int = 0) -> None:
     """Download and extract chromium."""
-    extract_zip(
-        download_zip(get_url(binary), binary),
-        DOWNLOADS_FOLDER / REVISION,
-        binary,
-    )
+    _download(binary, position)
 
 
-def download_webdriver(binary='webdriver') -> None:
+def download_webdriver(binary='webdriver', position: int = 0) -> None:
     """Download and extract webdriver."""
+    _download(binary, position)
+
+
+def _download(binary: str, position: int) -> None:
+    """Restore binary from the shared cache or download and extract it.
+
+    Without a usable cache, binary is extracted to DOWNLOADS_FOLDER.
+    """
+    cache = _cache()
+    if cache is None:
+        extract_zip(
+            download_zip(get_url(binary), binary, position=position),
+            DOWNLOADS_FOLDER / REVISION,
+            binary,
+        )
+        return
+
+    folder = _relative_executable(binary).parts[0]
+    if cache.wiederherstellen(current_platform(), REVISION, folder):
+        log.info(f'{binary} aus dem Cache {cache.wurzel} wiederhergestellt.')
+        return
+    path = cache.revision_pfad(current_platform(), REVISION)
     extract_zip(
-        download_zip(get_url(binary), binary),
-        DOWNLOADS_FOLDER / REVISION,
+        download_zip(get_url(binary), binary, folder=cache.downloads,
+                     position=position),
+        path,
         binary,
     )
+    cache.aufnehmen(current_platform(), REVISION, folder)
+
+
+def download_missing() -> None:
+    """Download chromium and webdriver concurrently, if they are missing."""
+    downloads = []
+    if not check_chromium():
+        downloads.append(download_chromium)
+    if not check_webdriver():
+        downloads.append(download_webdriver)
+    if not downloads:
+        return
+
+    with ThreadPoolExecutor(max_workers=len(downloads)) as executor:
+        futures = [
+            executor.submit(download, position=position)
+            for position, download in enumerate(downloads)
+        ]
+        for future in futures:
+            future.result()
+
+
+def _relative_executable(binary: str) -> Path:
+    """Get path of the executable relative to the revision folder."""
+    if binary == 'chromium':
+        executable = chromiumExecutable[current_platform()]
+    else:
+        executable = webdriverExecutable[current_platform()]
+    return executable.relative_to(DOWNLOADS_FOLDER / REVISION)
+
+
+@functools.lru_cache(maxsize=None)
+def _cache():
+    """Get the shared browser cache or None if it is disabled or unusable."""
+    from tools.chromium_cache import ChromiumCache, cache_verzeichnis
+
+    if cache_verzeichnis() is None:
+        return None
+    try:
+        return ChromiumCache()
+    except OSError as e:
+        log.warn(f'Cache für Chromium nicht verwendbar: {e}')
+        return None
+
+
+def _executable(binary: str) -> Path:
+    """Get path of an executable, checking the shared cache first."""
+    relative = _relative_executable(binary)
+    cache = _cache()
+    if cache is not None:
+        path = cache.revision_pfad(current_platform(), REVISION) / relative
+        if path.exists():
+            cache.benutzt(current_platform(), REVISION)
+            return path
+    return DOWNLOADS_FOLDER / REVISION / relative
 
 
 def chromium_executable() -> Path:
     """Get path of the chromium executable."""
-    return chromiumExecutable[current_platform()]
+    return _executable('chromium')
 
 
 def webdriver_executable() -> Path:
     """Get path of the webdriver executable."""
-    return webdriverExecutable[current_platform()]
+    return _executable('webdriver')
 
 
 def check_chromium() -> bool:
@@ -262,7 +600,4 @@ def check_webdriver() -> bool:
 
 
 if __name__ == '__main__':
-    if not check_chromium():
-        download_chromium()
-    if not check_webdriver():
-        download_webdriver()
+    download_missing()
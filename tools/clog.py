@@ -1,7 +1,14 @@
+import atexit
+import gzip
+import json
 import logging
 import os
+import queue
+import shutil
 import sys
 from logging import StreamHandler as _SH
+from logging.handlers import QueueHandler as _QH
+from logging.handlers import QueueListener as _QL
 from logging.handlers import TimedRotatingFileHandler as _TRFH
 
 # windows only: ←[0m enfernen
@@ -26,6 +33,11 @@ class _CustomLogger(logging.Logger):
         if self.isEnabledFor(_SUCCESS):
             self._log(_SUCCESS, msg, args, **kwargs)
 
+    def findCaller(self, stack_info=False, stacklevel=1):
+        # none of the formats use file, line or function name, so skip the
+        # stack walk in the calling thread
+        return "(unknown file)", 0, "(unknown function)", None
+
 
 class _CustomFormat(object):
     DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
@@ -48,27 +60,67 @@ class _CustomFormat(object):
                                                color_end=color_end)
 
 
+class _JsonFormat(logging.Formatter):
+    """One JSON object per line for structured log output.
+
+    """
+
+    def format(self, record):
+        return json.dumps({
+            "time": record.created,
+            "asctime": self.formatTime(record, _CustomFormat.DATE_FORMAT),
+            "name": record.name,
+            "level": record.levelname,
+            "thread": record.threadName,
+            "prefix": record.prefix,
+            "message": record.getMessage(),
+        }, ensure_ascii=False)
+
+
 class _MessageFilter(logging.Filter):
     """Setting/Formatting all record arguments and adding color.
 
+    Attached to the handlers, so with the asynchronous backend this runs in
+    the listener thread instead of the calling thread.
     """
 
     def filter(self, record):
-        record.prefix = ""
+        record.prefix = getattr(record, "prefix", None) or ""
         record.levelname = record.levelname.replace("Level ", "").lower()
         record.color = _COLORS[record.levelname.upper()]
 
         if record.threadName == "MainThread":
             record.threadName = 0
 
-        if "prefix" in record.args:
-            prefix = record.args.get("prefix")
-            if prefix:
-                record.prefix = record.args.get("prefix")
-
         return True
 
 
+class _QueueHandler(_QH):
+    """Puts records into the queue without formatting them first.
+
+    CLogger passes the final message without arguments and never attaches
+    exc_info, so the record can be handed over as is.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+# QueueListener per module, to flush pending records
+_LISTENERS = {}
+
+
+def _gzip_namer(name):
+    return name + ".gz"
+
+
+def _gzip_rotator(source, dest):
+    # rotated log files are compressed, the current file stays plain text
+    with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
 logging.setLoggerClass(_CustomLogger)
 logging.addLevelName(_SUCCESS, 'SUCCESS')
 
@@ -76,22 +128,33 @@ logging.addLevelName(_SUCCESS, 'SUCCESS')
 class CLogger(object):
     """Logger to import in every project
 
+    By default the calling thread only puts records into a queue; formatting
+    and writing to console and file happen in a QueueListener thread. Pass
+    asynchron=False to write synchronously, e.g. for debugging.
+
+    Set jsonl=True (or VACCIPY_LOG_JSONL=1) to write one JSON object per line
+    to log/<module>.jsonl instead of the plain text log file. Rotated log
+    files are gzip compressed.
     """
 
     def __init__(self, module, colored=True, console_log_level=1,
-                 file_log_level=25, show_task_name=False):
+                 file_log_level=25, show_task_name=False, asynchron=True,
+                 jsonl=None, log_dir=None):
 
         module = module.lower()
+        if jsonl is None:
+            jsonl = os.getenv("VACCIPY_LOG_JSONL", "") not in ("", "0")
 
         self._logger = logging.getLogger(module)
         if not self._logger.hasHandlers():
             self.add_handlers(module, colored, show_task_name,
-                              console_log_level, file_log_level)
+                              console_log_level, file_log_level,
+                              asynchron, jsonl, log_dir)
 
         self._prefix = None
 
     def add_handlers(self, module, colored, show_task_name, console_log_level,
-                     file_log_level):
+                     file_log_level, asynchron=True, jsonl=False, log_dir=None):
         # create a new logger and add filters and file handler
 
         console_fmt = _CustomFormat.create(colored, show_task_name)
@@ -105,55 +168,88 @@ class CLogger(object):
         stream_handler.setLevel(console_log_level)
 
         # set file handler and file logging
-        file_fmt = logging.Formatter(file_fmt, datefmt=date_fmt)
+        if jsonl:
+            file_fmt = _JsonFormat()
+        else:
+            file_fmt = logging.Formatter(file_fmt, datefmt=date_fmt)
 
         # create log folder if not exist already
-        log_dir_path = os.path.join(PATH, 'log')
+        log_dir_path = log_dir or os.path.join(PATH, 'log')
         if not os.path.isdir(log_dir_path):
             os.mkdir(log_dir_path)
 
-        filename = os.path.join(log_dir_path, f'{module}.log')
+        extension = 'jsonl' if jsonl else 'log'
+        filename = os.path.join(log_dir_path, f'{module}.{extension}')
         file_handler = _TRFH(filename=filename, when='D', interval=1,
                              backupCount=30, encoding='utf-8', delay=False)
+        file_handler.namer = _gzip_namer
+        file_handler.rotator = _gzip_rotator
         file_handler.setFormatter(file_fmt)
         file_handler.setLevel(file_log_level)
-        self._logger.addHandler(file_handler)
-        self._logger.addHandler(stream_handler)
-        self._logger.addFilter(_MessageFilter())
+
+        handlers = [file_handler, stream_handler]
+        for handler in handlers:
+            handler.addFilter(_MessageFilter())
+
+        if asynchron:
+            log_queue = queue.SimpleQueue()
+            listener = _QL(log_queue, *handlers, respect_handler_level=True)
+            listener.start()
+            # flush pending records on exit
+            atexit.register(listener.stop)
+            _LISTENERS[module] = listener
+            self._logger.addHandler(_QueueHandler(log_queue))
+        else:
+            for handler in handlers:
+                self._logger.addHandler(handler)
         self._logger.setLevel(console_log_level)
 
+    def stop(self):
+        """Writes all pending records and stops the listener thread.
+
+        """
+        listener = _LISTENERS.pop(self._logger.name, None)
+        if listener is not None:
+            listener.stop()
+            atexit.unregister(listener.stop)
+
     def set_prefix(self, prefix):
         self._prefix = prefix
 
     def info(self, msg: str, prefix: str = None):
         if not prefix:
             prefix = self._prefix
-        msg = msg.replace("%", "%%")
-        self._logger.info(msg, {"prefix": prefix})
+        self._logger.info(msg, extra={"prefix": prefix})
 
     def warn(self, msg: str, prefix: str = None):
         if not prefix:
             prefix = self._prefix
-        msg = msg.replace("%", "%%")
-        self._logger.warning(msg, {"prefix": prefix})
+        self._logger.warning(msg, extra={"prefix": prefix})
 
     def error(self, msg: str, prefix: str = None):
         if not prefix:
             prefix = self._prefix
-        msg = msg.replace("%", "%%")
-        self._logger.error(msg, {"prefix": prefix})
+        self._logger.error(msg, extra={"prefix": prefix})
 
     def success(self, msg: str, prefix: str = None):
         if not prefix:
             prefix = self._prefix
-        msg = msg.replace("%", "%%")
-        self._logger.success(msg, {"prefix": prefix})
+        self._logger.success(msg, extra={"prefix": prefix})
 
     def debug(self, msg: str, prefix: str = None):
         if not prefix:
             prefix = self._prefix
-        msg = msg.replace("%", "%%")
-        self._logger.debug(msg, {"prefix": prefix})
+        self._logger.debug(msg, extra={"prefix": prefix})
+
+
+def stop_all():
+    """Writes all pending records of every logger and stops the listener threads.
+
+    """
+    for listener in list(_LISTENERS.values()):
+        listener.stop()
+        atexit.unregister(listener.stop)
+    _LISTENERS.clear()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,286 @@
+"""
+Prüft den segmentierten Chromium-Download (tools.chromium_downloader) gegen
+einen lokalen http.server in einem Thread. Läuft vollständig offline.
+
+Aufruf:
+    python -m tools.downloadpruefung
+    python -m tools.downloadpruefung --groesse-kb 512 --segmente 4
+
+Szenarien:
+- fortsetzen: Der Server bricht ein Segment mitten in der Antwort ab, der
+  Download setzt es ab der erreichten Stelle fort.
+- neustart: Nach dem Abbruch antwortet der Server nur noch mit 503, der
+  Download gibt auf und hinterlässt seinen Stand. Der nächste Aufruf lädt
+  nur die fehlenden Bytes.
+- pruefsumme: Der Server meldet in x-goog-hash eine falsche md5. Der
+  Download schlägt fehl und entfernt die Teildatei samt Stand.
+- ohne_range: Der Server unterstützt keine Range-Requests, die Datei wird
+  mit einer einzigen Anfrage geladen.
+- geaendert: Die Datei ändert sich zwischen HEAD und GET, der Server
+  beantwortet If-Range mit 200. Der Download beginnt einmal von vorn.
+
+Der Rückgabewert ist 1, falls ein Szenario fehlschlägt.
+"""
+
+import argparse
+import base64
+import hashlib
+import logging
+import random
+import re
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from tools import chromium_downloader
+
+ETAG = '"v1"'
+
+
+class _Datei:
+    """
+    Inhalt und Verhalten des Servers, von den Szenarien gesetzt.
+    """
+
+    def __init__(self, daten: bytes):
+        self.daten = daten
+        self.etag = ETAG
+        self.md5 = base64.b64encode(hashlib.md5(daten).digest()).decode()
+        self.ranges = True
+        # Alte ETag für die nächste HEAD-Anfrage, danach die aktuelle
+        self.alte_etag: Optional[str] = None
+        # Bricht die nächste Range-Antwort nach so vielen Bytes ab
+        self.abbrechen_nach: Optional[int] = None
+        # Nach dem Abbruch nur noch 503
+        self.danach_503 = False
+        self.status_503 = False
+        self.lock = threading.Lock()
+        self.anfragen: List[str] = []
+        self.gesendet = 0
+
+    def protokollieren(self, anfrage: str, gesendet: int = 0):
+        with self.lock:
+            self.anfragen.append(anfrage)
+            self.gesendet += gesendet
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        datei: _Datei = self.server.datei
+        with datei.lock:
+            etag, datei.alte_etag = datei.alte_etag or datei.etag, None
+        datei.protokollieren("HEAD")
+        self.send_response(200)
+        self._header(datei, len(datei.daten), etag)
+        self.end_headers()
+
+    def do_GET(self):
+        datei: _Datei = self.server.datei
+        if datei.status_503:
+            datei.protokollieren("GET 503")
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        treffer = re.fullmatch(r"bytes=(\d+)-(\d+)", self.headers.get("Range", ""))
+        if_range = self.headers.get("If-Range")
+        if not datei.ranges or not treffer or (if_range and if_range != datei.etag):
+            datei.protokollieren("GET", len(datei.daten))
+            self.send_response(200)
+            self._header(datei, len(datei.daten), datei.etag)
+            self.end_headers()
+            self.wfile.write(datei.daten)
+            return
+
+        start, ende = int(treffer.group(1)), int(treffer.group(2))
+        teil = datei.daten[start:ende + 1]
+        with datei.lock:
+            abbrechen_nach, datei.abbrechen_nach = datei.abbrechen_nach, None
+            if abbrechen_nach is not None and datei.danach_503:
+                datei.status_503 = True
+        if abbrechen_nach is not None:
+            teil_gesendet = teil[:abbrechen_nach]
+        else:
+            teil_gesendet = teil
+        datei.protokollieren(f"GET {start}-{ende}", len(teil_gesendet))
+        self.send_response(206)
+        self._header(datei, len(teil), datei.etag)
+        self.send_header("Content-Range", f"bytes {start}-{ende}/{len(datei.daten)}")
+        self.end_headers()
+        self.wfile.write(teil_gesendet)
+        if abbrechen_nach is not None:
+            # Verbindung mitten in der Antwort schließen
+            self.close_connection = True
+
+    def _header(self, datei: _Datei, laenge: int, etag: str):
+        self.send_header("Content-Length", str(laenge))
+        self.send_header("Content-Type", "application/zip")
+        self.send_header("ETag", etag)
+        self.send_header("x-goog-hash", f"crc32c=AAAAAA==,md5={datei.md5}")
+        if datei.ranges:
+            self.send_header("Accept-Ranges", "bytes")
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Abgebrochene Segmente schließen ihre Verbindung, das ist erwartet
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class _Server:
+    """
+    ThreadingHTTPServer in einem Daemon-Thread, liefert eine _Datei aus.
+    """
+
+    def __init__(self, datei: _Datei):
+        self.httpd = _HTTPServer(("127.0.0.1", 0), _Handler)
+        self.httpd.datei = datei
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}/chrome-linux.zip"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def _laden(server: _Server, ordner: Path, segmente: int) -> Path:
+    return chromium_downloader.download_zip(
+        server.url, "chromium", folder=ordner, segments=segmente)
+
+
+def _pruefen(bedingung: bool, meldung: str):
+    if not bedingung:
+        raise AssertionError(meldung)
+
+
+def fortsetzen(daten: bytes, ordner: Path, segmente: int):
+    datei = _Datei(daten)
+    datei.abbrechen_nach = len(daten) // segmente // 3
+    with _Server(datei) as server:
+        pfad = _laden(server, ordner, segmente)
+    _pruefen(pfad.read_bytes() == daten, "Inhalt nach dem Fortsetzen falsch")
+    starts = {int(a.split()[1].split("-")[0]) for a in datei.anfragen if a.startswith("GET ")}
+    grenzen = {s["start"] for s in chromium_downloader._split(len(daten), segmente)}
+    _pruefen(starts - grenzen != set(), "Segment wurde nicht ab der erreichten Stelle fortgesetzt")
+
+
+def neustart(daten: bytes, ordner: Path, segmente: int):
+    datei = _Datei(daten)
+    datei.abbrechen_nach = len(daten) // segmente // 2
+    datei.danach_503 = True
+    with _Server(datei) as server:
+        try:
+            _laden(server, ordner, segmente)
+        except OSError:
+            pass
+        else:
+            raise AssertionError("Download trotz dauerhaft 503 erfolgreich")
+        _pruefen(any(p.name.endswith(".part.json") for p in ordner.iterdir()),
+                 "Kein Stand nach dem Abbruch gespeichert")
+        bereits = datei.gesendet
+        datei.status_503 = False
+        datei.danach_503 = False
+        pfad = _laden(server, ordner, segmente)
+    _pruefen(pfad.read_bytes() == daten, "Inhalt nach dem Neustart falsch")
+    _pruefen(bereits > 0 and datei.gesendet - bereits < len(daten),
+             "Neustart hat die Datei vollständig neu geladen")
+    _pruefen(not any(p.name.endswith(".part.json") for p in ordner.iterdir()),
+             "Stand nach dem Download nicht entfernt")
+
+
+def pruefsumme(daten: bytes, ordner: Path, segmente: int):
+    datei = _Datei(daten)
+    datei.md5 = base64.b64encode(hashlib.md5(b"anders").digest()).decode()
+    with _Server(datei) as server:
+        try:
+            _laden(server, ordner, segmente)
+        except OSError as exc:
+            _pruefen("Prüfsumme" in str(exc), f"Unerwarteter Fehler: {exc}")
+        else:
+            raise AssertionError("Falsche Prüfsumme nicht erkannt")
+    _pruefen(not any(ordner.iterdir()), "Teildatei oder Stand nicht entfernt")
+
+
+def ohne_range(daten: bytes, ordner: Path, segmente: int):
+    datei = _Datei(daten)
+    datei.ranges = False
+    with _Server(datei) as server:
+        pfad = _laden(server, ordner, segmente)
+    _pruefen(pfad.read_bytes() == daten, "Inhalt ohne Range falsch")
+    _pruefen(datei.anfragen == ["HEAD", "GET"], f"Unerwartete Anfragen: {datei.anfragen}")
+
+
+def geaendert(daten: bytes, ordner: Path, segmente: int):
+    datei = _Datei(daten)
+    datei.alte_etag = '"v0"'
+    with _Server(datei) as server:
+        pfad = _laden(server, ordner, segmente)
+    _pruefen(pfad.read_bytes() == daten, "Inhalt nach geänderter Datei falsch")
+    _pruefen(datei.anfragen.count("HEAD") == 2, "Download wurde nicht neu gestartet")
+
+
+SZENARIEN: Dict[str, Callable[[bytes, Path, int], None]] = {
+    "fortsetzen": fortsetzen,
+    "neustart": neustart,
+    "pruefsumme": pruefsumme,
+    "ohne_range": ohne_range,
+    "geaendert": geaendert,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m tools.downloadpruefung",
+        description="Prüft den segmentierten Chromium-Download gegen einen lokalen Server")
+    parser.add_argument("--groesse-kb", type=int, default=256,
+                        help="Größe der Testdatei in KiB")
+    parser.add_argument("--segmente", type=int, default=4)
+    parser.add_argument("--mit-log", action="store_true",
+                        help="Ausgaben des Downloads nicht unterdrücken")
+    args = parser.parse_args()
+
+    if not args.mit_log:
+        logging.disable(logging.CRITICAL)
+
+    # Kleine Segmente und Blöcke, damit auch eine kleine Datei segmentiert
+    # und mitten im Segment abgebrochen wird. Wiederholungen ohne Wartezeit.
+    groesse = args.groesse_kb * 1024
+    chromium_downloader.MIN_SEGMENT_SIZE = max(1, groesse // args.segmente)
+    chromium_downloader.CHUNK_SIZE = 1024
+    chromium_downloader.STATE_INTERVAL = 4 * 1024
+    chromium_downloader.DOWNLOAD_RETRIES = 3
+    chromium_downloader.RETRY_DELAY = 0.01
+    chromium_downloader.NO_PROGRESS_BAR = True
+
+    daten = random.Random(0).randbytes(groesse)
+    fehler = 0
+    for name, szenario in SZENARIEN.items():
+        with tempfile.TemporaryDirectory() as ordner:
+            try:
+                szenario(daten, Path(ordner), args.segmente)
+            except Exception as exc:
+                fehler += 1
+                print(f"{name:>12}: FEHLER {type(exc).__name__}: {exc}", file=sys.stderr)
+            else:
+                print(f"{name:>12}: ok")
+    sys.exit(1 if fehler else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,13 @@
+class Abgebrochen(BaseException):
+    # Wie KeyboardInterrupt keine Unterklasse von Exception, damit der
+    # Abbruch nicht von allgemeinen Fehlerbehandlungen verschluckt wird
+    pass
+
+
+class AnfrageAbgebrochen(Exception):
+    pass
+
+
 class AppointmentGone(Exception):
     pass
 
@@ -0,0 +1,167 @@
+import threading
+from typing import Any, Optional, Set
+
+from PyQt5 import QtCore
+from PyQt5.QtCore import pyqtSignal
+
+from tools.exceptions import AnfrageAbgebrochen
+
+
+class Anfrage:
+    """
+    Einzelne Anfrage eines Workers an die GUI, z. B. nach dem Geburtsdatum.
+
+    Die GUI beantwortet sie genau einmal mit beantworten oder abbrechen. Der
+    Worker wartet dabei auf einem threading.Event und wird sofort geweckt.
+    """
+
+    def __init__(self, art: str, parameter: Any = None):
+        """
+        Args:
+            art (str): Art der Anfrage, z. B. "GEBURTSDATUM"
+            parameter (Any, optional): Zusätzliche Daten für den Dialog
+        """
+        self.art = art
+        self.parameter = parameter
+        self.antwort: Any = None
+        self.abgebrochen = False
+        self._erledigt = threading.Event()
+
+    @property
+    def erledigt(self) -> bool:
+        return self._erledigt.is_set()
+
+    def beantworten(self, antwort: Any = None):
+        """
+        Übergibt die Antwort an den wartenden Worker. Weitere Antworten
+        werden ignoriert.
+
+        Args:
+            antwort (Any, optional): Antwort, z. B. die Eingabe im Dialog
+        """
+        if not self._erledigt.is_set():
+            self.antwort = antwort
+            self._erledigt.set()
+
+    def abbrechen(self):
+        """
+        Bricht die Anfrage ab, der wartende Worker erhält AnfrageAbgebrochen.
+        """
+        if not self._erledigt.is_set():
+            self.abgebrochen = True
+            self._erledigt.set()
+
+    def warten(self, timeout: Optional[float] = None) -> Any:
+        """
+        Blockiert, bis die Anfrage beantwortet oder abgebrochen wurde.
+
+        Args:
+            timeout (float, optional): Maximale Wartezeit in Sekunden. Defaults to None.
+
+        Raises:
+            AnfrageAbgebrochen: Anfrage abgebrochen oder Timeout abgelaufen
+
+        Returns:
+            Any: Antwort der GUI
+        """
+        if not self._erledigt.wait(timeout):
+            self.abbrechen()
+        if self.abgebrochen:
+            raise AnfrageAbgebrochen(self.art)
+        return self.antwort
+
+
+class Anfragekanal(QtCore.QObject):
+    """
+    Anfrage-Antwort-Kanal zwischen einem Worker-Thread und der GUI.
+
+    Der Worker ruft fragen auf, das Signal anfrage kommt über eine Queued
+    Connection im GUI-Thread an. Dort wird der passende Dialog angezeigt und
+    die Anfrage beantwortet oder abgebrochen. Der Worker schläft bis dahin auf
+    einem threading.Event, ohne zu pollen. Mit abbrechen, z. B. beim
+    Schließen des Fensters, werden alle offenen und künftigen Anfragen
+    abgebrochen.
+
+    Beispiel:
+        # GUI-Thread
+        self.kanal = Anfragekanal(parent=self)
+        self.kanal.anfrage.connect(self.anfrage_anzeigen)
+
+        # Worker-Thread
+        geburtsdatum = self.kanal.fragen("GEBURTSDATUM")
+    """
+
+    # Anfrage, die im GUI-Thread beantwortet werden muss
+    anfrage = pyqtSignal(object)
+
+    def __init__(self, parent: QtCore.QObject = None):
+        """
+        Args:
+            parent (QtCore.QObject, optional): Parent für die Lebensdauer
+        """
+        super().__init__(parent)
+
+        self._lock = threading.Lock()
+        self._offen: Set[Anfrage] = set()
+        self._abgebrochen = False
+
+    @property
+    def abgebrochen(self) -> bool:
+        return self._abgebrochen
+
+    def fragen(self, art: str, parameter: Any = None, timeout: Optional[float] = None) -> Any:
+        """
+        Stellt eine Anfrage an die GUI und wartet auf die Antwort.
+        Darf nicht im GUI-Thread aufgerufen werden.
+
+        Args:
+            art (str): Art der Anfrage, z. B. "GEBURTSDATUM"
+            parameter (Any, optional): Zusätzliche Daten für den Dialog
+            timeout (float, optional): Maximale Wartezeit in Sekunden. Defaults to None.
+
+        Raises:
+            AnfrageAbgebrochen: Anfrage oder Kanal abgebrochen
+
+        Returns:
+            Any: Antwort der GUI
+        """
+        anfrage = self.stellen(art, parameter)
+        try:
+            return anfrage.warten(timeout)
+        finally:
+            with self._lock:
+                self._offen.discard(anfrage)
+
+    def stellen(self, art: str, parameter: Any = None) -> Anfrage:
+        """
+        Stellt eine Anfrage an die GUI, ohne auf die Antwort zu warten, z. B.
+        für Eingaben, die parallel zu einer anderen Aktion möglich sind.
+
+        Args:
+            art (str): Art der Anfrage, z. B. "SMSCODE"
+            parameter (Any, optional): Zusätzliche Daten für den Dialog
+
+        Raises:
+            AnfrageAbgebrochen: Kanal abgebrochen
+
+        Returns:
+            Anfrage: Anfrage, die mit abbrechen zurückgezogen werden kann
+        """
+        anfrage = Anfrage(art, parameter)
+        with self._lock:
+            if self._abgebrochen:
+                raise AnfrageAbgebrochen(art)
+            self._offen.add(anfrage)
+
+        self.anfrage.emit(anfrage)
+        return anfrage
+
+    def abbrechen(self):
+        """
+        Bricht alle offenen Anfragen ab und lehnt weitere ab.
+        """
+        with self._lock:
+            self._abgebrochen = True
+            offen = list(self._offen)
+        for anfrage in offen:
+            anfrage.abbrechen()
@@ -0,0 +1,558 @@
+import json
+import multiprocessing
+import os
+import sys
+
+from PyQt5 import QtCore, QtWidgets, uic
+from PyQt5.QtGui import QIcon
+from tools.exceptions import ValidationError, MissingValuesError
+
+from tools import Modus
+from tools import kontaktdaten as kontak_tools
+from tools import suchprozess
+from tools.gui import oeffne_file_dialog_select, open_browser
+from tools.gui.qtkontakt import QtKontakt
+from tools.gui.qtterminsuche import SuchTab
+from tools.gui.qtcodegen import QtCodeGen
+from tools.gui.prozesse import ProzessVerwaltung
+from tools.utils import create_missing_dirs, update_available, get_latest_version, get_current_version
+
+# Pfad zur gui.py
+PATH = os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+
+class HauptGUI(QtWidgets.QMainWindow):
+
+    # Folgende Widgets stehen zur Verfügung:
+
+    ### QLineEdit ###
+    # i_kontaktdaten_pfad
+
+    ### Buttons ###
+    # b_termin_suchen
+    # b_code_generieren
+    # b_dateien_kontaktdaten
+    # b_neue_kontaktdaten
+
+    ### Layouts ###
+    # prozesse_layout
+
+    ### QTabWidget ###
+    # such_tabs
+
+    ### QSpinBox ###
+    # i_interval
+
+    def __init__(self, pfad_fenster_layout: str = os.path.join(PATH, "tools/gui/main.ui")):
+        """
+        Main der GUI Anwendung
+
+        Args:
+            pfad_fenster_layout (str, optional): Ladet das angegebene Layout (wurde mit QT Designer erstellt https://www.qt.io/download).
+            Defaults to os.path.join(PATH, "tools/gui/main.ui").
+        """
+
+        super().__init__()
+
+        create_missing_dirs(PATH)
+
+        # Terminsuchen laufen ohne Qt in tools.suchprozess. Unter Windows und
+        # in gebündelten Programmen per Spawn, sonst über einen Forkserver mit
+        # vorab geladenem tools.its
+        self.such_kontext = suchprozess.kontext()
+
+        # Laden der .ui Datei und Anpassungen
+        self.setup(pfad_fenster_layout)
+
+        # GUI anzeigen
+        self.show()
+
+        # Workaround, damit das Fenster hoffentlich im Vordergrund ist
+        self.activateWindow()
+
+        # Auf neuere Version prüfen
+        self.check_update()
+
+    ##############################
+    #     Allgemein Fenster      #
+    ##############################
+
+    @staticmethod
+    def start_gui():
+        """
+        Startet die GUI Anwendung
+        """
+
+        app = QtWidgets.QApplication(list())
+        app.setAttribute(QtCore.Qt.AA_X11InitThreads)
+
+        # Lade Systemsprache und passende Übersetzungen
+        sys_lang = QtCore.QLocale.system()
+        translator = QtCore.QTranslator()
+        if translator.load(sys_lang, "qtbase", "_", QtCore.QLibraryInfo.location(QtCore.QLibraryInfo.TranslationsPath)):
+            app.installTranslator(translator)
+
+
+        window = HauptGUI()
+        app.exec_()
+
+    def setup(self, pfad_fenster_layout: str):
+        """
+        Standard Konfig für die GUI erstellen, bevor sie angezeigt werden kann
+
+        Args:
+            pfad_fenster_layout (str): Pfad zur .ui Datei
+        """
+
+        ### Allgemein ###
+        create_missing_dirs(PATH)
+
+        # Standard Pfade
+        self.pfad_kontaktdaten: str = os.path.join(PATH, "data", "kontaktdaten.json")
+
+        ### GUI ###
+        uic.loadUi(pfad_fenster_layout, self)
+        self.setWindowIcon(QIcon(os.path.join(PATH, "images/spritze.ico")))
+        try:
+            self.setWindowTitle('vaccipy ' + get_current_version())
+        except Exception as error:
+            self.setWindowTitle('vaccipy')
+            pass
+
+        # Meldung falls alte Daten von alter Version
+        self.__check_old_kontakt_version()
+
+        # Funktionen den Buttons zuweisen
+        self.b_termin_suchen.clicked.connect(self.__termin_suchen)
+        self.b_code_generieren.clicked.connect(self.__code_generieren)
+        self.b_dateien_kontaktdaten.clicked.connect(self.__update_kontaktdaten_pfad)
+        self.b_neue_kontaktdaten.clicked.connect(lambda: self.kontaktdaten_erstellen(Modus.TERMIN_SUCHEN))
+
+        # Pfade in der GUI anpassen
+        self.i_kontaktdaten_pfad.setText(self.pfad_kontaktdaten)
+
+        # Überwacht alle termin_suchen und Codegen Prozesse
+        self.prozesse_counter = 0
+        self.prozess_verwaltung = ProzessVerwaltung(parent=self)
+        self.prozess_verwaltung.beendet.connect(self.__prozess_beendet)
+        self.prozess_verwaltung.statistik.connect(self.__update_prozess_statistik)
+        self.prozess_verwaltung.ereignisse.connect(self.__prozess_ereignisse)
+
+        # Jede Terminsuche bekommt einen Tab, sichtbar nur solange es welche gibt
+        self.such_tabs.setVisible(False)
+        self.such_tabs.tabCloseRequested.connect(self.__such_tab_schliessen)
+
+    def check_update(self):
+        """
+        Prüft auf neuere Version und gibt evtl. ne Benachrichtigung an den User
+        """
+
+        try:
+            # Auf Update prüfen
+            if update_available():
+                url = f"https://github.com/iamnotturner/vaccipy/releases/tag/{get_latest_version()}"
+                
+                if get_current_version() != 'source': 
+                    title = "Alte Version!"
+                    text = "Bitte Update installieren"
+                    info_text = f"Die Terminsuche funktioniert möglicherweise nicht, da du eine alte Version verwendest ({get_current_version()})"
+                else:
+                    title = "Sourcecode"
+                    text = "Updateprüfung nicht möglich!"
+                    info_text = "Du benutzt die nicht paketierten Skripte von Github. Die Terminsuche funktioniert möglicherweise nicht, da die Version veraltet sein könnten."
+
+                msg = QtWidgets.QMessageBox()
+                msg.setIcon(QtWidgets.QMessageBox.information)
+                msg.setWindowTitle(title)
+                msg.setText(text)
+                msg.setInformativeText(info_text)
+                msg.addButton(msg.Close)
+                btn_download = msg.addButton("Download", msg.ApplyRole)
+                btn_download.clicked.connect(lambda: open_browser(url))
+                msg.exec_()      
+                    
+        except Exception as error:
+            # warum auch immer konnte nicht überprüft werden
+            # einfach nichts machen
+            pass
+
+    def __code_generieren(self):
+        """
+        Startet den Prozess der Codegenerierung
+        Codegenerierung ohne interaktive Eingabe der Kontaktdaten
+
+        :param kontaktdaten: Dictionary mit Kontaktdaten
+        """
+
+        try:
+            kontaktdaten = self.__get_kontaktdaten(Modus.CODE_GENERIEREN)
+            
+            #return if no data was returned
+            if not kontaktdaten:
+                return
+
+        except FileNotFoundError as error:
+            QtWidgets.QMessageBox.critical(self, "Datei nicht gefunden!", f"Datei zum Laden konnte nicht gefunden werden\n\nBitte erstellen")
+            return
+        except ValidationError as error:
+            QtWidgets.QMessageBox.critical(self, "Daten Fehlerhaft!", f"In der angegebenen Datei sind Fehler:\n\n{error}")
+            return
+        except MissingValuesError as error:
+            QtWidgets.QMessageBox.critical(self, "Daten Fehlerhaft!", f"In der angegebenen Datei Fehlen Daten:\n\n{error}")
+            return
+            
+        strProcName = "Codegen"
+
+        # allow only 1 Code Gen at a time
+        if strProcName in self.prozess_verwaltung.namen():
+            QtWidgets.QMessageBox.information(self, "STOP", "Es läuft bereits eine Codegenerierung!")
+            return False
+
+        #start codegen process
+        # Die Codegenerierung öffnet eigene Fenster, daher per Spawn in einem
+        # frischen Interpreter statt per Fork aus dem laufenden Qt-Prozess
+        code_prozess = multiprocessing.get_context("spawn").Process(target=QtCodeGen.start_code_gen, 
+            name=strProcName, daemon=True, kwargs={
+                "kontaktdaten": kontaktdaten,
+                "ROOT_PATH": PATH
+            })
+
+        #add code search to list of prozesses
+        try:
+            code_prozess.start()
+            if not code_prozess.is_alive():
+                raise RuntimeError(
+                    f"Code suche wurde gestartet, lebt aber nicht mehr!"
+                )
+        except Exception as error:
+            QtWidgets.QMessageBox.critical(self, "Fehler - Codegenerierung nicht gestartet!", str(error))
+        else:
+            self.prozess_verwaltung.hinzufuegen(code_prozess)
+            self.__add_prozess_in_gui(code_prozess)
+            self.prozesse_counter += 1
+
+
+        
+    def __termin_suchen(self):
+        """
+        Startet den Prozess der terminsuche mit Impfterminservice.terminsuche in einem neuen Thread
+        Dieser wird in self.such_threads hinzugefügt.
+        Alle Threads sind deamon Thread (Sofort töten sobald der Bot beendet wird)
+        """
+
+        try:
+            kontaktdaten = self.__get_kontaktdaten(Modus.TERMIN_SUCHEN)
+            if not kontaktdaten:
+                return
+            zeitrahmen = kontaktdaten["zeitrahmen"]
+
+        except FileNotFoundError as error:
+            QtWidgets.QMessageBox.critical(self, "Datei nicht gefunden!", f"Datei zum Laden konnte nicht gefunden werden\n\nBitte erstellen")
+            return
+        except ValidationError as error:
+            QtWidgets.QMessageBox.critical(self, "Daten Fehlerhaft!", f"In der angegebenen Datei sind Fehler:\n\n{error}")
+            return
+        except MissingValuesError as error:
+            QtWidgets.QMessageBox.critical(self, "Daten Fehlerhaft!", f"In der angegebenen Datei Fehlen Daten:\n\n{error}")
+            return
+
+        self.__start_terminsuche(kontaktdaten, zeitrahmen)
+
+    def __start_terminsuche(self, kontaktdaten: dict, zeitrahmen: dict):
+        """
+        Startet die Terminsuche in einem Prozess ohne Qt, dessen Ausgabe im Tab der Suche erscheint
+
+        Args:
+            kontaktdaten (dict): kontakdaten aus kontaktdaten.json
+            zeitrahmen (dict): zeitrahmen aus zeitrahmen.json
+        """
+
+        check_delay = self.i_interval.value()
+        codes = kontaktdaten["codes"]
+        notifications = kontaktdaten.get("notifications", {})
+        empfang, senden = self.such_kontext.Pipe(duplex=False)
+        terminsuche_prozess = self.such_kontext.Process(target=suchprozess.suchen, name=f"{codes[0]}-{self.prozesse_counter}", daemon=True, kwargs={
+                                                        "verbindung": senden,
+                                                        "kontaktdaten": kontaktdaten,
+                                                        "notifications": notifications,
+                                                        "zeitrahmen": zeitrahmen,
+                                                        "ROOT_PATH": PATH,
+                                                        "check_delay": check_delay,
+                                                        "kontaktdaten_pfad": self.pfad_kontaktdaten})
+        try:
+            terminsuche_prozess.start()
+            if not terminsuche_prozess.is_alive():
+                raise RuntimeError(
+                    f"Terminsuche wurde gestartet, lebt aber nicht mehr!\n\nTermin mit Code: {terminsuche_prozess.getName()}\nBitte Daten Prüfen!"
+                )
+
+        except Exception as error:
+            empfang.close()
+            QtWidgets.QMessageBox.critical(self, "Fehler - Suche nicht gestartet!", str(error))
+
+        else:
+            # QtWidgets.QMessageBox.information(self, "Suche gestartet", "Terminsuche wurde gestartet!\nWeitere Infos in der Konsole")
+            self.prozess_verwaltung.hinzufuegen(terminsuche_prozess, empfang)
+            self.__add_prozess_in_gui(terminsuche_prozess)
+            self.__add_such_tab(terminsuche_prozess.name, kontaktdaten, check_delay)
+            self.prozesse_counter += 1
+
+        finally:
+            # Nur der Suchprozess schreibt, sonst erkennt die Pipe sein Ende nicht
+            senden.close()
+
+    def __update_kontaktdaten_pfad(self, pfad: str):
+        """
+        Holt sich mithilfe des QFileDialogs eine bereits vorhandene Datei.
+        Dieser Pfad wird in der GUI ersetzt und im Attribut der Kasse gespeichert.
+
+        Wird ein Pfad bereits mit übergeben, wird dieser verwendet
+
+        Args:
+            pfad (str): if pfad - dann Wert übernehmen
+        """
+
+        if pfad:
+            self.pfad_kontaktdaten = pfad
+        else:
+            try:
+                pfad = oeffne_file_dialog_select(self, "Kontakdaten", self.pfad_kontaktdaten)
+            except FileNotFoundError:
+                return
+
+        if pfad is None:
+            return
+
+        self.pfad_kontaktdaten = pfad
+        self.i_kontaktdaten_pfad.setText(self.pfad_kontaktdaten)
+
+    def __add_prozess_in_gui(self, prozess: multiprocessing.Process):
+        """
+        Die Prozesse werden in der GUI in dem prozesse_layout angezeigt
+        """
+
+        label = QtWidgets.QLabel(f"Prozess: {prozess.name}")
+        label.setObjectName(f"{prozess.name}_label")
+        button = QtWidgets.QPushButton("Stoppen")
+        button.setObjectName(prozess.name)
+        button.clicked.connect(lambda: self.__stop_prozess(prozess))
+
+        self.prozesse_layout.addRow(label, button)
+
+    def __stop_prozess(self, prozess: multiprocessing.Process):
+        """
+        Stoppt den übergebenen Prozess samt Chrome und chromedriver.
+        Aus der GUI entfernt wird er, sobald er tatsächlich beendet ist.
+
+        Args:
+            prozess (multiprocessing.Process): Prozess welcher beendet werden soll
+        """
+        button = self.findChild(QtWidgets.QPushButton, prozess.name)
+        if button is not None:
+            button.setEnabled(False)
+            button.setText("Wird gestoppt ...")
+        self.prozess_verwaltung.stoppen(prozess.name)
+
+    def __remove_prozess_von_gui(self, name: str):
+        """
+        Entfernt die Anzeige des Prozesses aus der GUI
+
+        Args:
+            name (str): Name des Prozesses welcher entfernt werden soll
+        """
+
+        button = self.findChild(QtWidgets.QPushButton, name)
+        if button is not None:
+            self.prozesse_layout.removeRow(button)
+
+    def __prozess_beendet(self, name: str, exitcode: int):
+        """
+        Wird über die ProzessVerwaltung im GUI-Thread aufgerufen, sobald sich ein Prozess beendet hat
+
+        Args:
+            name (str): Name des Prozesses
+            exitcode (int): Exitcode des Prozesses
+        """
+
+        self.__remove_prozess_von_gui(name)
+
+        tab = self.__get_such_tab(name)
+        if tab is None:
+            return
+
+        tab.beendet(exitcode)
+        self.such_tabs.setTabText(self.such_tabs.indexOf(tab), f"{name} (beendet)")
+
+        if tab.ergebnis is None:
+            return
+        if tab.ergebnis["erfolg"]:
+            QtWidgets.QMessageBox.information(self, "Termin gefunden!", f"Termin gefunden!\nAusgabe Prüfen!\n\nSuche: {name}")
+        else:
+            QtWidgets.QMessageBox.critical(self, "Suche Fehlgeschlagen!", f"Suche {name} wurde abgebrochen:\n{tab.ergebnis['fehler']}")
+
+    def __prozess_ereignisse(self, name: str, ereignisse: list):
+        """
+        Gibt Ereignisse eines Suchprozesses an dessen Tab weiter
+
+        Args:
+            name (str): Name des Prozesses
+            ereignisse (list): Ereignisse wie in tools.suchprozess beschrieben
+        """
+
+        tab = self.__get_such_tab(name)
+        if tab is not None:
+            tab.ereignisse_verarbeiten(ereignisse)
+
+    def __add_such_tab(self, name: str, kontaktdaten: dict, check_delay: int):
+        """
+        Erstellt den Tab einer Terminsuche
+
+        Args:
+            name (str): Name des Prozesses
+            kontaktdaten (dict): kontakdaten aus kontaktdaten.json
+            check_delay (int): Interval in Sekunden zwischen jeder Terminsuche
+        """
+
+        tab = SuchTab(kontaktdaten, check_delay, parent=self.such_tabs)
+        tab.setObjectName(f"{name}_tab")
+        self.such_tabs.addTab(tab, name)
+        self.such_tabs.setCurrentWidget(tab)
+        self.such_tabs.setVisible(True)
+
+    def __get_such_tab(self, name: str) -> SuchTab:
+        """
+        Args:
+            name (str): Name des Prozesses
+
+        Returns:
+            SuchTab: Tab der Terminsuche oder None
+        """
+
+        return self.such_tabs.findChild(SuchTab, f"{name}_tab")
+
+    def __such_tab_schliessen(self, index: int):
+        """
+        Schließt einen Tab. Läuft die Suche noch, wird sie nach Rückfrage gestoppt.
+
+        Args:
+            index (int): Index des Tabs
+        """
+
+        tab = self.such_tabs.widget(index)
+        name = tab.objectName()[:-len("_tab")]
+
+        if name in self.prozess_verwaltung.namen():
+            res = QtWidgets.QMessageBox.warning(self, "Suche beenden", "Suche wirklich beenden?\n",
+                                                (QtWidgets.QMessageBox.StandardButton.Ok | QtWidgets.QMessageBox.StandardButton.Cancel))
+            if res != QtWidgets.QMessageBox.StandardButton.Ok:
+                return
+            self.prozess_verwaltung.stoppen(name)
+
+        self.such_tabs.removeTab(index)
+        tab.deleteLater()
+        self.such_tabs.setVisible(self.such_tabs.count() > 0)
+
+    def __update_prozess_statistik(self, name: str, rss_mb: float, cpu: float):
+        """
+        Zeigt Speicherbedarf und CPU-Last eines Prozesses inklusive Chrome und chromedriver an
+
+        Args:
+            name (str): Name des Prozesses
+            rss_mb (float): Speicherbedarf in MB
+            cpu (float): CPU-Last in Prozent
+        """
+
+        label = self.findChild(QtWidgets.QLabel, f"{name}_label")
+        if label is not None:
+            label.setText(f"Prozess: {name} ({rss_mb:.0f} MB, {cpu:.0f} % CPU)")
+
+    def closeEvent(self, event):
+        """
+        Beendet beim Schließen alle laufenden Prozesse samt Chrome und chromedriver
+
+        Args:
+            event: Schließen Event von QT
+        """
+
+        self.prozess_verwaltung.alle_stoppen()
+        event.accept()
+
+    def __check_old_kontakt_version(self, kontaktdaten: dict = None) -> bool:
+        """
+        Schaut ob zeitspanne.json vorhanden ist - wenn ja löschen und Warnung ausgeben
+        Schaut ob ["zeitrahmen"] in den Kontakdaten ist - wenn ja Warnung ausgeben
+
+        Args:
+            kontaktdaten (dict, optional): Kontakdaten wo geladen werden. Defaults to None.
+
+        Returns:
+            bool: Alte Version -> False; Alles richtig -> True
+        """
+        if kontaktdaten:
+            try:
+                kontaktdaten["zeitrahmen"]
+                return True
+            except KeyError as error:
+                # Zeitrahmen nicht vorhanden - Warnung ausgeben
+                pass
+        else:
+            # Prüfen ob alte Datei vorhanden ist - ggf. löschen
+            old_zeitrahmen_path = os.path.join(PATH, "data", "zeitspanne.json")
+            if os.path.isfile(old_zeitrahmen_path):
+                os.remove(old_zeitrahmen_path)
+            else:
+                return True
+
+        QtWidgets.QMessageBox.critical(self, "Alte Version von Kontaktdaten!",
+                                       "Die Kontakdaten scheinen von einer älteren Version zu sein.\nKontakdaten und Zeitspanne sind nun in einer Datei.\n\nBitte Datei neu erstellen!")
+        return False
+
+    ##############################
+    #        Kontaktdaten        #
+    ##############################
+
+    def kontaktdaten_erstellen(self, modus: Modus = Modus.TERMIN_SUCHEN) -> bool:
+        """
+        Ruft den Dialog für die Kontaktdaten auf
+
+        Args:
+            modus (Modus): Abhängig vom Modus werden nicht alle Daten benötigt. Defalut TERMIN_SUCHEN
+
+        Returns:
+            bool: True bei Erfolg, False bei Abbruch
+        """
+
+        dialog = QtKontakt(self, modus, self.pfad_kontaktdaten, PATH)
+        dialog.update_path.connect(self.__update_kontaktdaten_pfad)
+        dialog.show()
+        if dialog.exec_() == QtWidgets.QDialog.Rejected:
+            return False
+        else:
+            return True
+
+    def __get_kontaktdaten(self, modus: Modus) -> dict:
+        """
+        Ladet die Kontakdaten aus dem in der GUI hinterlegten Pfad
+
+        Args:
+            modus (Modus): Abhängig vom Modus werden nicht alle Daten benötigt.
+
+        Returns:
+            dict: Kontakdaten
+        """
+        if not os.path.isfile(self.pfad_kontaktdaten):
+            if not self.kontaktdaten_erstellen(modus):
+                return {}
+
+        kontaktdaten = kontak_tools.get_kontaktdaten(self.pfad_kontaktdaten)
+        kontak_tools.check_kontaktdaten(kontaktdaten, modus)
+        
+        if modus == Modus.TERMIN_SUCHEN:
+            if not self.__check_old_kontakt_version(kontaktdaten):
+                raise ValidationError("\"zeitrahmen\" fehlt -> Alte Version")
+           
+            if "codes" in kontaktdaten:
+                if "XXXX-XXXX-XXXX" in kontaktdaten["codes"]:
+                    raise ValidationError("Der Code is ungültig. Bitte trage einen korrekten Code ein!")
+
+        return kontaktdaten
@@ -0,0 +1,181 @@
+import re
+import threading
+from collections import deque
+from typing import List, Tuple, Union
+
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+# Anzahl sichtbarer Zeilen. Ältere Zeilen werden aus dem Textfeld entfernt,
+# die vollständige Historie steht in der Logdatei.
+MAX_ZEILEN = 2000
+
+# Intervall, in dem neue Zeilen ins Textfeld übernommen werden, in ms
+INTERVALL_MS = 100
+
+# Farben der ANSI-Farbcodes aus tools.clog
+_FARBEN = {
+    "95": "red",
+    "91": "red",
+    "33": "orange",
+    "94": "blue",
+    "32": "green",
+}
+
+_ANSI = re.compile(r"\x1b\[([0-9;]*)m")
+
+
+class ZeilenStream:
+    """
+    Dateiähnlicher Ersatz für sys.stdout / sys.stderr.
+
+    Sammelt geschriebenen Text, bis eine Zeile vollständig ist, und legt
+    vollständige Zeilen in einem begrenzten Puffer ab. Schreiben ist aus
+    beliebigen Threads möglich und löst kein Qt-Signal aus; das Fenster
+    holt die Zeilen gebündelt per Timer ab.
+    """
+
+    def __init__(self, max_zeilen: int = MAX_ZEILEN):
+        """
+        Args:
+            max_zeilen (int, optional): Maximale Anzahl noch nicht
+                abgeholter Zeilen. Ältere Zeilen werden verworfen.
+        """
+        self._zeilen = deque(maxlen=max_zeilen)
+        self._rest = ""
+        self._lock = threading.Lock()
+
+    def write(self, text) -> int:
+        text = str(text)
+        with self._lock:
+            teile = (self._rest + text).split("\n")
+            self._rest = teile.pop()
+            self._zeilen.extend(teile)
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self) -> bool:
+        return False
+
+    def abholen(self) -> List[str]:
+        """
+        Returns:
+            List[str]: Alle seit dem letzten Aufruf vollständig geschriebenen Zeilen
+        """
+        with self._lock:
+            zeilen = list(self._zeilen)
+            self._zeilen.clear()
+        return zeilen
+
+
+class AnsiParser:
+    """
+    Zerlegt Zeilen mit ANSI-Farbcodes in Textabschnitte mit vorab erstellten
+    QTextCharFormats.
+    """
+
+    def __init__(self):
+        self.standard = QtGui.QTextCharFormat()
+        self._formate = {}
+        for code, farbe in _FARBEN.items():
+            fmt = QtGui.QTextCharFormat()
+            fmt.setForeground(QtGui.QBrush(QtGui.QColor(farbe)))
+            self._formate[code] = fmt
+
+    def zerlegen(self, zeile: str) -> List[Tuple[str, QtGui.QTextCharFormat]]:
+        """
+        Args:
+            zeile (str): Zeile mit ANSI-Farbcodes
+
+        Returns:
+            List[Tuple[str, QtGui.QTextCharFormat]]: Textabschnitte ohne
+                Farbcodes und ihr Format
+        """
+        abschnitte = []
+        fmt = self.standard
+        position = 0
+        for treffer in _ANSI.finditer(zeile):
+            if treffer.start() > position:
+                abschnitte.append((zeile[position:treffer.start()], fmt))
+            # Bei mehreren Codes gilt der letzte, unbekannte setzen zurück
+            code = treffer.group(1).split(";")[-1]
+            fmt = self._formate.get(code, self.standard)
+            position = treffer.end()
+        if position < len(zeile):
+            abschnitte.append((zeile[position:], fmt))
+        return abschnitte
+
+
+class Konsole(QtCore.QObject):
+    """
+    Zeigt die Ausgabe eines ZeilenStreams in einem Textfeld an.
+
+    Neue Zeilen werden per Timer gebündelt in einem einzigen Edit-Block
+    eingefügt. Das Textfeld behält höchstens max_zeilen Zeilen, sodass
+    Speicherbedarf und Renderzeit auch bei tagelanger Suche konstant
+    bleiben.
+
+    Beispiel:
+        self.konsole = Konsole(self.console_text_edit, parent=self)
+        sys.stdout = self.konsole.stream
+    """
+
+    def __init__(self, textfeld: Union[QtWidgets.QTextEdit, QtWidgets.QPlainTextEdit],
+                 max_zeilen: int = MAX_ZEILEN, intervall_ms: int = INTERVALL_MS,
+                 parent: QtCore.QObject = None):
+        """
+        Args:
+            textfeld (QTextEdit | QPlainTextEdit): Textfeld für die Ausgabe, z. B. console_text_edit
+            max_zeilen (int, optional): Maximale Anzahl sichtbarer Zeilen
+            intervall_ms (int, optional): Intervall der Aktualisierung in ms
+            parent (QtCore.QObject, optional): Parent für Timer und Lebensdauer
+        """
+        super().__init__(parent)
+
+        self.textfeld = textfeld
+        self.textfeld.setReadOnly(True)
+        self.textfeld.setUndoRedoEnabled(False)
+        self.textfeld.document().setMaximumBlockCount(max_zeilen)
+
+        self.stream = ZeilenStream(max_zeilen)
+        self._parser = AnsiParser()
+
+        self._timer = QtCore.QTimer(self)
+        self._timer.setInterval(intervall_ms)
+        self._timer.timeout.connect(self.aktualisieren)
+        self._timer.start()
+
+    def aktualisieren(self):
+        """
+        Übernimmt alle neuen Zeilen aus dem Stream in das Textfeld.
+        """
+        zeilen = self.stream.abholen()
+        if not zeilen:
+            return
+
+        scrollbar = self.textfeld.verticalScrollBar()
+        am_ende = scrollbar.value() >= scrollbar.maximum() - 4
+
+        dokument = self.textfeld.document()
+        cursor = QtGui.QTextCursor(dokument)
+        cursor.movePosition(QtGui.QTextCursor.End)
+        cursor.beginEditBlock()
+        for zeile in zeilen:
+            # Das leere Dokument hat bereits einen Block
+            if not dokument.isEmpty():
+                cursor.insertBlock()
+            for text, fmt in self._parser.zerlegen(zeile):
+                cursor.insertText(text, fmt)
+        cursor.endEditBlock()
+
+        # Nur mitscrollen, wenn der Nutzer nicht gerade weiter oben liest
+        if am_ende:
+            scrollbar.setValue(scrollbar.maximum())
+
+    def stoppen(self):
+        """
+        Übernimmt die letzten Zeilen und beendet die Aktualisierung.
+        """
+        self.aktualisieren()
+        self._timer.stop()
@@ -0,0 +1,354 @@
+import multiprocessing
+import os
+import platform
+import subprocess
+import threading
+import time
+from multiprocessing.connection import Connection, wait
+from typing import Dict, List
+
+from PyQt5 import QtCore
+from PyQt5.QtCore import pyqtSignal
+
+try:
+    import psutil
+
+    ENABLE_PSUTIL = True
+except ImportError:
+    ENABLE_PSUTIL = False
+
+# Zeit in Sekunden, die ein Prozess nach terminate() zum Beenden hat
+STOP_TIMEOUT = 5
+
+# Intervall der Ressourcenanzeige in Sekunden
+STATISTIK_INTERVALL = 2
+
+
+class ProzessVerwaltung(QtCore.QObject):
+    """
+    Überwacht die Such- und Codegen-Prozesse der GUI.
+
+    Ein Hintergrund-Thread wartet per multiprocessing.connection.wait auf die
+    Sentinels aller Prozesse und meldet ein Prozessende sofort über das Signal
+    beendet. Im selben Thread werden im Intervall Speicher und CPU-Last je
+    Prozess (inklusive Chrome und chromedriver) ermittelt und über das Signal
+    statistik gemeldet. Ereignisse, die ein Prozess über eine Pipe schickt
+    (siehe tools.suchprozess), werden gesammelt über das Signal ereignisse
+    weitergegeben. Die Signale kommen über eine Queued Connection im
+    GUI-Thread an, Widgets werden also nur dort angefasst.
+
+    Beispiel:
+        self.prozess_verwaltung = ProzessVerwaltung(parent=self)
+        self.prozess_verwaltung.beendet.connect(self.__prozess_beendet)
+        self.prozess_verwaltung.hinzufuegen(prozess)
+    """
+
+    # Name, Exitcode
+    beendet = pyqtSignal(str, int)
+
+    # Name, Speicher in MB, CPU-Last in Prozent
+    statistik = pyqtSignal(str, float, float)
+
+    # Name, Liste der seit dem letzten Signal empfangenen Ereignisse
+    ereignisse = pyqtSignal(str, list)
+
+    def __init__(self, intervall: float = STATISTIK_INTERVALL, parent: QtCore.QObject = None):
+        """
+        Args:
+            intervall (float, optional): Intervall der Ressourcenanzeige in Sekunden
+            parent (QtCore.QObject, optional): Parent für die Lebensdauer
+        """
+        super().__init__(parent)
+
+        self.intervall = intervall
+        self._prozesse: Dict[str, multiprocessing.Process] = {}
+        self._verbindungen: Dict[str, Connection] = {}
+        self._psutil: Dict[int, Dict[int, "psutil.Process"]] = {}
+        self._lock = threading.Lock()
+        self._aktiv = True
+
+        # Über diese Pipe wird der wartende Thread geweckt, wenn sich die
+        # Liste der Prozesse ändert
+        self._wecker_empfang, self._wecker = multiprocessing.Pipe(duplex=False)
+
+        self._thread = threading.Thread(target=self._ueberwachen, name="prozess-verwaltung", daemon=True)
+        self._thread.start()
+
+    def hinzufuegen(self, prozess: multiprocessing.Process, verbindung: Connection = None):
+        """
+        Überwacht einen bereits gestarteten Prozess.
+
+        Args:
+            prozess (multiprocessing.Process): Gestarteter Prozess mit eindeutigem Namen
+            verbindung (Connection, optional): Empfangendes Ende einer Pipe,
+                über die der Prozess Ereignisse schickt
+        """
+        with self._lock:
+            self._prozesse[prozess.name] = prozess
+            if verbindung is not None:
+                self._verbindungen[prozess.name] = verbindung
+        self._wecken()
+
+    def namen(self) -> List[str]:
+        """
+        Returns:
+            List[str]: Namen aller überwachten Prozesse
+        """
+        with self._lock:
+            return list(self._prozesse)
+
+    def stoppen(self, name: str, timeout: float = STOP_TIMEOUT):
+        """
+        Beendet einen Prozess samt Kindprozessen, ohne die GUI zu blockieren.
+        Das Ende wird wie gewohnt über das Signal beendet gemeldet.
+
+        Args:
+            name (str): Name des Prozesses
+            timeout (float, optional): Zeit in Sekunden bis zum harten Beenden
+        """
+        with self._lock:
+            prozess = self._prozesse.get(name)
+        if prozess is None:
+            return
+        threading.Thread(target=prozessbaum_beenden, args=(prozess, timeout),
+                         name=f"stoppen-{name}", daemon=True).start()
+
+    def alle_stoppen(self, timeout: float = STOP_TIMEOUT):
+        """
+        Beendet alle Prozesse samt Kindprozessen und wartet darauf,
+        z. B. beim Schließen des Hauptfensters.
+
+        Args:
+            timeout (float, optional): Zeit in Sekunden bis zum harten Beenden
+        """
+        self._aktiv = False
+        self._wecken()
+        with self._lock:
+            prozesse = list(self._prozesse.values())
+        threads = [threading.Thread(target=prozessbaum_beenden, args=(prozess, timeout), daemon=True)
+                   for prozess in prozesse]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout + 1)
+
+    def _wecken(self):
+        try:
+            self._wecker.send_bytes(b"\0")
+        except OSError:
+            pass
+
+    def _ueberwachen(self):
+        # Die Statistik wird unabhängig davon gemeldet, wie oft Ereignisse
+        # den Thread wecken, sonst bliebe sie bei laufender Ausgabe stehen
+        naechste_statistik = time.monotonic() + self.intervall
+        while self._aktiv:
+            with self._lock:
+                sentinels = {prozess.sentinel: prozess for prozess in self._prozesse.values()}
+                verbindungen = {verbindung: name for name, verbindung in self._verbindungen.items()}
+
+            timeout = max(0.0, naechste_statistik - time.monotonic())
+            bereit = wait([self._wecker_empfang, *verbindungen, *sentinels], timeout=timeout)
+
+            if self._wecker_empfang in bereit:
+                while self._wecker_empfang.poll():
+                    self._wecker_empfang.recv_bytes()
+
+            # Ereignisse vor dem Prozessende verarbeiten, damit das Ergebnis
+            # nicht erst nach der Meldung beendet ankommt
+            for verbindung in bereit:
+                if verbindung in verbindungen:
+                    self._empfangen(verbindungen[verbindung], verbindung)
+
+            for sentinel in bereit:
+                prozess = sentinels.get(sentinel)
+                if prozess is None:
+                    continue
+                # Der Sentinel wird kurz vor dem Prozessende bereit
+                prozess.join(1)
+                with self._lock:
+                    self._prozesse.pop(prozess.name, None)
+                    self._psutil.pop(prozess.pid, None)
+                    verbindung = self._verbindungen.pop(prozess.name, None)
+                if verbindung is not None:
+                    self._empfangen(prozess.name, verbindung)
+                    verbindung.close()
+                exitcode = prozess.exitcode if prozess.exitcode is not None else -1
+                self.beendet.emit(prozess.name, exitcode)
+
+            if time.monotonic() >= naechste_statistik:
+                self._statistik_melden()
+                naechste_statistik = time.monotonic() + self.intervall
+
+    def _empfangen(self, name: str, verbindung: Connection):
+        ereignisse = []
+        offen = True
+        try:
+            while verbindung.poll():
+                ereignisse.append(verbindung.recv())
+        except (EOFError, OSError):
+            offen = False
+
+        if not offen:
+            verbindung.close()
+            with self._lock:
+                if self._verbindungen.get(name) is verbindung:
+                    del self._verbindungen[name]
+        if ereignisse:
+            self.ereignisse.emit(name, ereignisse)
+
+    def _statistik_melden(self):
+        if not ENABLE_PSUTIL:
+            return
+        with self._lock:
+            prozesse = list(self._prozesse.values())
+        for prozess in prozesse:
+            try:
+                rss, cpu = self._ressourcen(prozess.pid)
+            except (psutil.Error, OSError):
+                continue
+            self.statistik.emit(prozess.name, rss / 2 ** 20, cpu)
+
+    def _ressourcen(self, pid: int):
+        # psutil.Process merkt sich die letzte CPU-Zeit, cpu_percent liefert
+        # daher ohne Wartezeit die Last seit dem letzten Aufruf. Die Objekte
+        # werden je Prozessbaum wiederverwendet, beendete Kinder fallen heraus.
+        bisher = self._psutil.get(pid, {})
+        haupt = bisher.get(pid) or psutil.Process(pid)
+        baum = {}
+        for p in [haupt, *haupt.children(recursive=True)]:
+            baum[p.pid] = bisher.get(p.pid, p)
+        self._psutil[pid] = baum
+
+        rss = 0
+        cpu = 0.0
+        for p in baum.values():
+            try:
+                rss += p.memory_info().rss
+                cpu += p.cpu_percent()
+            except psutil.Error:
+                continue
+        return rss, cpu
+
+
+def kindprozesse(pid: int) -> List[int]:
+    """
+    Args:
+        pid (int): PID des Elternprozesses
+
+    Returns:
+        List[int]: PIDs aller direkten und indirekten Kindprozesse
+    """
+    if ENABLE_PSUTIL:
+        try:
+            return [p.pid for p in psutil.Process(pid).children(recursive=True)]
+        except psutil.Error:
+            return []
+
+    # Ohne psutil nur unter Linux über /proc
+    eltern = {}
+    try:
+        eintraege = os.listdir("/proc")
+    except OSError:
+        return []
+    for eintrag in eintraege:
+        if not eintrag.isdigit():
+            continue
+        try:
+            with open(f"/proc/{eintrag}/stat") as f:
+                # Der Prozessname steht in Klammern und kann Leerzeichen enthalten
+                felder = f.read().rsplit(")", 1)[1].split()
+            eltern.setdefault(int(felder[1]), []).append(int(eintrag))
+        except (OSError, IndexError, ValueError):
+            continue
+
+    kinder = []
+    offen = [pid]
+    while offen:
+        for kind in eltern.get(offen.pop(), []):
+            kinder.append(kind)
+            offen.append(kind)
+    return kinder
+
+
+def prozessbaum_beenden(prozess: multiprocessing.Process, timeout: float = STOP_TIMEOUT):
+    """
+    Beendet einen Prozess zunächst per terminate() und nach Ablauf des
+    Timeouts per kill(). Anschließend werden verbliebene Kindprozesse wie
+    Chrome und chromedriver beendet, die sonst verwaist weiterlaufen würden.
+
+    Args:
+        prozess (multiprocessing.Process): Zu beendender Prozess
+        timeout (float, optional): Zeit in Sekunden bis zum harten Beenden
+    """
+    if prozess.pid is None:
+        return
+
+    # Kinder vorher ermitteln, nach dem Ende des Elternprozesses sind sie
+    # nicht mehr als solche erkennbar
+    kinder = kindprozesse(prozess.pid)
+
+    if platform.system().lower() == "windows" and not ENABLE_PSUTIL and prozess.is_alive():
+        subprocess.run(["taskkill", "/T", "/F", "/PID", str(prozess.pid)],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    if prozess.is_alive():
+        prozess.terminate()
+        prozess.join(timeout)
+    if prozess.is_alive():
+        prozess.kill()
+        prozess.join(timeout)
+
+    _pids_beenden(kinder, timeout)
+
+
+def _pids_beenden(pids: List[int], timeout: float):
+    if not pids:
+        return
+
+    if ENABLE_PSUTIL:
+        prozesse = []
+        for pid in pids:
+            try:
+                prozesse.append(psutil.Process(pid))
+            except psutil.Error:
+                continue
+        for p in prozesse:
+            try:
+                p.terminate()
+            except psutil.Error:
+                pass
+        _, uebrig = psutil.wait_procs(prozesse, timeout=timeout)
+        for p in uebrig:
+            try:
+                p.kill()
+            except psutil.Error:
+                pass
+        return
+
+    import signal
+    import time
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except OSError:
+            pass
+    if not hasattr(signal, "SIGKILL"):
+        return
+    ende = time.monotonic() + timeout
+    while pids and time.monotonic() < ende:
+        pids = [pid for pid in pids if _laeuft(pid)]
+        time.sleep(0.1)
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+
+def _laeuft(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+        return True
+    except OSError:
+        return False
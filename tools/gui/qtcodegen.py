@@ -4,139 +4,113 @@ import sys
 import os
 
 
-from PyQt5 import QtWidgets, uic, QtCore, QtGui
-from PyQt5.QtCore import QObject, QThread, pyqtSignal
+from PyQt5 import QtWidgets, uic, QtCore
+from PyQt5.QtCore import QObject, QThread
 from PyQt5.QtGui import QIcon
+from tools.abbruch import Abbruch
 from tools.gui import *
-from tools.its import ImpfterminService
+from tools.gui.anfrage import Anfrage, Anfragekanal
+from tools.gui.konsole import Konsole
 from tools.kontaktdaten import validate_datum
-from tools.exceptions import MissingValuesError, ValidationError
+from tools.pinquelle import GuiPinQuelle
+from tools.exceptions import Abgebrochen, AnfrageAbgebrochen, MissingValuesError, ValidationError
 
 
 PATH = os.path.dirname(os.path.realpath(__file__))
 
-            
-class EigenerStream(QtCore.QObject):
-        
-    """
-    Klasse wenn auf write() zugegriffen wird, dann wird das Signal textWritten ausgelöst
-    """
-
-    # Signal welches ausgelöst werden kann
-    text_schreiben = pyqtSignal(str)
-
-    def write(self, stream):
-        """
-        Löst das Signal text_schreiben aus und übergibt das Argument text weiter
-        """
-        
-        self.text_schreiben.emit(str(stream))
 
 class Worker(QObject):
     """
-    Worker, der nichts anderes macht, als den Termin mithilfe its.py zu suchen
-    sobald die Suche beendet wurde, wird ein "fertig" Signal geworfen, welches den Rückgabewert von its übergibt
+    Worker, der den Code mithilfe its.py generiert. Eingaben und Meldungen
+    werden über den Anfragekanal von der GUI angefordert.
     """
 
-    # Signal wenn Suche abgeschlossen oder fehlgeschlagen
-    signalShowInput = pyqtSignal(str)
-    signalShowDlg = pyqtSignal(str,str)
-    signalUpdateData = pyqtSignal(str,str)
-    signalStop = pyqtSignal()
-
-    def __init__(self, kontaktdaten: dict, ROOT_PATH: str):
+    def __init__(self, kontaktdaten: dict, ROOT_PATH: str, kanal: Anfragekanal):
         """
         Args:
             kontaktdaten (dict): kontakdaten aus kontaktdaten.jso
             ROOT_PATH (str): Pfad zur main.py / gui.py
+            kanal (Anfragekanal): Kanal für Anfragen an die GUI
         """
         super().__init__()
         
         self.stopped = False
-        self.signalGot = False
 
         self.kontaktdaten = kontaktdaten
         self.ROOT_PATH = ROOT_PATH
+        self.kanal = kanal
+
+        # Beendet Wartezeiten und Browser des ImpfterminService sofort
+        self.abbruch = Abbruch()
         
         self.geburtsdatum = ""
         self.plz_impfzentrum = ""
         self.mail = ""
         self.telefonnummer = ""
-        
-        # connect to signals
-        self.signalUpdateData.connect(self.updateData)
-        self.signalStop.connect(self.stop)
 
 
     def __del__(self):
         print("Worker quit")
 
     def stop(self):
+        """
+        Beendet den Worker, eine wartende Anfrage wird sofort abgebrochen
+        """
         self.stopped = True
+        self.kanal.abbrechen()
+        self.abbruch.abbrechen("Codegenerierung beendet")
 
-    # send a signal and wait for received return
-    def sendSignalAndWait(self, strSignal, strSigParam):
-        if strSignal == "signalShowInput":
-            self.signalShowInput.emit(strSigParam)
-
-        while True and self.stopped is False:
-            if self.signalGot is True:
-                break
-            QtCore.QThread.msleep(100)
-        #reset member for next signal
-        self.signalGot = False
-
-
-    def updateData(self, strmode, txt):
-        if strmode == "GEBURTSDATUM":
-            print(txt)
-            self.geburtsdatum = txt
-            
-        self.signalGot = True
-        return True
-        
     def code_gen(self):
         """
         Startet den Prozess der Codegenerierung
         Codegenerierung ohne interaktive Eingabe der Kontaktdaten
-        :param kontaktdaten: Dictionary mit Kontaktdaten
         """
+        try:
+            return self._code_gen()
+        except (AnfrageAbgebrochen, Abgebrochen):
+            return False
+
+    def _code_gen(self):
         try:
             self.plz_impfzentrum = self.kontaktdaten["plz_impfzentren"][0]
             self.mail = self.kontaktdaten["kontakt"]["notificationReceiver"]
             self.telefonnummer = self.kontaktdaten["kontakt"]["phone"]
         except KeyError as error:
-            self.signalShowDlg.emit("MISSING_KONTAKT","")
-            self.stop()
-           
-        if self.stopped is True:
+            self.kanal.fragen("MISSING_KONTAKT")
             return False
-            
-        its = ImpfterminService([], {}, self.ROOT_PATH)
+
+        from tools.its import ImpfterminService
+
+        its = ImpfterminService([], {}, self.ROOT_PATH, abbruch=self.abbruch)
         
-        # send signal for GUI
-        self.sendSignalAndWait("signalShowInput","GEBURTSDATUM")
+        self.geburtsdatum = self.kanal.fragen("GEBURTSDATUM")
 
         #stop requested in the meanwhile?
         if self.stopped is True:
             return False
             
+        # SMS-Code kann im Dialog oder im Browser eingegeben werden
+        pin_quelle = GuiPinQuelle(log=its.log, abbruch=its.abbruch)
+        pin_anfrage = self.kanal.stellen("SMSCODE", pin_quelle)
+
         # code anfordern via selenium
         try:
-            if its.selenium_code_anfordern(self.mail, self.telefonnummer,  self.plz_impfzentrum, self.geburtsdatum):
-                self.sendSignalAndWait("signalShowInput","SMSCODE_OK")
+            if its.selenium_code_anfordern(self.mail, self.telefonnummer,  self.plz_impfzentrum,
+                                           self.geburtsdatum, pin_quelle=pin_quelle):
+                self.kanal.fragen("SMSCODE_OK")
                 return True
         except RuntimeError as exc:
             print(
                 f"\nDie Code-Generierung war leider nicht erfolgreich:\n{str(exc)}")
-            self.signalShowDlg.emit("CRITICAL_CLOSE",f"\nDie Code-Generierung war leider nicht erfolgreich:\n{str(exc)}")
-            while True and self.stopped is False:
-                QtCore.QThread.msleep(100)
+            self.kanal.fragen("CRITICAL_CLOSE", f"\nDie Code-Generierung war leider nicht erfolgreich:\n{str(exc)}")
             return False
+        finally:
+            pin_anfrage.abbrechen()
+            pin_quelle.schliessen()
 
         print("Die Code-Generierung war leider nicht erfolgreich.")
 
-        self.signalShowDlg.emit("CRITICAL_CLOSE",f"SMS-Code ungültig.\n\nDie Code-Generierung war leider nicht erfolgreich")
+        self.kanal.fragen("CRITICAL_CLOSE", f"SMS-Code ungültig.\n\nDie Code-Generierung war leider nicht erfolgreich")
         return False
 
 
@@ -151,14 +125,17 @@ class QtCodeGen(QtWidgets.QDialog):
         
         self.parent = parent
         self._hardClose = False
+        self._pin_dialog = None
         
         # Attribute erstellen
         self.kontaktdaten = kontaktdaten
         self.ROOT_PATH = ROOT_PATH
 
-        # std.out & error auf das Textfeld umleiten
-        sys.stdout = EigenerStream(text_schreiben=self.update_ausgabe)
-        sys.stderr = EigenerStream(text_schreiben=self.update_ausgabe)
+        # std.out & error auf das Textfeld umleiten. Die Zeilen werden gebündelt
+        # übernommen, die vollständige Ausgabe steht in der Logdatei.
+        self.konsole = Konsole(self.textAusgabe, parent=self)
+        sys.stdout = self.konsole.stream
+        sys.stderr = self.konsole.stream
 
         # Entsprechend Konfigurieren
         self.setup_thread()
@@ -184,82 +161,97 @@ class QtCodeGen(QtWidgets.QDialog):
         """
         self.thread = QThread(parent=self)
         self.thread.setTerminationEnabled(True)
-        self.worker = Worker(self.kontaktdaten, self.ROOT_PATH)
+        self.kanal = Anfragekanal(parent=self)
+        self.worker = Worker(self.kontaktdaten, self.ROOT_PATH, self.kanal)
         
         # Worker und Thread verbinden
         self.worker.moveToThread(self.thread)
         
         # Signale setzen
         self.thread.started.connect(self.worker.code_gen)
-        self.worker.signalShowInput.connect(self.showInputDlg)
-        self.worker.signalShowDlg.connect(self.showDlg)
+        self.kanal.anfrage.connect(self.anfrage_anzeigen)
 
 
-    def update_ausgabe(self, text):
+    def anfrage_anzeigen(self, anfrage: Anfrage):
         """
-        Fügt den übergeben Text dem textAusgabe hinzu
+        Zeigt den zur Anfrage des Workers passenden Dialog an und beantwortet
+        die Anfrage. Läuft im GUI-Thread.
 
         Args:
-            text (str): Text welcher hinzukommen soll
+            anfrage (Anfrage): Anfrage aus dem Anfragekanal
         """
 
-        # Austausch der Farbcodes / Ascii Zeichen aus der Shell
-        listeCodes = ['\033[95m', '\033[91m', '\033[33m', '\x1b[0m', '\033[94m', '\033[32m', '\033[0m']
-        for farbcode in listeCodes:
-            if farbcode in text:
-                if farbcode == '\033[95m' or farbcode == '\033[91m':
-                    text = f"<div style='color:red'>{text}</div>"
-                elif farbcode == '\033[33m':
-                    text = f"<div style='color:orange'>{text}</div>"
-                elif farbcode == '\x1b[0m':
-                    text = f"<div>{text}</div>"
-                elif farbcode == '\033[94m':
-                    text = f"<div style='color:blue'>{text}</div>"
-                elif farbcode == '\033[32m':
-                    text = f"<div style='color:green'>{text}</div>"
-                text = text.replace(farbcode, '')
-
-        cursor = self.textAusgabe.textCursor()
-        cursor.movePosition(QtGui.QTextCursor.End)
-        cursor.insertHtml(str(text))
-        cursor.insertText(str("\n"))
-        self.textAusgabe.setTextCursor(cursor)
-        self.textAusgabe.ensureCursorVisible()
-
-    def showInputDlg(self, dlgType):
-        
-        if dlgType == "GEBURTSDATUM":
-           while True:
+        if anfrage.art == "GEBURTSDATUM":
+            while True:
                 try:
                     text, ok = QtWidgets.QInputDialog.getText(self, 'Geburtsdatum', 'Bitte trage nachfolgend dein Geburtsdatum im Format DD.MM.YYYY ein.\n'
                         'Beispiel: 02.03.1982\n')
                     if ok:
                         geburtsdatum = str(text)
                         validate_datum(geburtsdatum)
-                        self.worker.signalUpdateData.emit("GEBURTSDATUM",geburtsdatum)
+                        anfrage.beantworten(geburtsdatum)
                         break
                     else:
+                        anfrage.abbrechen()
                         self.hardClose()
                         break
                 except ValidationError as exc:
                     QtWidgets.QMessageBox.critical(self, "Geburtsdatum ungültiges Format", "Das Datum entspricht nicht dem richtigen Format (DD.MM.YYYY).")
  
-        elif dlgType == "SMSCODE_OK":
-            ret = QtWidgets.QMessageBox.information(self, "Erfolgreich", "Code erfolgreich generiert. Du kannst jetzt mit der Terminsuche fortfahren.",QMessageBox.StandardButton.Ok)
-            if ret == QMessageBox.StandardButton.Ok:
-                self.worker.signalUpdateData.emit("SMSCODE_OK","")
-                self.hardClose()
-            
-    def showDlg(self, strMode, strTxt):
-        if strMode == "MISSING_KONTAKT":
-            ret = QtWidgets.QMessageBox.critical(self, "Kontaktdaten ungültig",
+        elif anfrage.art == "SMSCODE":
+            self.pin_dialog_oeffnen(anfrage)
+
+        elif anfrage.art == "SMSCODE_OK":
+            self.pin_dialog_schliessen()
+            QtWidgets.QMessageBox.information(self, "Erfolgreich", "Code erfolgreich generiert. Du kannst jetzt mit der Terminsuche fortfahren.",QMessageBox.StandardButton.Ok)
+            anfrage.beantworten()
+            self.hardClose()
+
+        elif anfrage.art == "MISSING_KONTAKT":
+            QtWidgets.QMessageBox.critical(self, "Kontaktdaten ungültig",
                 "Die Kontakdaten sind nicht korrekt!.\n\nBitte Datei neu erstellen!", QMessageBox.StandardButton.Ok)
-            if ret == QMessageBox.StandardButton.Ok:
-                self.hardClose()
-        elif strMode == "CRITICAL_CLOSE":
-            ret = QtWidgets.QMessageBox.critical(self, "Error", strTxt, QMessageBox.StandardButton.Ok)
-            if ret == QMessageBox.StandardButton.Ok:
-                self.hardClose()
+            anfrage.beantworten()
+            self.hardClose()
+
+        elif anfrage.art == "CRITICAL_CLOSE":
+            self.pin_dialog_schliessen()
+            QtWidgets.QMessageBox.critical(self, "Error", anfrage.parameter, QMessageBox.StandardButton.Ok)
+            anfrage.beantworten()
+            self.hardClose()
+
+        else:
+            anfrage.abbrechen()
+
+    def pin_dialog_oeffnen(self, anfrage: Anfrage):
+        """
+        Öffnet einen nicht blockierenden Dialog für den SMS-Code. Jeder
+        eingegebene Code wird sofort an die GuiPinQuelle der Anfrage
+        übergeben. Bis die Anfrage erledigt ist, öffnet sich der Dialog nach
+        jeder Eingabe erneut, z. B. für einen Vertipper.
+
+        Args:
+            anfrage (Anfrage): Anfrage "SMSCODE" mit GuiPinQuelle als Parameter
+        """
+
+        dialog = QtWidgets.QInputDialog(self)
+        dialog.setWindowTitle("SMS-Code")
+        dialog.setLabelText("Bitte trage den 6-stelligen SMS-Code ein.\n"
+                            "Alternativ kannst du ihn direkt im Browser-Fenster eingeben.\n")
+        dialog.textValueSelected.connect(anfrage.parameter.eingeben)
+
+        def erneut_oeffnen():
+            if not anfrage.erledigt:
+                dialog.setTextValue("")
+                dialog.open()
+
+        dialog.accepted.connect(erneut_oeffnen)
+        self._pin_dialog = dialog
+        dialog.open()
+
+    def pin_dialog_schliessen(self):
+        if self._pin_dialog is not None:
+            self._pin_dialog.reject()
+            self._pin_dialog = None
 
                 
     # force to close the dialog without confirmation
@@ -294,6 +286,7 @@ class QtCodeGen(QtWidgets.QDialog):
         self.thread.terminate()
 
         # Streams wieder korrigieren, damit kein Fehler kommt
+        self.konsole.stoppen()
         sys.stdout = sys.__stdout__
         sys.stderr = sys.__stderr__
 
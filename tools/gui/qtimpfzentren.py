@@ -1,194 +1,405 @@
 import os
 from PyQt5 import QtWidgets, uic, QtGui, QtCore
-from tools.utils import get_grouped_impfzentren
-from typing import Tuple, List
+from PyQt5.QtCore import QObject, QThread, pyqtSignal, Qt
+from tools.utils import get_impfzentren
+from typing import Dict, List, Optional, Tuple
 
 
 PATH = os.path.dirname(os.path.realpath(__file__))
 
 
-class QtImpfzentren(QtWidgets.QDialog):
-    # Folgende Widgets stehen zur Verfügung:
+class ImpfzentrenModell(QtCore.QAbstractItemModel):
+    """
+    Baum aus Gruppen und ihren Impfzentren mit ankreuzbaren Einträgen.
 
-    ### Layout ###
-    # impfzentren_grid_layout
+    Es dürfen nur Impfzentren einer Gruppe gewählt werden, da sich nur diese
+    einen Vermittlungscode teilen. Die Auswahl wird je Gruppe als Menge von
+    PLZ gehalten, sodass flags() die Einschränkung ohne Durchlaufen aller
+    Einträge berechnen kann.
 
-    ### ButtonBox ###
-    # buttonBox
-    # Ok
-    # Cancel
+    Interne IDs: 0 für Gruppen, Gruppenzeile + 1 für Impfzentren.
+    """
 
-    ### QWidget ###
-    # scrollAreaWidgetContents
+    SPALTEN = ("PLZ", "Ort", "Zentrumsname")
 
-    # Signal welches geworfen wird, wenn man auf Apply drückt
-    # Gibt einen String mit allen aktiven PLZ zurück
-    update_impfzentren_plz = QtCore.pyqtSignal(str)
+    def __init__(self, parent: QtCore.QObject = None):
+        super().__init__(parent)
 
-    def __init__(self, parent: QtWidgets.QWidget, pfad_fenster_layout=os.path.join(PATH, "impfzentren.ui")):
-        super().__init__(parent=parent)
+        self._gruppen: List[str] = list()
+        self._bundeslaender: List[str] = list()
+        self._zentren: List[Tuple[Dict, ...]] = list()
+        self._ausgewaehlt: Dict[int, set] = dict()
 
-        # Laden der .ui Datei und init config
-        uic.loadUi(pfad_fenster_layout, self)
+        self._gruppen_font = QtGui.QFont()
+        self._gruppen_font.setBold(True)
 
-        # ButtonBox Event verknüpfen
-        self.buttonBox.clicked.connect(self.__button_box_clicked)
+    def setze_impfzentren(self, gruppiert: Dict[str, Tuple[Dict, ...]]):
+        """
+        Übernimmt die Impfzentren und setzt die Auswahl zurück
 
-        self.init_layout()
+        Args:
+            gruppiert (dict): Ergebnis von Impfzentren.gruppiert()
+        """
 
-    def init_layout(self):
+        self.beginResetModel()
+        self._gruppen = list()
+        self._bundeslaender = list()
+        self._zentren = list()
+        self._ausgewaehlt = dict()
+        for gruppe, zentren in gruppiert.items():
+            # Skippen, wenn es keine PLZ gibt (bsp. Gruppe 10)
+            zentren = tuple(zentrum for zentrum in zentren if zentrum.get("PLZ"))
+            if not zentren:
+                continue
+            self._gruppen.append(gruppe)
+            self._bundeslaender.append(zentren[0].get("Bundesland", ""))
+            self._zentren.append(zentren)
+        self.endResetModel()
+
+    def aktive_gruppe(self) -> Optional[int]:
         """
-        Erstellt dynamisch die Gruppen, CheckBoxes und Labels
+        Returns:
+            int: Zeile der Gruppe mit ausgewählten Impfzentren oder None
         """
 
-        impfzentren: dict = get_grouped_impfzentren()
-
-        for gruppe, zentren in impfzentren.items():
-            row = self.impfzentren_grid_layout.rowCount()
-            gruppen_font = QtGui.QFont()
-            gruppen_font.setPointSize(12)
-            gruppen_font.setUnderline(True)
-
-            horizontale_linie = self.get_horizontale_linie()
-            gruppen_label = QtWidgets.QLabel(f"{gruppe} - {zentren[0]['Bundesland']}")
-            gruppen_label.setFont(gruppen_font)
+        return next(iter(self._ausgewaehlt), None)
 
-            self.impfzentren_grid_layout.addWidget(horizontale_linie, row, 0, 1, 1)
-            self.impfzentren_grid_layout.addWidget(gruppen_label, row+1, 0, 1, 1)
+    def ausgewaehlte_plz(self) -> List[str]:
+        """
+        Returns:
+            list[str]: PLZ aller ausgewählten Impfzentren in Reihenfolge der Anzeige
+        """
 
-            form_layout = QtWidgets.QFormLayout()
-            form_layout.setVerticalSpacing(15)
-            form_layout.setHorizontalSpacing(10)
-            for zentrum in zentren:
-                checkbox, info_grid = self.get_zentrum_widgets(gruppe, zentrum)
+        gruppe = self.aktive_gruppe()
+        if gruppe is None:
+            return list()
+        plz = self._ausgewaehlt[gruppe]
+        return [zentrum["PLZ"] for zentrum in self._zentren[gruppe] if zentrum["PLZ"] in plz]
 
-                # Skippen, wenn es keine PLZ gibt (bsp. Gruppe 10)
-                if checkbox.property("PLZ"):
-                    form_layout.addRow(checkbox, info_grid)
+    def zuruecksetzen(self):
+        """
+        Hebt die gesamte Auswahl auf
+        """
 
-            self.impfzentren_grid_layout.addLayout(form_layout, row+2, 0, 1, 1)
+        gruppe = self.aktive_gruppe()
+        if gruppe is None:
+            return
+        self._ausgewaehlt.clear()
+        self._auswahl_geaendert(gruppe, gruppe_gewechselt=True)
 
-    def get_horizontale_linie(self) -> QtWidgets.QFrame:
+    def passt(self, source_row: int, source_parent: QtCore.QModelIndex, text: str) -> bool:
         """
-        Erstellt eine Horizontal Linie
+        Prüft, ob eine Zeile zum Suchtext passt. Gruppen passen über ihren
+        Namen und ihr Bundesland.
+
+        Args:
+            source_row (int): Zeile
+            source_parent (QtCore.QModelIndex): Parent der Zeile
+            text (str): Suchtext in Kleinbuchstaben
 
         Returns:
-            QtWidgets.QFrame: [description]
+            bool: True, falls der Suchtext enthalten ist
         """
 
-        linie = QtWidgets.QFrame()
-        linie.setMinimumWidth(1)
-        linie.setFixedHeight(20)
-        linie.setFrameShape(QtWidgets.QFrame.HLine)
-        linie.setFrameShadow(QtWidgets.QFrame.Sunken)
-        linie.setSizePolicy(QtWidgets.QSizePolicy.Preferred, QtWidgets.QSizePolicy.Minimum)
+        if source_parent.isValid():
+            zentrum = self._zentren[source_parent.row()][source_row]
+            felder = (zentrum["PLZ"], zentrum.get("Ort", ""), zentrum.get("Zentrumsname", ""))
+        else:
+            felder = (self._gruppen[source_row], self._bundeslaender[source_row])
+        return any(text in feld.lower() for feld in felder)
+
+    ##############################
+    #   QAbstractItemModel API   #
+    ##############################
+
+    def index(self, row: int, column: int, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> QtCore.QModelIndex:
+        if not self.hasIndex(row, column, parent):
+            return QtCore.QModelIndex()
+        if parent.isValid():
+            return self.createIndex(row, column, parent.row() + 1)
+        return self.createIndex(row, column, 0)
+
+    def parent(self, index: QtCore.QModelIndex) -> QtCore.QModelIndex:
+        if not index.isValid() or index.internalId() == 0:
+            return QtCore.QModelIndex()
+        return self.createIndex(index.internalId() - 1, 0, 0)
+
+    def rowCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
+        if not parent.isValid():
+            return len(self._gruppen)
+        if parent.internalId() == 0 and parent.column() == 0:
+            return len(self._zentren[parent.row()])
+        return 0
+
+    def columnCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
+        return len(self.SPALTEN)
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.SPALTEN[section]
+        return None
+
+    def data(self, index: QtCore.QModelIndex, role: int = Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        if index.internalId() == 0:
+            gruppe = index.row()
+            if role == Qt.DisplayRole:
+                if index.column() == 0:
+                    return self._gruppen[gruppe]
+                if index.column() == 1:
+                    return self._bundeslaender[gruppe]
+                return f"{len(self._zentren[gruppe])} Impfzentren"
+            if role == Qt.CheckStateRole and index.column() == 0:
+                anzahl = len(self._ausgewaehlt.get(gruppe, ()))
+                if anzahl == 0:
+                    return Qt.Unchecked
+                if anzahl == len(self._zentren[gruppe]):
+                    return Qt.Checked
+                return Qt.PartiallyChecked
+            if role == Qt.FontRole:
+                return self._gruppen_font
+            return None
+
+        gruppe = index.internalId() - 1
+        zentrum = self._zentren[gruppe][index.row()]
+        if role == Qt.DisplayRole:
+            if index.column() == 0:
+                return zentrum["PLZ"]
+            if index.column() == 1:
+                return zentrum.get("Ort", "")
+            return zentrum.get("Zentrumsname", "")
+        if role == Qt.CheckStateRole and index.column() == 0:
+            if zentrum["PLZ"] in self._ausgewaehlt.get(gruppe, ()):
+                return Qt.Checked
+            return Qt.Unchecked
+        return None
+
+    def flags(self, index: QtCore.QModelIndex) -> Qt.ItemFlags:
+        if not index.isValid():
+            return Qt.NoItemFlags
+
+        gruppe = index.row() if index.internalId() == 0 else index.internalId() - 1
+        aktiv = self.aktive_gruppe()
+
+        flags = Qt.ItemIsSelectable
+        if aktiv is None or aktiv == gruppe:
+            flags |= Qt.ItemIsEnabled
+        if index.column() == 0:
+            flags |= Qt.ItemIsUserCheckable
+        return flags
+
+    def setData(self, index: QtCore.QModelIndex, value, role: int = Qt.EditRole) -> bool:
+        if role != Qt.CheckStateRole or not index.isValid() or index.column() != 0:
+            return False
+        if not self.flags(index) & Qt.ItemIsEnabled:
+            return False
+
+        checked = Qt.CheckState(value) != Qt.Unchecked
+        vorher = self.aktive_gruppe()
+
+        if index.internalId() == 0:
+            gruppe = index.row()
+            if checked:
+                self._ausgewaehlt[gruppe] = {zentrum["PLZ"] for zentrum in self._zentren[gruppe]}
+            else:
+                self._ausgewaehlt.pop(gruppe, None)
+        else:
+            gruppe = index.internalId() - 1
+            plz = self._zentren[gruppe][index.row()]["PLZ"]
+            auswahl = self._ausgewaehlt.setdefault(gruppe, set())
+            if checked:
+                auswahl.add(plz)
+            else:
+                auswahl.discard(plz)
+            if not auswahl:
+                del self._ausgewaehlt[gruppe]
 
-        return linie
+        self._auswahl_geaendert(gruppe, gruppe_gewechselt=vorher != self.aktive_gruppe())
+        return True
 
-    def get_zentrum_widgets(self, gruppe: str, zentrum: dict) -> Tuple[QtWidgets.QCheckBox, QtWidgets.QGridLayout]:
+    def _auswahl_geaendert(self, gruppe: int, gruppe_gewechselt: bool):
+        """
+        Meldet die geänderten Zeilen an die Views. Nur wenn sich die aktive
+        Gruppe ändert, müssen alle Gruppen neu gezeichnet werden.
         """
-        Erstellt ein Widget Paket für die Checkbox mit entsprechendem Layout welches die Labels enhalten
 
-        Args:
-            gruppe (str): Gruppe welcher der Button zugeordnet werden soll
-            zentrum (dict): Zentrum Daten
+        letzte_spalte = len(self.SPALTEN) - 1
+        gruppen = range(len(self._gruppen)) if gruppe_gewechselt else (gruppe,)
+        for g in gruppen:
+            gruppen_index = self.index(g, 0)
+            self.dataChanged.emit(gruppen_index, self.index(g, letzte_spalte))
+            anzahl = len(self._zentren[g])
+            self.dataChanged.emit(self.index(0, 0, gruppen_index),
+                                  self.index(anzahl - 1, letzte_spalte, gruppen_index))
 
-        Returns:
-            tuple[QtWidgets.QCheckBox, QtWidgets.QGridLayout]: Checkbox mit den propertys PLZ und GRUPPE
-                                                               Layout mit entsprechenden Labels und beschriftungen
+
+class ImpfzentrenFilter(QtCore.QSortFilterProxyModel):
+    """
+    Filtert den ImpfzentrenModell-Baum nach einem Suchtext. Passt eine
+    Gruppe, werden alle ihre Impfzentren gezeigt, passt ein Impfzentrum,
+    wird seine Gruppe gezeigt.
+    """
+
+    def __init__(self, parent: QtCore.QObject = None):
+        super().__init__(parent)
+        self._text = ""
+
+    def setze_suchtext(self, text: str):
+        """
+        Args:
+            text (str): Suchtext, Groß- und Kleinschreibung wird ignoriert
         """
 
-        # Form und Layout erstellen
-        info_form_Layout = QtWidgets.QGridLayout()
-        font_ort = QtGui.QFont()
-        font_ort.setBold(True)
+        self._text = text.strip().lower()
+        self.invalidateFilter()
 
-        # Checkbox erstellen und konfigurieren
-        checkbox = QtWidgets.QCheckBox()
-        checkbox.setText(zentrum["PLZ"])
-        checkbox.setProperty("PLZ", zentrum["PLZ"])
-        checkbox.setProperty("GRUPPE", gruppe)
-        checkbox.stateChanged.connect(lambda: self.checkbox_clicked(checkbox))
+    def filterAcceptsRow(self, source_row: int, source_parent: QtCore.QModelIndex) -> bool:
+        if not self._text:
+            return True
 
-        # Label beschriften
-        ort_zentrum_label = QtWidgets.QLabel(zentrum["Ort"])
-        name_zentrum_label = QtWidgets.QLabel(zentrum["Zentrumsname"])
+        modell: ImpfzentrenModell = self.sourceModel()
+        if modell.passt(source_row, source_parent, self._text):
+            return True
 
-        # Extra Font für den Ort Label
-        ort_zentrum_label.setFont(font_ort)
+        if source_parent.isValid():
+            return modell.passt(source_parent.row(), QtCore.QModelIndex(), self._text)
 
-        # Labels dem GridLayout hinzufügen
-        info_form_Layout.addWidget(ort_zentrum_label)
-        info_form_Layout.addWidget(name_zentrum_label)
+        gruppen_index = modell.index(source_row, 0)
+        return any(modell.passt(row, gruppen_index, self._text)
+                   for row in range(modell.rowCount(gruppen_index)))
 
-        return checkbox, info_form_Layout
 
-    def disable_plz_checkboxes(self, gruppe: str):
-        """
-        Deaktiviert alle Checkboxen außer der übergebenen Gruppe
+class ImpfzentrenLader(QObject):
+    """
+    Lädt die Impfzentren in einem eigenen Thread, damit der Dialog sofort erscheint
+    """
 
-        Args:
-            gruppe (str): Gruppenname welcher nicht deaktiviert wird
+    # Signal mit dem Ergebnis von Impfzentren.gruppiert()
+    fertig = pyqtSignal(dict)
+    fehlschlag = pyqtSignal(Exception)
+
+    def laden(self):
+        try:
+            # get_impfzentren liefert bei Fehlern ein leeres Verzeichnis
+            gruppiert = get_impfzentren().gruppiert()
+            if not gruppiert:
+                raise RuntimeError("Keine Impfzentren erhalten, bitte Internetverbindung prüfen")
+            self.fertig.emit(gruppiert)
+        except Exception as error:
+            self.fehlschlag.emit(error)
+
+
+class QtImpfzentren(QtWidgets.QDialog):
+    # Folgende Widgets stehen zur Verfügung:
+
+    ### QLineEdit ###
+    # suche_line_edit
+
+    ### QLabel ###
+    # status_label
+
+    ### QTreeView ###
+    # impfzentren_tree_view
+
+    ### ButtonBox ###
+    # buttonBox
+    # Ok
+    # Cancel
+
+    # Signal welches geworfen wird, wenn man auf Apply drückt
+    # Gibt einen String mit allen aktiven PLZ zurück
+    update_impfzentren_plz = QtCore.pyqtSignal(str)
+
+    def __init__(self, parent: QtWidgets.QWidget, pfad_fenster_layout=os.path.join(PATH, "impfzentren.ui")):
+        super().__init__(parent=parent)
+
+        # Laden der .ui Datei und init config
+        uic.loadUi(pfad_fenster_layout, self)
+
+        # ButtonBox Event verknüpfen
+        self.buttonBox.clicked.connect(self.__button_box_clicked)
+
+        self.init_layout()
+        self.setup_thread()
+
+    def init_layout(self):
+        """
+        Verbindet Modell, Filter und Baumansicht
         """
 
-        all_checkboxes = self.scrollAreaWidgetContents.findChildren(QtWidgets.QCheckBox)
+        self.modell = ImpfzentrenModell(self)
+        self.filter = ImpfzentrenFilter(self)
+        self.filter.setSourceModel(self.modell)
 
-        for checkbox in all_checkboxes:
-            if checkbox.property("GRUPPE") == gruppe:
-                checkbox.setEnabled(True)
-            else:
-                checkbox.setDisabled(True)
+        self.impfzentren_tree_view.setModel(self.filter)
+        self.impfzentren_tree_view.header().setSectionResizeMode(QtWidgets.QHeaderView.ResizeToContents)
+        self.impfzentren_tree_view.header().setStretchLastSection(True)
+
+        self.suche_line_edit.textChanged.connect(self.__suche_geaendert)
+        self.suche_line_edit.setEnabled(False)
 
-    def enable_all_checkboxes(self):
+    def setup_thread(self):
         """
-        Aktiviert alle Checkboxen
+        Thread + ImpfzentrenLader erstellen und starten
         """
 
-        all_checkboxes = self.scrollAreaWidgetContents.findChildren(QtWidgets.QCheckBox)
+        self.thread = QThread(parent=self)
+        self.lader = ImpfzentrenLader()
+        self.lader.moveToThread(self.thread)
 
-        for checkbox in all_checkboxes:
-            checkbox.setEnabled(True)
+        self.lader.fertig.connect(self.impfzentren_geladen)
+        self.lader.fehlschlag.connect(self.laden_fehlgeschlagen)
+        self.lader.fertig.connect(self.thread.quit)
+        self.lader.fehlschlag.connect(self.thread.quit)
+        self.thread.finished.connect(self.lader.deleteLater)
 
-    def checkbox_clicked(self, checkbox: QtWidgets.QCheckBox):
+        self.thread.started.connect(self.lader.laden)
+        self.thread.start()
+
+    def impfzentren_geladen(self, gruppiert: dict):
         """
-        Funktion welche nach dem Klicken auf eine Checkbox ausgeführt werden soll
-        Aktiviert / Deaktiviert alle andern Checkboxen in einer anderen Gruppe
+        Übernimmt die geladenen Impfzentren in das Modell
 
         Args:
-            checkbox (QtWidgets.QCheckBox): chebox welche geklickt wurde
+            gruppiert (dict): Ergebnis von Impfzentren.gruppiert()
         """
 
-        gruppe = checkbox.property("GRUPPE")
-
-        if self.get_all_checked_boxes():
-            self.disable_plz_checkboxes(gruppe)
-        else:
-            self.enable_all_checkboxes()
+        self.modell.setze_impfzentren(gruppiert)
+        self.impfzentren_tree_view.expandAll()
+        self.status_label.setText(
+            "Es können nur Impfzentren einer Gruppe gewählt werden, da nur diese einen Vermittlungscode teilen")
+        self.suche_line_edit.setEnabled(True)
+        self.suche_line_edit.setFocus()
 
-    def bestaetigt(self):
+    def laden_fehlgeschlagen(self, error: Exception):
         """
-        Die Aktiven PLZ werden in dem Hauptfenster eingetragen
-        Emit von update_impfzentren_plz
+        Args:
+            error (Exception): Fehler beim Laden der Impfzentren
         """
 
-        plz_string = ",".join(self.get_all_plz_from_checked_boxes())
-        self.update_impfzentren_plz.emit(plz_string)
+        self.status_label.setText(f"Impfzentren konnten nicht geladen werden: {error}")
 
-    def get_all_plz_from_checked_boxes(self) -> List[str]:
+    def __suche_geaendert(self, text: str):
         """
-        Liste mit allen aktiven PLZ
+        Filtert die Impfzentren nach dem Suchtext
 
-        Returns:
-            list[str]: Aktive PLZ
+        Args:
+            text (str): Suchtext
         """
 
-        plzs = list()
-        checked_boxes = self.get_all_checked_boxes()
+        self.filter.setze_suchtext(text)
+        self.impfzentren_tree_view.expandAll()
 
-        for checkbox in checked_boxes:
-            plzs.append(checkbox.property("PLZ"))
+    def bestaetigt(self):
+        """
+        Die Aktiven PLZ werden in dem Hauptfenster eingetragen
+        Emit von update_impfzentren_plz
+        """
 
-        return plzs
+        plz_string = ",".join(self.modell.ausgewaehlte_plz())
+        self.update_impfzentren_plz.emit(plz_string)
 
     def __button_box_clicked(self, button: QtWidgets.QPushButton):
         """
@@ -206,31 +417,9 @@ class QtImpfzentren(QtWidgets.QDialog):
         elif clicked_button == QtWidgets.QDialogButtonBox.Cancel:
             self.close()
 
-    def get_all_checked_boxes(self) -> List[QtWidgets.QCheckBox]:
-        """
-        Gibt alle checked checkboxes zurück
-
-        Returns:
-            list[QtWidgets.QCheckBox]: Liste mit Checkboxen
-        """
-
-        all_checkboxes = self.scrollAreaWidgetContents.findChildren(QtWidgets.QCheckBox)
-        checked_boxes = list()
-
-        for checkbox in all_checkboxes:
-            if checkbox.isChecked():
-                checked_boxes.append(checkbox)
-        return checked_boxes
-
     def reset(self):
         """
-        Alle Checkboxen "uncheck"
-        Alle Checkboxen aktivieren
+        Gesamte Auswahl aufheben, dadurch sind wieder alle Gruppen wählbar
         """
 
-        all_checkboxes = self.scrollAreaWidgetContents.findChildren(QtWidgets.QCheckBox)
-
-        for checkbox in all_checkboxes:
-            checkbox.setChecked(False)
-
-        self.enable_all_checkboxes()
+        self.modell.zuruecksetzen()
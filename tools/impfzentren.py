@@ -0,0 +1,135 @@
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from tools.modell import Impfzentrum
+
+
+class Impfzentren(Mapping):
+    """
+    Unveränderliches Verzeichnis aller Impfzentren aus impfzentren.json.
+
+    Die Indizes nach URL, PLZ und Bundesland werden einmalig beim Erstellen
+    aufgebaut, sodass alle Abfragen unabhängig von der Anzahl der
+    Impfzentren konstant viel kosten.
+
+    Als Mapping verhält sich das Verzeichnis wie das frühere Ergebnis von
+    ImpfterminService.impfzentren_laden: Schlüssel sind die Backend-URLs,
+    Werte die Impfzentren der jeweiligen URL-Gruppe.
+
+    Beispiel:
+        impfzentren = Impfzentren(res.json())
+        impfzentren.in_plz("68163")
+        {
+            'Zentrumsname': 'Maimarkthalle',
+            'PLZ': '68163',
+            'Ort': 'Mannheim',
+            'Bundesland': 'Baden-Württemberg',
+            'URL': 'https://001-iz.impfterminservice.de/',
+            'Adresse': 'Xaver-Fuhr-Straße 113'
+        }
+    """
+
+    __slots__ = ("_alle", "_nach_url", "_nach_plz", "_nach_bundesland", "_zentren_nach_plz")
+
+    def __init__(self, daten: Dict[str, List[Dict]]):
+        """
+        :param daten: Deserialisierte impfzentren.json, d. h. ein Dictionary
+            mit Bundesländern als Schlüssel und Listen von Impfzentren als
+            Werte.
+        """
+
+        alle = tuple(
+            iz
+            for impfzentren in daten.values()
+            for iz in impfzentren
+        )
+
+        nach_url: Dict[str, List[Dict]] = {}
+        nach_bundesland: Dict[str, List[Dict]] = {}
+        for iz in alle:
+            nach_url.setdefault(iz["URL"], []).append(iz)
+            nach_bundesland.setdefault(iz.get("Bundesland"), []).append(iz)
+
+        # Bei doppelten PLZs gewinnt - wie bei der früheren linearen Suche -
+        # das erste Impfzentrum in URL-Reihenfolge.
+        nach_plz: Dict[str, Dict] = {}
+        for gruppe in nach_url.values():
+            for iz in gruppe:
+                plz = iz.get("PLZ")
+                if plz:
+                    nach_plz.setdefault(plz, iz)
+
+        object.__setattr__(self, "_alle", alle)
+        object.__setattr__(self, "_nach_url", {
+            url: tuple(gruppe) for url, gruppe in nach_url.items()})
+        object.__setattr__(self, "_nach_plz", nach_plz)
+        object.__setattr__(self, "_zentren_nach_plz", {
+            plz: Impfzentrum.aus_dict(iz) for plz, iz in nach_plz.items()})
+        object.__setattr__(self, "_nach_bundesland", {
+            bl: tuple(gruppe) for bl, gruppe in nach_bundesland.items()})
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Impfzentren sind unveränderlich")
+
+    def __getitem__(self, url: str) -> Tuple[Dict, ...]:
+        return self._nach_url[url]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._nach_url)
+
+    def __len__(self) -> int:
+        return len(self._nach_url)
+
+    def __repr__(self) -> str:
+        return f"Impfzentren({len(self._alle)} Impfzentren, {len(self._nach_url)} URLs)"
+
+    @property
+    def alle(self) -> Tuple[Dict, ...]:
+        """
+        :return: Alle Impfzentren in der Reihenfolge der impfzentren.json
+        """
+        return self._alle
+
+    @property
+    def bundeslaender(self) -> Tuple[str, ...]:
+        return tuple(self._nach_bundesland)
+
+    def in_plz(self, plz: str) -> Optional[Dict]:
+        """
+        :return: Impfzentrum in der gegebenen PLZ oder None
+        """
+        return self._nach_plz.get(plz)
+
+    def zentrum_in_plz(self, plz: str) -> Optional[Impfzentrum]:
+        """
+        :return: Impfzentrum in der gegebenen PLZ als tools.modell.Impfzentrum oder None
+        """
+        return self._zentren_nach_plz.get(plz)
+
+    def url_in_plz(self, plz: str) -> Optional[str]:
+        """
+        :return: Backend-URL des Impfzentrums in der gegebenen PLZ oder None
+        """
+        iz = self._nach_plz.get(plz)
+        return iz["URL"] if iz is not None else None
+
+    def in_bundesland(self, bundesland: str) -> Tuple[Dict, ...]:
+        return self._nach_bundesland.get(bundesland, ())
+
+    def gruppiert(self) -> Dict[str, Tuple[Dict, ...]]:
+        """
+        Impfzentren nach URL gruppiert, mit fortlaufend nummerierten
+        Gruppennamen. Impfzentren einer Gruppe teilen sich ihre
+        Vermittlungscodes.
+
+        Beispiel:
+            {
+                'Gruppe 1': ({'PLZ': '68163', ...}, {'PLZ': '69124', ...}),
+                'Gruppe 2': ({'PLZ': '69123', ...},)
+            }
+        """
+
+        return {
+            f"Gruppe {gruppe}": impfzentren
+            for gruppe, impfzentren in enumerate(self._nach_url.values(), start=1)
+        }
@@ -0,0 +1,125 @@
+"""
+Prüft die Importzeit der Einstiegspunkte gegen ein festes Budget.
+
+main.py und gui.py sollen das Menü bzw. das Fenster anzeigen können, ohne
+Selenium, undetected_chromedriver, cloudscraper oder den Chromium-Downloader
+zu laden. Diese Module werden erst importiert, wenn eine Terminsuche oder
+Codegenerierung tatsächlich startet. gui.py lädt das Fenster erst beim
+Start, gemessen wird daher tools.gui.hauptfenster.
+
+Aufruf:
+    python -m tools.importzeit
+    python -m tools.importzeit --main-ms 300 --gui-ms 2000 --wiederholungen 5
+
+Der Rückgabewert ist 1, falls ein Einstiegspunkt sein Budget überschreitet
+oder eines der verbotenen Module beim Import geladen wird.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+# Budgets in Millisekunden für den kumulierten Import des Einstiegspunkts
+DEFAULT_BUDGETS = {
+    "main": 250,
+    "gui": 1500,
+}
+
+# Module, die beim Import der Einstiegspunkte nicht geladen werden dürfen
+VERBOTENE_MODULE = (
+    "cloudscraper",
+    "selenium",
+    "undetected_chromedriver",
+    "tools.chromium_downloader",
+    "tools.its",
+    "tqdm",
+)
+
+
+def importzeiten(modul: str) -> Tuple[Dict[str, int], str]:
+    """
+    Importiert das Modul in einem frischen Interpreter mit -X importtime.
+
+    :param modul: Name des zu importierenden Moduls, z. B. "main"
+    :return: Tupel aus kumulierter Importzeit je Modul in µs und stderr
+    """
+
+    res = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modul}"],
+        cwd=ROOT_PATH, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True)
+    if res.returncode != 0:
+        fehler = "\n".join(
+            zeile for zeile in res.stderr.splitlines()
+            if not zeile.startswith("import time:"))
+        raise RuntimeError(f"Import von {modul} fehlgeschlagen:\n{fehler}")
+
+    zeiten = {}
+    for zeile in res.stderr.splitlines():
+        if not zeile.startswith("import time:"):
+            continue
+        teile = zeile[len("import time:"):].split("|")
+        if len(teile) != 3 or not teile[1].strip().isdigit():
+            # Kopfzeile
+            continue
+        zeiten[teile[2].strip()] = int(teile[1])
+    return zeiten, res.stderr
+
+
+def pruefen(modul: str, budget_ms: float, wiederholungen: int) -> List[str]:
+    """
+    :return: Liste der Verstöße, leer falls alles im Budget liegt
+    """
+
+    verstoesse = []
+    messungen = []
+    for _ in range(wiederholungen):
+        zeiten, _ = importzeiten(modul)
+        messungen.append(zeiten[modul] / 1000)
+
+    geladen = [m for m in VERBOTENE_MODULE if m in zeiten]
+    if geladen:
+        verstoesse.append(f"{modul}: lädt beim Import {', '.join(geladen)}")
+
+    # Das Minimum ist am wenigsten von anderen Prozessen auf der Maschine
+    # beeinflusst.
+    dauer_ms = min(messungen)
+    print(f"{modul}: {dauer_ms:.1f} ms (Budget {budget_ms:.0f} ms)")
+    if dauer_ms > budget_ms:
+        verstoesse.append(f"{modul}: {dauer_ms:.1f} ms > {budget_ms:.0f} ms")
+    return verstoesse
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m tools.importzeit",
+        description="Importzeit von main.py und gui.py gegen ein Budget prüfen")
+    parser.add_argument("--main-ms", type=float, default=DEFAULT_BUDGETS["main"],
+                        help="Budget für main.py in Millisekunden")
+    parser.add_argument("--gui-ms", type=float, default=DEFAULT_BUDGETS["gui"],
+                        help="Budget für gui.py in Millisekunden")
+    parser.add_argument("--wiederholungen", type=int, default=3,
+                        help="Anzahl Messungen je Einstiegspunkt")
+    parser.add_argument("--ohne-gui", action="store_true",
+                        help="gui.py nicht prüfen, z. B. wenn PyQt5 fehlt")
+    args = parser.parse_args()
+
+    budgets = {"main": args.main_ms}
+    if not args.ohne_gui:
+        budgets["tools.gui.hauptfenster"] = args.gui_ms
+
+    verstoesse = []
+    for modul, budget_ms in budgets.items():
+        verstoesse += pruefen(modul, budget_ms, max(1, args.wiederholungen))
+
+    for verstoss in verstoesse:
+        print(f"FEHLER: {verstoss}", file=sys.stderr)
+    sys.exit(1 if verstoesse else 0)
+
+
+if __name__ == "__main__":
+    main()
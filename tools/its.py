@@ -1,5 +1,4 @@
 # Alphabetisch sortiert:
-import copy
 import os
 import platform
 import random
@@ -7,32 +6,39 @@ import string
 import time
 
 # Alphabetisch sortiert:
-from base64 import b64encode
-from datetime import datetime, date, timedelta
-from datetime import time as dtime
-from itertools import cycle
 from json import JSONDecodeError
 from random import choice, choices, randint
-from typing import Optional, Tuple, Dict
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
 
-import cloudscraper
-import undetected_chromedriver.v2 as uc
 from requests.exceptions import RequestException
-from selenium.common.exceptions import WebDriverException
-from selenium.webdriver import ActionChains
-from selenium.webdriver.chrome.webdriver import WebDriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait
-
-from tools.chromium_downloader import webdriver_executable, \
-    check_webdriver, chromium_executable, check_chromium
+
+from tools.abbruch import Abbruch
+from tools.browserpruefung import BrowserPruefung
+from tools.checkpoint import Checkpoint
+from tools.backoff import Backoff, Fehlerart, Richtlinie, art_der_antwort, klassifizieren
+from tools.benachrichtigungen import Benachrichtiger
+from tools.cache import BASIS_URL, JsonCache, impfstoffe_url, impfzentren_url
 from tools.clog import CLogger
 from tools.exceptions import AppointmentGone, BookingError, TimeframeMissed, UnmatchingCodeError
-from tools.kontaktdaten import decode_wochentag, validate_codes, validate_kontakt, \
-    validate_zeitrahmen
-from tools.mousemover import move_mouse_to_coordinates, move_mouse_to_element
-from tools.utils import fire_notifications, unique
+from tools.impfzentren import Impfzentren
+from tools.kontaktdaten import validate_backoff, validate_codes, validate_kontakt, validate_zeitrahmen
+from tools.kontaktdaten_beobachter import KontaktdatenNachlader
+from tools.metriken import Metriken
+from tools.modell import Codepoint, Impfzentrum, Reservierung, Terminpaar, auth_headers, \
+    ist_warteraum, json_laden, terminpaare_aus_json
+from tools.pinquelle import PinQuelle
+from tools.scheduler import CodepointScheduler, Taktgeber
+from tools.slotcache import AbgelehnteTerminpaare
+from tools.uhr import Uhr
+from tools.utils import unique
+from tools.zeitrahmen import ZeitrahmenMatcher
+
+# cloudscraper, selenium, undetected_chromedriver, tools.mousemover und
+# tools.chromium_downloader werden erst importiert, wenn ein Codepfad sie
+# tatsächlich benötigt. So kostet z. B. "--configure-only" keine Importzeit
+# für Browser und Scraper.
+if TYPE_CHECKING:
+    from selenium.webdriver.chrome.webdriver import WebDriver
 
 try:
     import beepy
@@ -41,12 +47,25 @@ try:
 except ImportError:
     ENABLE_BEEPY = False
 
+# Zeit in Sekunden, in der der SMS-Code eingegeben werden muss
+SMS_PIN_SEKUNDEN = 90
+
 
 class ImpfterminService():
-    def __init__(self, codes: list, kontakt: dict, PATH: str, notifications=None):
+    def __init__(self, codes: list, kontakt: dict, PATH: str, notifications=None,
+                 basis_url: str = None, backoff: Dict = None, abbruch: Abbruch = None,
+                 uhr: Uhr = None):
         if notifications is None:
             notifications = dict()
         self.PATH = PATH
+        # Zeit und Zufall der Suche, z. B. eine VirtuelleUhr in
+        # Simulationen, siehe tools.uhr
+        self.uhr = uhr or (abbruch.uhr if abbruch is not None else Uhr())
+        # Alle Wartezeiten laufen über das Abbruch-Token, siehe tools.abbruch
+        self.abbruch = abbruch or Abbruch(self.uhr)
+        # Abweichende URL des Impfterminservice, z. B. eines lokalen
+        # Stand-in-Servers (siehe tools.its_standin)
+        self.basis_url = basis_url or os.getenv("VACCIPY_BASIS_URL") or BASIS_URL
         self.kontakt = kontakt
         self.operating_system = platform.system().lower()
 
@@ -59,36 +78,58 @@ class ImpfterminService():
         self.useragent = prepare_useragent()
 
         # Session erstellen
+        import cloudscraper
         self.s = cloudscraper.create_scraper()
         self.s.headers.update({
             'User-Agent': self.useragent,
         })
 
+        # Dauer der Phasen jeder Iteration und Antworten nach Statuscode,
+        # regelmäßig exportiert nach data/metriken
+        self.metriken = Metriken(PATH)
+        self.metriken.session_instrumentieren(self.s)
+
+        # Benachrichtigungen werden im Hintergrund verschickt, damit die
+        # Buchung nicht auf langsame Anbieter wartet
+        self.benachrichtiger = Benachrichtiger(
+            notifications, self.operating_system, log=self.log, metriken=self.metriken)
+
+        # Statische JSON-Dateien werden unter data/cache zwischengespeichert
+        self.cache = JsonCache(PATH, log=self.log)
+
+        # Wiederholungen nach Fehlern und Schutzschalter je Backend-Host,
+        # siehe tools.backoff
+        self.backoff = Backoff(Richtlinie.aus_config(backoff, zufall=self.uhr.zufall),
+                               log=self.log, metriken=self.metriken,
+                               uhr=self.uhr.monotonic, schlafen=self.abbruch.warten)
+
         # Ausgewähltes Impfzentrum prüfen
         while True:
             try:
                 self.impfzentren = self.impfzentren_laden()
+                self.backoff.erfolg(self.basis_url)
                 break
             except RuntimeError as exc:
                 self.log.error(str(exc))
-                self.log.info("Erneuter Versuch in 30 Sekunden")
-                random_sleep(30)
+                self.backoff.warten(self.basis_url, klassifizieren(exc) or Fehlerart.SERVER)
 
-        # Ein "Codepoint" ist ein dict, das einen Vermittlungscode ("code")
-        # und den Zeitpunkt ("next_use") enthält, zu dem der Code frühestens
-        # verwendet werden soll.
+        # Der Scheduler merkt sich, welcher Vermittlungscode für welche URL
+        # frühestens wann verwendet werden soll.
         # So kann man die Verwendung eines Codes z. B. für 10 Minuten
         # unterbinden.
-        # Wir ordnen zunächst alle Codepoints zu allen URLs zu.
+        # Zunächst sind alle Codes allen URLs zugeordnet.
         # Aussortiert wird später, wenn die Verwendung von Codes fehlschlägt.
-        codepoints = [
-            {"code": code, "next_use": datetime.min}
-            for code in unique(codes)
-        ]
-        self.codepoints = {
-            url: copy.deepcopy(codepoints)
-            for url in self.impfzentren
-        }
+        self.codepoints = CodepointScheduler(codes, self.impfzentren, uhr=self.uhr.monotonic)
+
+        # Impfzentren und Zeitrahmen der Terminsuche, siehe kontaktdaten_anwenden
+        self.plz_impfzentren: List[str] = []
+        self.such_urls: List[str] = []
+        self.zeitrahmen = ZeitrahmenMatcher({})
+
+        # Bereits abgelehnte Terminpaare je PLZ. Gilt nur für den Zeitrahmen,
+        # mit dem sie abgelehnt wurden.
+        self.abgelehnt = AbgelehnteTerminpaare(uhr=self.uhr.monotonic)
+        self._abgelehnt_zeitrahmen: Optional[ZeitrahmenMatcher] = None
 
         # Verfügbare Impfstoffe laden, aber nur um sie im Log auszugeben
         try:
@@ -101,14 +142,15 @@ class ImpfterminService():
     def __str__(self) -> str:
         return "ImpfterminService"
 
-    def impfzentren_laden(self):
+    def impfzentren_laden(self) -> Impfzentren:
         """
-        Lädt alle Impfzentren, gruppiert nach URL.
+        Lädt alle Impfzentren in ein Impfzentren-Verzeichnis, das sich wie ein
+        nach URL gruppiertes Dictionary verhält.
 
         Beispiel (verkürzter Output, eigentlich gibt es mehr Impfzentren):
-            self.impfzentren_laden(["68163", "69124", "69123"])
+            dict(self.impfzentren_laden())
             {
-                'https://001-iz.impfterminservice.de/': [
+                'https://001-iz.impfterminservice.de/': (
                     {
                         'Zentrumsname': 'Maimarkthalle',
                         'PLZ': '68163',
@@ -125,8 +167,8 @@ class ImpfterminService():
                         'URL': 'https://001-iz.impfterminservice.de/',
                         'Adresse': 'South Gettysburg Avenue 45'
                     }
-                ],
-                'https://002-iz.impfterminservice.de/': [
+                ),
+                'https://002-iz.impfterminservice.de/': (
                     {
                         'Zentrumsname': 'Gesellschaftshaus Pfaffengrund',
                         'PLZ': '69123',
@@ -134,43 +176,25 @@ class ImpfterminService():
                         'Bundesland': 'Baden-Württemberg',
                         'URL': 'https://002-iz.impfterminservice.de/',
                         'Adresse': 'Schwalbenweg 1/2'
-                    }
-                ]
+                    },
+                )
             }
 
-        :return: Impfzentren gruppiert nach URL; siehe obiges Beispiel
+        :return: Impfzentren-Verzeichnis; siehe obiges Beispiel
         """
 
-        location = "https://www.impfterminservice.de/assets/static/impfzentren.json"
-
         try:
             self.s.cookies.clear()
-            res = self.s.get(location, timeout=15)
-        except RequestException as exc:
+            daten = self.cache.laden(impfzentren_url(self.basis_url), self.s)
+        except RuntimeError as exc:
             raise RuntimeError(
                 f"Impfzentren können nicht geladen werden: {str(exc)}"
             ) from exc
-        if not res.ok:
-            raise RuntimeError(
-                "Impfzentren können nicht geladen werden: "
-                f"{res.status_code} {res.text}")
 
-        # Antwort-JSON in Impfzentren-Liste umwandeln
-        verfuegbare_impfzentren = [
-            iz
-            for bundesland, impfzentren in res.json().items()
-            for iz in impfzentren
-        ]
-        self.log.info(f"{len(verfuegbare_impfzentren)} Impfzentren verfügbar")
-
-        # Gefilterte Impfzentren-Liste nach URL gruppieren
-        result = {}
-        for iz in verfuegbare_impfzentren:
-            url = iz["URL"]
-            if url not in result:
-                result[url] = []
-            result[url].append(iz)
-        return result
+        # Antwort-JSON in Impfzentren-Verzeichnis umwandeln
+        impfzentren = Impfzentren(daten)
+        self.log.info(f"{len(impfzentren.alle)} Impfzentren verfügbar")
+        return impfzentren
 
     def impfstoffe_laden(self, url: str):
         """
@@ -221,19 +245,12 @@ class ImpfterminService():
         :return: Liste an Impstoff-Qualifikationen; siehe obiges Beispiel
         """
 
-        location = f"{url}assets/static/its/vaccination-list.json"
-
         try:
             self.s.cookies.clear()
-            res = self.s.get(location, timeout=15)
-        except RequestException as exc:
+            qualifikationen = self.cache.laden(impfstoffe_url(url), self.s)
+        except RuntimeError as exc:
             raise RuntimeError(
                 f"Impfstoffe können nicht geladen werden: {str(exc)}")
-        if not res.ok:
-            raise RuntimeError(
-                f"Impfstoffe können nicht geladen werden: {res.status_code} {res.text}")
-
-        qualifikationen = res.json()
 
         for qualifikation in qualifikationen:
             q_id = qualifikation.get("qualification")
@@ -250,6 +267,8 @@ class ImpfterminService():
         """
         :return: String mit Pfad zur chromedriver-Programmdatei
         """
+        from tools.chromium_downloader import check_webdriver, webdriver_executable
+
         chromedriver_from_env = os.getenv("VACCIPY_CHROMEDRIVER")
         if chromedriver_from_env:
             return chromedriver_from_env
@@ -257,6 +276,8 @@ class ImpfterminService():
             return str(webdriver_executable())
 
     def get_chrome_options(self, headless: bool):
+        import undetected_chromedriver.v2 as uc
+
         chrome_options = uc.ChromeOptions()
 
         # deaktiviere Selenium Logging
@@ -276,31 +297,68 @@ class ImpfterminService():
         # Chrome head is only required for the backup booking process.
         # User-Agent is required for headless, because otherwise the server lets us hang.
 
+        chrome_binary = self.get_chrome_binary()
+        if chrome_binary:
+            chrome_options.binary_location = chrome_binary
+
+        chrome_options.headless = headless
+
+        return chrome_options
+
+    def get_chrome_binary(self) -> Optional[str]:
+        """
+        :return: String mit Pfad zur Chrome-Programmdatei oder None, falls
+            die systemweite Installation verwendet werden soll
+        """
+        from tools.chromium_downloader import check_chromium, chromium_executable
+
         chromebin_from_env = os.getenv("VACCIPY_CHROME_BIN")
         if chromebin_from_env:
             # check for env variable with chromium binary path
-            chrome_options.binary_location = chromebin_from_env
-        elif check_chromium():
+            return chromebin_from_env
+        if check_chromium():
             # check for local installed chromium and set as binary executable
-            chrome_options.binary_location = str(chromium_executable())
+            return str(chromium_executable())
+        return None
 
-        chrome_options.headless = headless
+    def get_chromedriver(self, headless: bool) -> "WebDriver":
+        import undetected_chromedriver.v2 as uc
 
-        return chrome_options
+        try:
+            return uc.Chrome(executable_path=self.get_chromedriver_path(),
+                options=self.get_chrome_options(headless))
+        except Exception:
+            # Gespeicherte Browserprüfung ist offensichtlich nicht mehr
+            # aussagekräftig
+            BrowserPruefung(self.PATH).verwerfen()
+            raise
+
+    def browser_pruefen(self):
+        """
+        Prüft, ob Chrome und Chromedriver installiert und kompatibel sind.
+        Ein Browser wird nur gestartet, wenn sich die Programmdateien seit
+        der letzten Prüfung geändert haben.
 
-    def get_chromedriver(self, headless: bool) -> WebDriver:
-        return uc.Chrome(executable_path=self.get_chromedriver_path(),
-            options=self.get_chrome_options(headless))
+        :raise RuntimeError: Chrome und Chromedriver sind nicht kompatibel
+        """
+        BrowserPruefung(self.PATH, log=self.log).pruefen(
+            self.get_chrome_binary(), self.get_chromedriver_path(),
+            starten=lambda: self.get_chromedriver(headless=True).quit())
 
-    def driver_enter_code(self, driver: WebDriver, impfzentrum: Dict, code: str):
+    def driver_enter_code(self, driver: "WebDriver", impfzentrum: Impfzentrum, code: str):
         """
         TODO xpath code auslagern
         """
+        from selenium.webdriver import ActionChains
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import WebDriverWait
+        from tools.mousemover import move_mouse_to_coordinates, move_mouse_to_element
 
         self.log.info("Vermittlungscode eintragen und Mausbewegung / Klicks simulieren. "
                       "Dieser Vorgang kann einige Sekunden dauern.")
 
-        location = f"{impfzentrum['URL']}impftermine/service?plz={impfzentrum['PLZ']}"
+        location = f"{impfzentrum.url}impftermine/service?plz={impfzentrum.plz}"
         driver.get(location)  # Kann WebDriverException nach außen werfen.
 
         # Queue Bypass
@@ -316,7 +374,7 @@ class ImpfterminService():
             driver.add_cookie(queue_cookie)
 
             # Seite neu laden
-            random_sleep(5)
+            random_sleep(5, abbruch=self.abbruch, uhr=self.uhr)
             driver.get(location)
             driver.refresh()
 
@@ -361,7 +419,7 @@ class ImpfterminService():
             # Chars einzeln eingeben mit kleiner Pause
             for char in subcode:
                 input_field.send_keys(char)
-                random_sleep(0.5, percent_max_deviation=50)
+                random_sleep(0.5, percent_max_deviation=50, abbruch=self.abbruch, uhr=self.uhr)
 
         # Klick auf "Termin suchen"
         button_xpath = "//app-corona-vaccination-yes//button[@type=\"submit\"]"
@@ -376,16 +434,22 @@ class ImpfterminService():
         # Zweiter Klick-Versuch, falls Meldung "Es ist ein unerwarteter Fehler aufgetreten" erscheint
         answer_xpath = "//app-corona-vaccination-yes//span[@class=\"text-pre-wrap\"]"
         try:
-            random_sleep(0.5)
+            random_sleep(0.5, abbruch=self.abbruch, uhr=self.uhr)
             element = driver.find_element_by_xpath(answer_xpath)
             if element.text == "Es ist ein unerwarteter Fehler aufgetreten":
                 action.click(button).perform()
         except Exception as e:
             pass
 
-        random_sleep(1.5)
+        random_sleep(1.5, abbruch=self.abbruch, uhr=self.uhr)
+
+    def move_and_click_xpath(self, xpath: str, current_mouse_positon: Tuple[int, int], driver: "WebDriver"):
+        from selenium.webdriver import ActionChains
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import WebDriverWait
+        from tools.mousemover import move_mouse_to_element
 
-    def move_and_click_xpath(self, xpath: str, current_mouse_positon: Tuple[int, int], driver: WebDriver):
         button = WebDriverWait(driver, 1).until(EC.element_to_be_clickable((By.XPATH, xpath)))
         element = driver.find_element_by_xpath(xpath)
         current_mouse_positon = move_mouse_to_element(self.log, current_mouse_positon, element, driver)
@@ -393,7 +457,7 @@ class ImpfterminService():
         action.click(button).perform()
         return current_mouse_positon
 
-    def driver_get_cookies(self, driver: WebDriver, url: str, manual: bool):
+    def driver_get_cookies(self, driver: "WebDriver", url: str, manual: bool):
         # Erstelle zufälligen Vermittlungscode für die Cookie-Generierung
         chars = string.ascii_uppercase + string.digits
         random_chars = "".join(choices(chars, k=12))
@@ -401,12 +465,12 @@ class ImpfterminService():
 
         # Kann WebDriverException nach außen werfen:
         self.driver_enter_code(
-            driver, choice(self.impfzentren[url]), random_code)
+            driver, Impfzentrum.aus_dict(choice(self.impfzentren[url])), random_code)
         if manual:
             self.log.warn(
                 "Du hast jetzt 30 Sekunden Zeit möglichst viele Elemente im Chrome Fenster "
                 "anzuklicken. Das Fenster schließt sich automatisch.")
-            random_sleep(30)
+            random_sleep(30, abbruch=self.abbruch, uhr=self.uhr)
 
         required = ["bm_sz", "akavpau_User_allowed"]
         optional = ["bm_sv", "bm_mi", "ak_bmsc", "_abck"]
@@ -425,7 +489,11 @@ class ImpfterminService():
         self.log.info(f"Browser-Cookie generiert: *{cookies['bm_sz'][-6:]}")
         return cookies
 
-    def driver_termin_buchen(self, driver: WebDriver, reservierung: Dict):
+    def driver_termin_buchen(self, driver: "WebDriver", reservierung: Reservierung):
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import WebDriverWait
+
         timestamp = time.strftime("%Y%m%d-%H%M%S")
         filepath = os.path.join(self.PATH, "tools", "log")
         current_mouse_positon = (randint(1, driver.get_window_size()["width"]-1),
@@ -433,7 +501,7 @@ class ImpfterminService():
 
         try:
             self.driver_enter_code(
-                driver, reservierung["impfzentrum"], reservierung["code"])
+                driver, reservierung.impfzentrum, reservierung.code)
         except BaseException as exc:
             self.log.error(f"Vermittlungscode kann nicht eingegeben werden: {str(exc)}")
             pass
@@ -442,22 +510,22 @@ class ImpfterminService():
             # Klick auf "Termin suchen"
             button_xpath = "//button[@data-target=\"#itsSearchAppointmentsModal\"]"
             current_mouse_positon = self.move_and_click_xpath(button_xpath, current_mouse_positon, driver)
-        except:
+        except Exception:
             self.log.error("Termine können nicht gesucht werden")
             try:
                 driver.save_screenshot(
                     os.path.join(filepath, "errorterminsuche" + timestamp + ".png"))
-            except:
+            except Exception:
                 self.log.error("Screenshot konnte nicht gespeichert werden")
             pass
 
         # Termin auswählen
         try:
-            random_sleep(3)
+            random_sleep(3, abbruch=self.abbruch, uhr=self.uhr)
             button_xpath = '//*[@id="itsSearchAppointmentsModal"]/div/div/div[2]/div/div/form/div[1]/div[2]/label/div[2]/div'
             current_mouse_positon = self.move_and_click_xpath(button_xpath, current_mouse_positon, driver)
-            random_sleep(.5)
-        except:
+            random_sleep(.5, abbruch=self.abbruch, uhr=self.uhr)
+        except Exception:
             self.log.error("Termine können nicht ausgewählt werden")
             try:
                 with open(os.path.join(filepath, "errorterminauswahl" + timestamp + ".html"), 'w',
@@ -465,7 +533,7 @@ class ImpfterminService():
                     file.write(str(driver.page_source))
                 driver.save_screenshot(
                     os.path.join(filepath, "errorterminauswahl" + timestamp + ".png"))
-            except:
+            except Exception:
                 self.log.error("HTML und Screenshot konnten nicht gespeichert werden")
             pass
 
@@ -473,8 +541,8 @@ class ImpfterminService():
         try:
             button_xpath = '//*[@id="itsSearchAppointmentsModal"]//button[@type="submit"]'
             current_mouse_positon = self.move_and_click_xpath(button_xpath, current_mouse_positon, driver)
-            random_sleep(.5)
-        except:
+            random_sleep(.5, abbruch=self.abbruch, uhr=self.uhr)
+        except Exception:
             self.log.error("Termine können nicht ausgewählt werden (Button)")
             pass
 
@@ -482,8 +550,8 @@ class ImpfterminService():
         try:
             button_xpath = '/html/body/app-root/div/app-page-its-search/div/div/div[2]/div/div/div[5]/div/div[2]/div[2]/div[2]/button'
             current_mouse_positon = self.move_and_click_xpath(button_xpath, current_mouse_positon, driver)
-            random_sleep(.5)
-        except:
+            random_sleep(.5, abbruch=self.abbruch, uhr=self.uhr)
+        except Exception:
             self.log.error("1. Daten können nicht erfasst werden")
             pass
         try:
@@ -548,12 +616,12 @@ class ImpfterminService():
                 '//*[@id="itsSearchContactModal"]//app-booking-contact-form//input'
                 '[@formcontrolname="notificationReceiver"]')
             input_field.send_keys(self.kontakt['notificationReceiver'])
-        except:
+        except Exception:
             self.log.error("Kontaktdaten können nicht eingegeben werden")
             try:
                 driver.save_screenshot(
                     os.path.join(filepath, "errordateneingeben" + timestamp + ".png"))
-            except:
+            except Exception:
                 self.log.error("Screenshot konnte nicht gespeichert werden")
             pass
 
@@ -561,8 +629,8 @@ class ImpfterminService():
         try:
             button_xpath = '//*[@id="itsSearchContactModal"]//button[@type="submit"]'
             current_mouse_positon = self.move_and_click_xpath(button_xpath, current_mouse_positon, driver)
-            random_sleep(.7)
-        except:
+            random_sleep(.7, abbruch=self.abbruch, uhr=self.uhr)
+        except Exception:
             self.log.error("Button ÜBERNEHMEN kann nicht gedrückt werden")
             pass
 
@@ -570,10 +638,10 @@ class ImpfterminService():
         try:
             button_xpath = '/html/body/app-root/div/app-page-its-search/div/div/div[2]/div/div/div[5]/div/div[3]/div[2]/div[2]/button'
             current_mouse_positon = self.move_and_click_xpath(button_xpath, current_mouse_positon, driver)
-        except:
+        except Exception:
             self.log.error("Button Termin buchen kann nicht gedrückt werden")
             pass
-        time.sleep(3)
+        self.abbruch.warten(3)
 
         if "Ihr Termin am" not in str(driver.page_source):
             raise BookingError()
@@ -583,6 +651,7 @@ class ImpfterminService():
         Cookies der Session erneuern, wenn sie abgelaufen sind.
         :return:
         """
+        from selenium.common.exceptions import WebDriverException
 
         self.log.info("Browser-Cookies generieren")
         driver = self.get_chromedriver(headless=False)
@@ -594,7 +663,7 @@ class ImpfterminService():
         finally:
             driver.quit()
 
-    def selenium_termin_buchen(self, reservierung: Dict):
+    def selenium_termin_buchen(self, reservierung: Reservierung):
         """
         Backup Prozess:
         Wenn die Terminbuchung mit dem Bot nicht klappt, wird das
@@ -607,14 +676,10 @@ class ImpfterminService():
         try:
             self.driver_termin_buchen(driver, reservierung)
         except BookingError:
-            url = reservierung["impfzentrum"]["URL"]
-            plz_impfzentrum = reservierung["impfzentrum"]["PLZ"]
-            code = reservierung["code"]
             self.log.error("Automatisierte Terminbuchung fehlgeschlagen")
             self.log.error("Termin manuell im Fenster oder im Browser buchen.")
-            self.log.error(
-                f"Link: {url}impftermine/suche/{code}/{plz_impfzentrum}")
-            time.sleep(10 * 60)  # Sleep, um Fenster offen zu halten
+            self.log.error(f"Link: {reservierung.link}")
+            self.abbruch.warten(10 * 60)  # Warten, um Fenster offen zu halten
             raise  # Ursprüngliche Exception reraisen
         finally:
             driver.quit()
@@ -634,19 +699,25 @@ class ImpfterminService():
         :return: Deserialisierte JSON-Antwort vom Server; siehe obiges Beispiel
         """
 
-        url = self.impfzentrum_in_plz(plz_impfzentrum)["URL"]
+        url = self.impfzentrum_in_plz(plz_impfzentrum).url
         location = f"{url}rest/login?plz={plz_impfzentrum}"
 
         try:
             self.s.cookies.clear()
-            res = self.s.get(
-                location,
-                headers=get_headers(code),
-                cookies=cookies,
-                timeout=15)
+            with self.metriken.zeit("anfrage", endpunkt="login"):
+                res = self.s.get(
+                    location,
+                    headers=auth_headers(code),
+                    cookies=cookies,
+                    timeout=15)
         except RequestException as exc:
+            self.metriken.antwort(url, "login", "verbindungsfehler")
+            self.backoff.fehler(url, klassifizieren(exc))
             raise RuntimeError(f"Login mit Code fehlgeschlagen: {str(exc)}")
+        self.metriken_antwort(url, "login", res)
+        self.backoff.fehler(url, art_der_antwort(res))
         if res.status_code == 401:
+            self.backoff.erfolg(url)
             raise UnmatchingCodeError(
                 f"Login in {plz_impfzentrum} nicht erfolgreich: "
                 f"Vermittlungscode nicht gültig für diese PLZ")
@@ -654,40 +725,38 @@ class ImpfterminService():
             raise RuntimeError(
                 f"Login mit Code fehlgeschlagen: {res.status_code} {res.text}")
 
-        if "Virtueller Warteraum" in res.text:
+        inhalt = res.content
+        if ist_warteraum(inhalt):
+            self.backoff.fehler(url, Fehlerart.KEIN_JSON)
             raise RuntimeError("Login mit Code fehlgeschlagen: Warteraum")
 
         try:
-            return res.json()
+            antwort = json_laden(inhalt)
         except JSONDecodeError as exc:
+            self.backoff.fehler(url, Fehlerart.KEIN_JSON)
             raise RuntimeError(
                 "Login mit Code fehlgeschlagen: "
                 f"JSONDecodeError: {str(exc)}") from exc
+        self.backoff.erfolg(url)
+        return antwort
 
-    def reservierung_finden(self, zeitrahmen: dict, plz: str) -> Optional[Dict]:
-        url = self.impfzentrum_in_plz(plz)["URL"]
-        codepoints = self.codepoints[url]
-        if not codepoints:
+    def reservierung_finden(self, zeitrahmen: ZeitrahmenMatcher, plz: str) -> Optional[Reservierung]:
+        url = self.impfzentrum_in_plz(plz).url
+        if not self.codepoints.hat_codes(url):
             self.log.warn(f"Kein gültiger Vermittlungscode vorhanden für PLZ {plz}")
             return None
 
-        now = datetime.now()
-        usable_codepoints = [
-            cp for cp in codepoints if cp["next_use"] <= now
-        ]
-        if not usable_codepoints:
+        code = self.codepoints.naechster_code(url)
+        if code is None:
             return None
 
-        codepoint = usable_codepoints[0]
-        code = codepoint["code"]
-
         try:
             reservierung = self.reservierung_finden_mit_code(
                 zeitrahmen, plz, code)
             if reservierung is not None:
                 return reservierung
         except UnmatchingCodeError:
-            codepoints.remove(codepoint)
+            self.codepoints.entfernen(url, code)
             self.log.info(f"Überspringe Code {code[:4]}* für {plz}")
         except TimeframeMissed:
             # Es wurden Termine gefunden und alle gefundenen Termine
@@ -696,53 +765,43 @@ class ImpfterminService():
             # verwendet werden, da sonst immer wieder die gleichen Termine
             # gefunden und abgelehnt werden.
             self.log.info(f"Pausiere Code {code[:4]}* für 10 Minuten")
-            codepoint["next_use"] = now + timedelta(minutes=10)
+            self.codepoints.pausieren(url, code, 10 * 60)
         except RuntimeError as exc:
             self.log.error(str(exc))
 
         return None
 
     def reservierung_finden_mit_code(
-            self, zeitrahmen: Dict, plz: str, code: str) -> Optional[Dict]:
+            self, zeitrahmen: ZeitrahmenMatcher, plz: str, code: str) -> Optional[Reservierung]:
         """
         Es wird überprüft, ob im Impfzentrum in der gegebenen PLZ ein oder
         mehrere Terminpaare (oder Einzeltermine) verfügbar sind, die dem
         Zeitrahmen entsprechen.
         Falls ja, wird ein zufälliger davon ausgewählt und zusammen mit
-        Impfzentrum und Code zurückgegeben.
-        Zum Format der Rückgabe, siehe Beispiel.
+        Impfzentrum und Code als tools.modell.Reservierung zurückgegeben.
 
         Beispiel:
-            zeitrahmen = {
+            zeitrahmen = ZeitrahmenMatcher({
                 'einhalten_bei': '1',
                 'von_datum': '29.03.2021'
-            }
+            })
 
             self.reservierung_finden_mit_code(
                 zeitrahmen, '68163', 'XXXX-XXXX-XXXX')
-            {
-                'code': 'XXXX-XXXX-XXXX',
-                'impfzentrum': {
-                    'Zentrumsname': 'Maimarkthalle',
-                    'PLZ': '68163',
-                    'Ort': 'Mannheim',
-                    'URL': 'https://001-iz.impfterminservice.de/',
-                },
-                'terminpaar': [
-                    {
-                        'slotId': 'slot-56817da7-3f46-4f97-9868-30a6ddabcdef',
-                        'begin': 1616999901000,
-                        'bsnr': '005221080'
-                    },
-                    {
-                        'slotId': 'slot-d29f5c22-384c-4928-922a-30a6ddabcdef',
-                        'begin': 1623999901000,
-                        'bsnr': '005221080'
-                    }
-                ]
-            }
-
-        :param zeitrahmen: Zeitrahmen, dem das Terminpaar entsprechen muss
+            Reservierung(
+                codepoint=Codepoint(url='https://001-iz.impfterminservice.de/',
+                                    code='XXXX-XXXX-XXXX', headers={...}),
+                impfzentrum=Impfzentrum(plz='68163', ort='Mannheim',
+                                        zentrumsname='Maimarkthalle', ...),
+                terminpaar=Terminpaar(termine=(
+                    Termin(slot_id='slot-56817da7-3f46-4f97-9868-30a6ddabcdef',
+                           begin=1616999901000, bsnr='005221080', ...),
+                    Termin(slot_id='slot-d29f5c22-384c-4928-922a-30a6ddabcdef',
+                           begin=1623999901000, bsnr='005221080', ...)), ...)
+            )
+
+        :param zeitrahmen: Kompilierter Zeitrahmen, dem das Terminpaar
+            entsprechen muss. Ein Dictionary wird bei Bedarf kompiliert.
         :param plz: PLZ des Impfzentrums, in dem geprüft wird
         :param code: Vermittlungscode, für den eventuell gefundene Terminpaare
             reserviert werden.
@@ -752,16 +811,23 @@ class ImpfterminService():
         """
 
         impfzentrum = self.impfzentrum_in_plz(plz)
-        url = impfzentrum["URL"]
+        url = impfzentrum.url
+        codepoint = Codepoint.aus(url, code)
         location = f"{url}rest/suche/impfterminsuche?plz={plz}"
 
         try:
             self.s.cookies.clear()
-            res = self.s.get(location, headers=get_headers(code), timeout=5)
+            with self.metriken.zeit("anfrage", endpunkt="suche"):
+                res = self.s.get(location, headers=codepoint.headers, timeout=5)
         except RequestException as exc:
+            self.metriken.antwort(url, "suche", "verbindungsfehler")
+            self.backoff.fehler(url, klassifizieren(exc))
             raise RuntimeError(
                 f"Termine in {plz} können nicht geladen werden: {str(exc)}")
+        self.metriken_antwort(url, "suche", res)
+        self.backoff.fehler(url, art_der_antwort(res))
         if res.status_code == 401:
+            self.backoff.erfolg(url)
             raise UnmatchingCodeError(
                 f"Termine in {plz} können nicht geladen werden: "
                 f"Vermittlungscode nicht gültig für diese PLZ")
@@ -770,73 +836,77 @@ class ImpfterminService():
                 f"Termine in {plz} können nicht geladen werden: "
                 f"{res.status_code} {res.text}")
 
-        if 'Virtueller Warteraum des Impfterminservice' in res.text:
+        # Der Body wird nur einmal als Bytes ausgewertet
+        inhalt = res.content
+        if ist_warteraum(inhalt):
+            self.backoff.fehler(url, Fehlerart.KEIN_JSON)
             return None
 
         try:
-            terminpaare = res.json().get("termine")
+            with self.metriken.zeit("json"):
+                terminpaare = terminpaare_aus_json(json_laden(inhalt).get("termine"))
         except JSONDecodeError as exc:
+            self.backoff.fehler(url, Fehlerart.KEIN_JSON)
             raise RuntimeError(
                 f"Termine in {plz} können nicht geladen werden: "
                 f"JSONDecodeError: {str(exc)}")
+        self.backoff.erfolg(url)
         if not terminpaare:
             self.log.info(f"Keine Termine verfügbar in {plz}")
             return None
 
+        # Bereits abgelehnte Terminpaare weder erneut filtern noch melden
+        zeitrahmen = ZeitrahmenMatcher.aus(zeitrahmen)
+        if zeitrahmen is not self._abgelehnt_zeitrahmen:
+            self.abgelehnt.leeren()
+            self._abgelehnt_zeitrahmen = zeitrahmen
+        neue_terminpaare = self.abgelehnt.unbekannte(plz, terminpaare)
+        if not neue_terminpaare:
+            self.log.info(f"Keine neuen Termine in {plz}, "
+                          f"{len(terminpaare)} bereits außerhalb des Zeitrahmens gemeldet")
+            raise TimeframeMissed()
+
         if ENABLE_BEEPY:
             beepy.beep('coin')
         else:
             print("\a")
 
-        terminpaare_angenommen = [
-            tp for tp in terminpaare
-            if terminpaar_im_zeitrahmen(tp, zeitrahmen)
-        ]
-        terminpaare_abgelehnt = [
-            tp for tp in terminpaare
-            if tp not in terminpaare_angenommen
-        ]
+        with self.metriken.zeit("zeitrahmen"):
+            terminpaare_angenommen, terminpaare_abgelehnt = zeitrahmen.aufteilen(neue_terminpaare)
+        self.abgelehnt.merken(plz, terminpaare_abgelehnt)
 
-        zentrumsname = impfzentrum.get('Zentrumsname').strip()
-        ort = impfzentrum.get('Ort')
+        link = f"{url}impftermine/suche/{code}/{plz}"
 
         for tp_abgelehnt in terminpaare_abgelehnt:
             self.log.warn(
                 "Termin gefunden - jedoch nicht im entsprechenden Zeitraum:")
             self.log.info('-' * 50)
-            self.log.warn(f"'{zentrumsname}' in {plz} {ort}")
+            self.log.warn(str(impfzentrum))
             for num, termin in enumerate(tp_abgelehnt, 1):
-                ts = datetime.fromtimestamp(termin["begin"] / 1000).strftime(
-                    '%d.%m.%Y um %H:%M Uhr')
-                self.log.warn(f"{num}. Termin: {ts}")
-            self.log.warn(f"Link: {url}impftermine/suche/{code}/{plz}")
+                self.log.warn(f"{num}. Termin: {termin.text}")
+            self.log.warn(f"Link: {link}")
             self.log.info('-' * 50)
 
         if not terminpaare_angenommen:
             raise TimeframeMissed()
 
         # Auswahl des erstbesten Terminpaares
-        tp_angenommen = choice(terminpaare_angenommen)
+        tp_angenommen: Terminpaar = self.uhr.zufall.choice(terminpaare_angenommen)
         self.log.success(f"Termin gefunden!")
-        self.log.success(f"'{zentrumsname}' in {plz} {ort}")
-        msg = f"'{zentrumsname}' in {plz} {ort}\n"
+        self.log.success(str(impfzentrum))
+        msg = f"{impfzentrum}\n"
         for num, termin in enumerate(tp_angenommen, 1):
-            ts = datetime.fromtimestamp(termin["begin"] / 1000).strftime(
-                '%d.%m.%Y um %H:%M Uhr')
+            ts = termin.text
             self.log.success(f"{num}. Termin: {ts}")
             msg += f"{num}. Termin: {ts}\n"
-        self.log.success(f"Link: {url}impftermine/suche/{code}/{plz}")
-        msg += f"Link: {url}impftermine/suche/{code}/{plz}"
+        self.log.success(f"Link: {link}")
+        msg += f"Link: {link}"
         self.notify(title="Termin gefunden:", msg=msg)
 
         # Reservierungs-Objekt besteht aus Terminpaar und Impfzentrum
-        return {
-            "code": code,
-            "impfzentrum": impfzentrum,
-            "terminpaar": tp_angenommen,
-        }
+        return Reservierung(codepoint=codepoint, impfzentrum=impfzentrum, terminpaar=tp_angenommen)
 
-    def termin_buchen(self, reservierung):
+    def termin_buchen(self, reservierung: Reservierung):
         """Termin wird gebucht für die Kontaktdaten, die beim Starten des
         Programms eingetragen oder aus der JSON-Datei importiert wurden.
 
@@ -845,30 +915,33 @@ class ImpfterminService():
 
         # Daten für Impftermin sammeln
         data = {
-            "plz": reservierung["impfzentrum"]["PLZ"],
-            "slots": [termin.get("slotId") for termin in reservierung["terminpaar"]],
+            "plz": reservierung.impfzentrum.plz,
+            "slots": reservierung.terminpaar.slot_ids,
             "qualifikationen": [],
             "contact": self.kontakt
         }
 
-        url = reservierung["impfzentrum"]["URL"]
+        url = reservierung.impfzentrum.url
         location = f"{url}rest/buchung"
-        headers = get_headers(reservierung["code"])
+        headers = reservierung.codepoint.headers
 
         try:
             # get_cookies kann RuntimeError werfen
             cookies = self.get_cookies(url, manual=False)
             try:
                 self.s.cookies.clear()
-                res = self.s.post(
-                    location,
-                    json=data,
-                    headers=headers,
-                    cookies=cookies,
-                    timeout=15)
+                with self.metriken.zeit("anfrage", endpunkt="buchung"):
+                    res = self.s.post(
+                        location,
+                        json=data,
+                        headers=headers,
+                        cookies=cookies,
+                        timeout=15)
             except RequestException as exc:
+                self.metriken.antwort(url, "buchung", "verbindungsfehler")
                 raise RuntimeError(
                     f"Termin konnte nicht gebucht werden: {str(exc)}")
+            self.metriken_antwort(url, "buchung", res)
             if res.status_code == 400:
                 # Example response data with status 400:
                 # {"errors":[{"code":"BU004","text":"Slot nicht frei"}]}
@@ -896,7 +969,7 @@ class ImpfterminService():
         :return:
         """
 
-        url = self.impfzentrum_in_plz(plz_impfzentrum)["URL"]
+        url = self.impfzentrum_in_plz(plz_impfzentrum).url
         location = f"{url}rest/smspin/anforderung"
 
         data = {
@@ -927,8 +1000,7 @@ class ImpfterminService():
                     timeout=15)
             except RequestException as exc:
                 self.log.error(f"Vermittlungscode kann nicht angefragt werden: {str(exc)}")
-                self.log.info("Erneuter Versuch in 30 Sekunden")
-                random_sleep(30)
+                self.backoff.warten(url, klassifizieren(exc))
                 continue  # Neuer Versuch in nächster Iteration
 
             if res.status_code == 429:
@@ -946,33 +1018,36 @@ class ImpfterminService():
                 self.log.error(
                     "Code kann nicht angefragt werden: "
                     f"{res.status_code} {res.text}")
-                self.log.info("Erneuter Versuch in 30 Sekunden")
-                random_sleep(30)
+                self.backoff.warten(url, art_der_antwort(res) or Fehlerart.SERVER)
                 continue  # Neuer Versuch in nächster Iteration
 
             try:
                 token = res.json().get("token")
             except JSONDecodeError as exc:
                 raise RuntimeError(f"JSONDecodeError: {str(exc)}") from exc
+            self.backoff.erfolg(url)
 
             return token, cookies
 
     def selenium_code_anfordern(self, mail: str, telefonnummer: str,
-                                plz_impfzentrum: str, geburtsdatum: str) -> bool:
-        return self.undetected_selenium_code_anfordern(mail, telefonnummer, plz_impfzentrum, geburtsdatum)
+                                plz_impfzentrum: str, geburtsdatum: str,
+                                pin_quelle: PinQuelle = None) -> bool:
+        return self.undetected_selenium_code_anfordern(mail, telefonnummer, plz_impfzentrum, geburtsdatum,
+                                                       pin_quelle=pin_quelle)
 
     def undetected_selenium_code_anfordern(self, mail: str, telefonnummer: str,
-                                           plz_impfzentrum: str, geburtsdatum: str) -> bool:
+                                           plz_impfzentrum: str, geburtsdatum: str,
+                                           pin_quelle: PinQuelle = None) -> bool:
         """
         SMS-Code beim Impfterminservice via undetected Selenium anfordern.
         :param mail: Mail für Empfang des Codes
         :param telefonnummer: Telefonnummer für SMS-Code, inkl. Präfix +49
         :param plz_impfzentrum: PLZ des Impfzentrums, für das ein Code erstellt werden soll
         :param geburtsdatum: Geburtsdatum der Person
+        :param pin_quelle: Optionale Quelle für den SMS-Code zusätzlich zur Eingabe im Browser
         :return:
         """
-
-        url = self.impfzentrum_in_plz(plz_impfzentrum)["URL"]
+        url = self.impfzentrum_in_plz(plz_impfzentrum).url
 
         data = {
             "plz": plz_impfzentrum,
@@ -984,12 +1059,25 @@ class ImpfterminService():
         }
 
         driver = self.get_chromedriver(headless=False)
+        try:
+            return self.driver_code_anfordern(driver, url, data, pin_quelle)
+        finally:
+            driver.quit()
 
+    def driver_code_anfordern(self, driver: "WebDriver", url: str, data: Dict,
+                              pin_quelle: Optional[PinQuelle]) -> bool:
+        from selenium.webdriver import ActionChains
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        plz_impfzentrum = data["plz"]
         driver.get(f"{url}impftermine/service?plz={plz_impfzentrum}")
         self.log.info("Generierung eines Vermittlungscodes via Selenium gestartet.")
 
         # Queue Bypass
         while True:
+            self.abbruch.pruefen()
             queue_cookie = driver.get_cookie("akavpwr_User_allowed")
 
             if not queue_cookie \
@@ -1020,7 +1108,7 @@ class ImpfterminService():
         self.log.info("Überprüfung der Impfberechtigung übersprungen / Vorhandene Termine "
                       "simuliert und impftermine/check geladen.")
 
-        random_sleep(2)
+        random_sleep(2, abbruch=self.abbruch, uhr=self.uhr)
 
         # Anpassen der HTML elemente im Browser um Nutzer aktuellen Status anzuzeigen
         check_h1_xpath = "//app-its-check-success//h1"
@@ -1072,7 +1160,7 @@ class ImpfterminService():
         # Falls eine andere Meldung aufgetrteten ist -> Abbruch
         try:
             answer_xpath = "//app-its-check-success//span[@class=\"text-pre-wrap\"]"
-            random_sleep(0.5)
+            random_sleep(0.5, abbruch=self.abbruch, uhr=self.uhr)
             element = driver.find_element_by_xpath(answer_xpath)
         except Exception as e:
             element = None
@@ -1083,52 +1171,96 @@ class ImpfterminService():
                                       f"Anfrage abzuschicken'", check_p)
                 action.move_to_element(button).click().perform()
             elif element.text == "Anfragelimit erreicht.":
-                driver.close()
                 raise RuntimeError("Anfragelimit erreicht")
             elif element.text == "Geburtsdatum ungueltig oder in der Zukunft":
-                driver.close()
                 raise RuntimeError("Geburtsdatum ungueltig oder in der Zukunft")
 
         # Prüfen ob SMS Verifizierung geladen wurde falls nicht Abbruch
         sms_verifizierung_h1_xpath = "//app-page-its-check-result//h1"
         sms_verifizierung_h1 = driver.find_element_by_xpath(sms_verifizierung_h1_xpath)
         if sms_verifizierung_h1.text != "SMS Verifizierung":
-            driver.close()
             raise RuntimeError("Vermittlungscode kann derzeit nicht angefragt werden. "
                                "Versuchen Sie es später erneut.")
 
         # Ab jetzt befinden wir uns auf der SMS Verifizierung Seite
         success_location = f"{url}impftermine/service/{plz_impfzentrum}"
         self.log.info("SMS-Anfrage an Server versandt.")
-        self.log.info("Bitte SMS-Code innerhalb der nächsten 90 Sekunden im Browser-Fenster "
-                      "eingeben.")
+        if pin_quelle is None:
+            self.log.info(f"Bitte SMS-Code innerhalb der nächsten {SMS_PIN_SEKUNDEN} Sekunden im "
+                          "Browser-Fenster eingeben.")
+        else:
+            self.log.info(f"Bitte SMS-Code innerhalb der nächsten {SMS_PIN_SEKUNDEN} Sekunden "
+                          f"{pin_quelle.hinweis} oder im Browser-Fenster eingeben.")
 
         # 90 Sekunden lang auf Antwort vom Server warten
         # Eventuell gibt User seinen Pin falsch ein etc.
-        max_sms_code_eingabe_sekunden = 90
-        while max_sms_code_eingabe_sekunden:
+        frist = self.uhr.monotonic() + SMS_PIN_SEKUNDEN
+        while True:
+            verbleibend = frist - self.uhr.monotonic()
+            if verbleibend <= 0:
+                break
 
             # Verbleibende Zeit anzeigen
             try:
                 driver.execute_script(f"arguments[0].innerText='Vaccipy! - Bitte SMS-Code "
-                                      f"im Browser eingeben. Noch {max_sms_code_eingabe_sekunden} "
+                                      f"im Browser eingeben. Noch {int(verbleibend)} "
                                       f"Sekunden verbleibend.'", sms_verifizierung_h1)
             except Exception as e:
                 pass
 
             if driver.current_url == success_location:
                 self.log.info("Bestätigungscode erfolgreich an Server versandt. Bitte prüfen Sie Ihre E-Mails.")
-                driver.close()
                 return True
 
-            time.sleep(1)
-            max_sms_code_eingabe_sekunden -= 1
+            # Die Eingabe im Browser wird jede Sekunde geprüft, ein Code aus
+            # der PinQuelle wird sofort eingetragen
+            if pin_quelle is None:
+                self.abbruch.warten(min(1, verbleibend))
+                continue
+            sms_pin = pin_quelle.warten(min(1, verbleibend))
+            self.abbruch.pruefen()
+            if sms_pin is not None and self.selenium_sms_pin_eingeben(driver, sms_pin, success_location):
+                self.log.info("Bestätigungscode erfolgreich an Server versandt. Bitte prüfen Sie Ihre E-Mails.")
+                return True
 
-        driver.close()
-        self.log.info(f"SMS-Verifikation nicht innerhalb von 90 Sekunden abgeschlossen. "
+        self.log.info(f"SMS-Verifikation nicht innerhalb von {SMS_PIN_SEKUNDEN} Sekunden abgeschlossen. "
                       f"Versuchen Sie es später erneut.")
         return False
 
+    def selenium_sms_pin_eingeben(self, driver, sms_pin: str, success_location: str) -> bool:
+        """
+        Trägt den SMS-Code auf der Seite "SMS Verifizierung" ein und sendet ihn ab.
+
+        :param driver: Chromedriver auf der Seite "SMS Verifizierung"
+        :param sms_pin: 6-stelliger SMS-Code
+        :param success_location: URL, auf die nach erfolgreicher Verifikation weitergeleitet wird
+        :return: True falls der SMS-Code korrekt war, sonst False
+        """
+        from selenium.common.exceptions import TimeoutException, WebDriverException
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        try:
+            input_xpath = "//app-page-its-check-result//input"
+            input_field = WebDriverWait(driver, 1).until(EC.element_to_be_clickable((By.XPATH, input_xpath)))
+            input_field.clear()
+            input_field.send_keys(sms_pin)
+
+            button_xpath = "//app-page-its-check-result//button[@type=\"submit\"]"
+            button = WebDriverWait(driver, 1).until(EC.element_to_be_clickable((By.XPATH, button_xpath)))
+            button.click()
+        except WebDriverException as exc:
+            self.log.warn(f"SMS-Code konnte nicht eingetragen werden, bitte im Browser-Fenster eingeben: {exc.msg}")
+            return False
+
+        try:
+            WebDriverWait(driver, 10, poll_frequency=0.1).until(EC.url_to_be(success_location))
+        except TimeoutException:
+            self.log.error("SMS-Code ungültig, bitte erneut eingeben.")
+            return False
+        return True
+
     def code_bestaetigen(self, token: str, cookies: Dict, sms_pin: str, plz_impfzentrum: str) -> bool:
         """
         Bestätigung der Code-Generierung mittels SMS-Code
@@ -1138,7 +1270,7 @@ class ImpfterminService():
         :return: True falls SMS-Code korrekt war, sonst False
         """
 
-        url = self.impfzentrum_in_plz(plz_impfzentrum)["URL"]
+        url = self.impfzentrum_in_plz(plz_impfzentrum).url
         location = f"{url}rest/smspin/verifikation"
         data = {
             "token": token,
@@ -1162,8 +1294,7 @@ class ImpfterminService():
                     timeout=15)
             except RequestException as exc:
                 self.log.error(f"Code-Verifikation fehlgeschlagen: {str(exc)}")
-                self.log.info("Erneuter Versuch in 30 Sekunden")
-                random_sleep(30)
+                self.backoff.warten(url, klassifizieren(exc))
                 continue  # Neuer Versuch in nächster Iteration
 
             if res.status_code == 429:
@@ -1181,34 +1312,131 @@ class ImpfterminService():
                 self.log.error(
                     "Code-Verifikation fehlgeschlagen: "
                     f"{res.status_code} {res.text}")
-                self.log.info("Erneuter Versuch in 30 Sekunden")
-                random_sleep(30)
+                self.backoff.warten(url, art_der_antwort(res) or Fehlerart.SERVER)
                 continue  # Neuer Versuch in nächster Iteration
 
+            self.backoff.erfolg(url)
             self.log.success(
                 "Der Vermittlungscode wurde erfolgreich angefragt, "
                 "bitte prüfe deine Mails!")
             return True
 
-    def impfzentrum_in_plz(self, plz_impfzentrum) -> Dict:
-        for url, gruppe in self.impfzentren.items():
-            for iz in gruppe:
-                if iz["PLZ"] == plz_impfzentrum:
-                    return iz
+    def impfzentrum_in_plz(self, plz_impfzentrum) -> Impfzentrum:
+        iz = self.impfzentren.zentrum_in_plz(plz_impfzentrum)
+        if iz is not None:
+            return iz
         raise ValueError(
             f"Gewünschte PLZ {plz_impfzentrum} wurde bei Initialisierung nicht angegeben")
 
     def rotiere_codepoints(self, url):
-        codepoints = self.codepoints[url]
-        self.codepoints[url] = codepoints[1:] + codepoints[:1]
+        self.codepoints.rotieren(url)
+
+    def plz_bereit(self, plz_impfzentrum: str) -> bool:
+        """
+        :return: True, falls für die PLZ ohne Wartezeit gesucht werden kann,
+            d. h. ein Code sofort verwendbar ist oder gar keiner mehr existiert
+            (was in reservierung_finden gemeldet wird).
+        """
+        url = self.impfzentren.url_in_plz(plz_impfzentrum)
+        if not self.backoff.bereit(url):
+            return False
+        return not self.codepoints.hat_codes(url) \
+            or self.codepoints.naechster_code(url) is not None
+
+    def naechste_freigabe(self) -> Optional[float]:
+        """
+        :return: Frühester Zeitpunkt, ab dem in einem der Impfzentren wieder
+            gesucht werden kann, d. h. ein Code frei und der Backend-Host
+            nicht pausiert ist. None, falls alle Codes aussortiert wurden.
+        """
+        freigaben = []
+        for url in self.such_urls:
+            freigabe = self.codepoints.naechste_freigabe([url])
+            if freigabe is not None:
+                freigaben.append(max(freigabe, self.backoff.freigabe(url)))
+        return min(freigaben, default=None)
+
+    def kontaktdaten_anwenden(self, aenderungen: Dict[str, Any]):
+        """
+        Übernimmt geänderte Abschnitte der Kontaktdaten in die laufende
+        Terminsuche. Alle Abschnitte werden zuerst vorbereitet und erst
+        übernommen, wenn keiner einen Fehler erzeugt hat. Geladene
+        Impfzentren, Pausen der Codes und die Browserprüfung bleiben
+        erhalten.
+
+        :param aenderungen: Bereits validierte Abschnitte wie in
+            kontaktdaten.json, z. B. {"codes": [...], "zeitrahmen": {...}}
+        :raise ValueError: Eine PLZ hat kein Impfzentrum oder die Liste ist leer
+        """
+        uebernehmen = []
+
+        if "plz_impfzentren" in aenderungen:
+            plz_impfzentren = unique(list(aenderungen["plz_impfzentren"]))
+            if len(plz_impfzentren) == 0:
+                raise ValueError("Kein Impfzentrum ausgewählt")
+            neue = []
+            for plz in plz_impfzentren:
+                iz = self.impfzentren.in_plz(plz)
+                if iz is None:
+                    raise ValueError(f"Kein Impfzentrum in {plz} verfügbar")
+                if plz not in self.plz_impfzentren:
+                    neue.append((plz, iz))
+            such_urls = unique([self.impfzentren.url_in_plz(plz) for plz in plz_impfzentren])
+
+            def plz_uebernehmen():
+                self.plz_impfzentren = plz_impfzentren
+                self.such_urls = such_urls
+                for plz, iz in neue:
+                    zentrumsname = iz.get("Zentrumsname")
+                    ort = iz.get("Ort")
+                    self.log.info(f"'{zentrumsname}' in {plz} {ort} ausgewählt")
+
+            uebernehmen.append(plz_uebernehmen)
+
+        if "zeitrahmen" in aenderungen:
+            zeitrahmen = ZeitrahmenMatcher.aus(aenderungen["zeitrahmen"])
+            uebernehmen.append(lambda: setattr(self, "zeitrahmen", zeitrahmen))
+
+        if "codes" in aenderungen:
+            codes = aenderungen["codes"]
+            uebernehmen.append(lambda: self.codepoints.codes_setzen(codes))
+
+        if "kontakt" in aenderungen:
+            kontakt = aenderungen["kontakt"]
+            uebernehmen.append(lambda: setattr(self, "kontakt", kontakt))
+
+        if "notifications" in aenderungen:
+            notifications = aenderungen["notifications"]
+
+            def notifications_uebernehmen():
+                self.notifications = notifications
+                self.benachrichtiger.notifications = notifications
+
+            uebernehmen.append(notifications_uebernehmen)
+
+        for funktion in uebernehmen:
+            funktion()
 
     def notify(self, title: str, msg: str):
-        fire_notifications(self.notifications, self.operating_system, title, msg)
+        with self.metriken.zeit("benachrichtigung"):
+            self.benachrichtiger.senden(title, msg)
 
-    @staticmethod
-    def terminsuche(codes: list, plz_impfzentren: list, kontakt: dict,
+    def metriken_antwort(self, url: str, endpunkt: str, res):
+        """
+        Zählt die Antwort nach Statuscode; die HTML-Seite des virtuellen
+        Warteraums wird gesondert gezählt.
+        """
+        status = res.status_code
+        if res.ok and ist_warteraum(res.content):
+            status = "warteraum"
+        self.metriken.antwort(url, endpunkt, status, res.elapsed.total_seconds())
+
+    @classmethod
+    def terminsuche(cls, codes: list, plz_impfzentren: list, kontakt: dict,
                     PATH: str, notifications: Dict = None, zeitrahmen: Dict = None,
-                    check_delay: int = 30):
+                    check_delay: int = 30, basis_url: str = None,
+                    kontaktdaten_pfad: str = None, backoff: Dict = None,
+                    abbruch: Abbruch = None, uhr: Uhr = None):
         """
         Sucht mit mehreren Vermittlungscodes bei einer Liste von Impfzentren nach
         Terminen und bucht den erstbesten, der dem Zeitrahmen entspricht,
@@ -1228,7 +1456,23 @@ class ImpfterminService():
             gebucht werden.
             Zum Format, siehe tools.kontaktdaten.validate_zeitrahmen.
         :param check_delay: Zeit zwischen Iterationen der Terminsuche.
+            Die Periode wird unabhängig von der Dauer der Anfragen
+            eingehalten. Sind alle Codes pausiert, wird bis zur nächsten
+            Freigabe geschlafen.
+        :param basis_url: Abweichende URL des Impfterminservice.
+            Default: VACCIPY_BASIS_URL oder https://www.impfterminservice.de/
+        :param kontaktdaten_pfad: Pfad zur kontaktdaten.json. Falls angegeben,
+            werden Änderungen an Codes, Impfzentren, Kontakt,
+            Benachrichtigungen und Zeitrahmen während der Suche übernommen.
+        :param backoff: Einstellungen für Wiederholungen nach Fehlern.
+            Zum Format, siehe tools.kontaktdaten.validate_backoff.
+        :param abbruch: Abbruch-Token, mit dem die Suche aus einem anderen
+            Thread oder Signal-Handler sofort beendet werden kann
+        :param uhr: Uhr und Zufallsgenerator der Suche, z. B. eine
+            tools.uhr.VirtuelleUhr für Simulationen. Ein übergebenes abbruch
+            muss dieselbe Uhr verwenden. Default: Uhr von abbruch
         :return:
+        :raise Abgebrochen: Die Suche wurde über abbruch beendet
         """
 
         if zeitrahmen is None:
@@ -1238,133 +1482,159 @@ class ImpfterminService():
         validate_codes(codes)
         validate_kontakt(kontakt)
         validate_zeitrahmen(zeitrahmen)
+        if backoff is not None:
+            validate_backoff(backoff)
 
         if len(plz_impfzentren) == 0:
             raise ValueError("Kein Impfzentrum ausgewählt")
 
-        its = ImpfterminService(codes, kontakt, PATH, notifications)
+        its = cls(codes, kontakt, PATH, notifications, basis_url=basis_url, backoff=backoff,
+                  abbruch=abbruch, uhr=uhr)
 
         # Prüfen, ob in allen angegebenen PLZs ein Impfzentrum verfügbar ist
-        izs_by_plz = {
-            iz["PLZ"]: iz
-            for gruppe in its.impfzentren.values()
-            for iz in gruppe
-        }
-        for plz in plz_impfzentren:
-            iz = izs_by_plz.get(plz)
-            if iz is None:
-                raise ValueError(f"Kein Impfzentrum in {plz} verfügbar")
-            zentrumsname = iz.get("Zentrumsname")
-            ort = iz.get("Ort")
-            its.log.info(f"'{zentrumsname}' in {plz} {ort} ausgewählt")
-
-        # Einmal Chrome starten, um früh einen Fehler zu erzeugen, falls die
-        # erforderliche Software nicht installiert ist.
+        its.kontaktdaten_anwenden({"plz_impfzentren": plz_impfzentren, "zeitrahmen": zeitrahmen})
+
+        # Früh einen Fehler erzeugen, falls die erforderliche Software nicht
+        # installiert ist.
         its.log.info("Prüfen von Chromium und Chromedriver")
-        its.get_chromedriver(headless=True).quit()
-
-        for plz_impfzentrum in cycle(plz_impfzentren):
-            its.log.set_prefix(" ".join([
-                plz for plz in plz_impfzentren
-                if its.codepoints[izs_by_plz[plz]["URL"]]
-            ]))
-            url = its.impfzentrum_in_plz(plz_impfzentrum)["URL"]
-            reservierung = its.reservierung_finden(zeitrahmen, plz_impfzentrum)
-            if reservierung is not None:
-                try:
-                    its.termin_buchen(reservierung)
-                    msg = "Termin erfolgreich gebucht!"
-                    its.log.success(msg)
-                    its.log.info(
-                        "[SPENDE] Unterstütze hier unsere Spendenkampagne für 'Ärzte ohne "
-                        "Grenzen': https://www.aerzte-ohne-grenzen.de/spenden-sammeln?cfd=pjs3m")
-                    its.notify(title="Terminbuchung:", msg=msg)
-                    # Programm beenden, wenn Termin gefunden wurde
-                    return
-                except AppointmentGone:
-                    msg = f"Termin ist nicht mehr verfügbar"
-                    its.log.error(msg)
-                    its.notify(title="Terminbuchung:", msg=msg)
-                    # Der verwendete Code soll frühestens in 10 Minuten erneut
-                    # verwendet werden, da sonst immer wieder der gleiche
-                    # Termin zu buchen versucht wird.
-                    code = reservierung["code"]
-                    its.log.info(f"Pausiere Code {code[:4]}* für 10 Minuten")
-                    now = datetime.now()
-                    for codepoint in its.codepoints[url]:
-                        if codepoint["code"] == code:
-                            codepoint["next_use"] = now + timedelta(minutes=10)
-                except BookingError:
-                    msg = f"Termin konnte nicht gebucht werden."
-                    its.log.error(msg)
-                    its.notify(title="Terminbuchung:", msg=msg)
-
-            # Rotiere Codes, um in nächster Iteration andere Codes zu
-            # verwenden.
-            its.rotiere_codepoints(url)
-
-            random_sleep(check_delay)
+        its.browser_pruefen()
+
+        suchdaten = {
+            "codes": codes, "plz_impfzentren": plz_impfzentren, "kontakt": kontakt,
+            "notifications": notifications, "zeitrahmen": zeitrahmen}
+
+        nachlader = None
+        if kontaktdaten_pfad is not None:
+            nachlader = KontaktdatenNachlader(kontaktdaten_pfad, suchdaten, log=its.log)
+
+        # Aussortierte und pausierte Codes sowie gestörte Backends einer
+        # vorherigen Suche mit denselben Kontaktdaten übernehmen
+        checkpoint = Checkpoint(PATH, suchdaten, log=its.log,
+                                uhr=its.uhr.monotonic, systemzeit=its.uhr.zeit)
+        checkpoint.laden(its)
+
+        takt = Taktgeber(check_delay, uhr=its.uhr.monotonic, schlafen=its.abbruch.warten,
+                         zufall=its.uhr.zufall)
+        index = 0
+        try:
+            while True:
+                its.abbruch.pruefen()
+                if nachlader is not None and nachlader.nachladen(its.kontaktdaten_anwenden):
+                    checkpoint.schluessel_aendern(nachlader.stand)
+                plz_impfzentren = its.plz_impfzentren
+
+                # Nächste PLZ im Kreis suchen, für die ein Code verwendbar ist
+                plz_impfzentrum = None
+                for i in range(len(plz_impfzentren)):
+                    plz = plz_impfzentren[(index + i) % len(plz_impfzentren)]
+                    if its.plz_bereit(plz):
+                        plz_impfzentrum = plz
+                        index = (index + i + 1) % len(plz_impfzentren)
+                        break
+                if plz_impfzentrum is None:
+                    # Alle Codes oder Backends pausiert: Bis zur nächsten Freigabe schlafen
+                    with its.metriken.zeit("schlafen"):
+                        takt.warten(fruehestens=its.naechste_freigabe())
+                    continue
+
+                its.log.set_prefix(" ".join([
+                    plz for plz in plz_impfzentren
+                    if its.codepoints.hat_codes(its.impfzentren.url_in_plz(plz))
+                ]))
+                url = its.impfzentrum_in_plz(plz_impfzentrum).url
+                reservierung = its.reservierung_finden(its.zeitrahmen, plz_impfzentrum)
+                if reservierung is not None:
+                    try:
+                        with its.metriken.zeit("buchung"):
+                            its.termin_buchen(reservierung)
+                        msg = "Termin erfolgreich gebucht!"
+                        its.log.success(msg)
+                        its.log.info(
+                            "[SPENDE] Unterstütze hier unsere Spendenkampagne für 'Ärzte ohne "
+                            "Grenzen': https://www.aerzte-ohne-grenzen.de/spenden-sammeln?cfd=pjs3m")
+                        its.notify(title="Terminbuchung:", msg=msg)
+                        checkpoint.loeschen()
+                        # Programm beenden, wenn Termin gefunden wurde
+                        return
+                    except AppointmentGone:
+                        msg = f"Termin ist nicht mehr verfügbar"
+                        its.log.error(msg)
+                        its.notify(title="Terminbuchung:", msg=msg)
+                        # Der verwendete Code soll frühestens in 10 Minuten erneut
+                        # verwendet werden, da sonst immer wieder der gleiche
+                        # Termin zu buchen versucht wird.
+                        code = reservierung.code
+                        its.log.info(f"Pausiere Code {code[:4]}* für 10 Minuten")
+                        its.codepoints.pausieren(url, code, 10 * 60)
+                    except BookingError:
+                        msg = f"Termin konnte nicht gebucht werden."
+                        its.log.error(msg)
+                        its.notify(title="Terminbuchung:", msg=msg)
+
+                # Rotiere Codes, um in nächster Iteration andere Codes zu
+                # verwenden.
+                its.rotiere_codepoints(url)
+
+                checkpoint.speichern(its)
+                its.metriken.vielleicht_exportieren()
+                takt.weiter()
+                with its.metriken.zeit("schlafen"):
+                    takt.warten()
+        finally:
+            if nachlader is not None:
+                nachlader.schliessen()
+            checkpoint.speichern(its)
+            # Ausstehende Benachrichtigungen, z. B. über die erfolgreiche
+            # Buchung, noch zustellen. Nach einem Abbruch nur kurz warten.
+            its.benachrichtiger.schliessen(timeout=1 if its.abbruch.abgebrochen else 60)
+            its.metriken.schliessen()
 
 
 def terminpaar_im_zeitrahmen(terminpaar, zeitrahmen) -> bool:
     """
-    Checken ob Terminpaar im angegebenen Zeitrahmen liegt
+    Checken ob Terminpaar im angegebenen Zeitrahmen liegt.
+    Für mehrere Terminpaare ist ZeitrahmenMatcher.aufteilen deutlich
+    effizienter.
 
-    :param terminpaar: Terminpaar wie in ImpfterminService.termin_suchen
-    :param zeitrahmen: Zeitrahmen-Dictionary wie in ImpfterminService.termin_suchen
+    :param terminpaar: Terminpaar wie in ImpfterminService.reservierung_finden_mit_code
+    :param zeitrahmen: Zeitrahmen-Dictionary wie in ImpfterminService.reservierung_finden_mit_code
     :return: True oder False
     """
-    if not zeitrahmen:  # Teste auf leeres dict
-        return True
-
-    assert zeitrahmen["einhalten_bei"] in ["1", "2", "beide"]
-
-    von_datum = datetime.strptime(
-        zeitrahmen["von_datum"],
-        "%d.%m.%Y").date() if "von_datum" in zeitrahmen else date.min
-    bis_datum = datetime.strptime(
-        zeitrahmen["bis_datum"],
-        "%d.%m.%Y").date() if "bis_datum" in zeitrahmen else date.max
-    von_uhrzeit = datetime.strptime(
-        zeitrahmen["von_uhrzeit"],
-        "%H:%M").time() if "von_uhrzeit" in zeitrahmen else dtime.min
-    bis_uhrzeit = (
-            datetime.strptime(zeitrahmen["bis_uhrzeit"], "%H:%M")
-            + timedelta(seconds=59)
-    ).time() if "bis_uhrzeit" in zeitrahmen else dtime.max
-    wochentage = [decode_wochentag(wt) for wt in set(
-        zeitrahmen["wochentage"])] if "wochentage" in zeitrahmen else range(7)
-
-    # Einzelne Termine durchgehen
-    for num, termin in enumerate(terminpaar, 1):
-        if zeitrahmen["einhalten_bei"] in ["beide", str(num)]:
-            termin_zeit = datetime.fromtimestamp(int(termin["begin"]) / 1000)
-
-            if not (von_datum <= termin_zeit.date() <= bis_datum):
-                return False
+    return ZeitrahmenMatcher.aus(zeitrahmen).passt(terminpaar)
 
-            if not (von_uhrzeit <= termin_zeit.time() <= bis_uhrzeit):
-                return False
-
-            if not termin_zeit.weekday() in wochentage:
-                return False
-    return True
 
+def random_sleep(avg_sleeptime: float, percent_max_deviation: Optional[int] = None,
+                 abbruch: Abbruch = None, uhr: Uhr = None):
+    """
+    Schläft zufällig um bis zu percent_max_deviation Prozent länger oder
+    kürzer als avg_sleeptime.
 
-def random_sleep(avg_sleeptime: float, percent_max_deviation: Optional[int] = None):
+    :param abbruch: Optionales Abbruch-Token, das die Wartezeit beendet
+    :param uhr: Optionale Uhr für Zufall und Wartezeit. Mit abbruch wird
+        auf dessen Uhr gewartet.
+    :raise Abgebrochen: Abbruch wurde ausgelöst
+    """
     if percent_max_deviation is None:
         percent_max_deviation = 10
-    percent_deviation = random.randrange(-percent_max_deviation, percent_max_deviation)
+    zufall = uhr.zufall if uhr is not None else random
+    percent_deviation = zufall.randrange(-percent_max_deviation, percent_max_deviation)
     random_sleeptime = avg_sleeptime * (1.0 + (percent_deviation / 100.0))
     min_sleeptime = 0 if avg_sleeptime <= 0.1 else 0.1
     sleeptime = max(min_sleeptime, random_sleeptime)
-    time.sleep(sleeptime)
+    if abbruch is not None:
+        abbruch.warten(sleeptime)
+    elif uhr is not None:
+        uhr.schlafen(sleeptime)
+    else:
+        time.sleep(sleeptime)
 
 
 def get_headers(code: str):
-    b = bytes(f':{code}', encoding='utf-8')
-    bearer = f"Basic {b64encode(b).decode('utf-8')}"
-    return {"Authorization": bearer}
+    """
+    :return: Authorization-Header für den Vermittlungscode, je Code nur
+        einmal erstellt; siehe tools.modell.auth_headers
+    """
+    return auth_headers(code)
 
 
 def extrahiere_impfstoffe(qualifikation: dict):
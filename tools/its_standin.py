@@ -0,0 +1,440 @@
+"""
+Lokaler Stand-in für den Impfterminservice.
+
+Emuliert die von ImpfterminService verwendeten Endpunkte, sodass Terminsuche
+und Buchung ohne den echten Server ausgeführt werden können - z. B. in
+tools.benchmark oder in der CI.
+
+Beispiel:
+    with StandinServer(plz=["68163"], latenz=0.05) as server:
+        server.termine_anbieten("68163", nach_sekunden=2)
+        server.antworten_einplanen("rest/suche/impfterminsuche", 502, anzahl=3)
+        ImpfterminService.terminsuche(..., basis_url=server.url)
+        server.buchungen[0]["latenz"]
+
+Aufruf als eigenständiger Server:
+    python -m tools.its_standin --port 8000 --plz 68163 --termin-nach 30
+    VACCIPY_BASIS_URL=http://127.0.0.1:8000/ python main.py search
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from base64 import b64decode
+from collections import Counter, deque
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+WARTERAUM_HTML = (
+    "<!DOCTYPE html><html><head><title>Virtueller Warteraum</title></head>"
+    "<body><h1>Virtueller Warteraum des Impfterminservice</h1>"
+    "<p>Sie befinden sich in der Warteschlange.</p></body></html>"
+)
+
+IMPFSTOFFE = [
+    {
+        "qualification": "L920",
+        "name": "Comirnaty (BioNTech)",
+        "short": "BioNTech",
+        "tssname": "BioNTech",
+        "interval": 40,
+        "age": "16+",
+        "tssage": "16-17"
+    },
+    {
+        "qualification": "L921",
+        "name": "mRNA-1273 (Moderna)",
+        "short": "Moderna",
+        "tssname": "Moderna, BioNTech",
+        "interval": 40,
+        "age": "18+",
+        "tssage": "18-59"
+    },
+]
+
+# Endpunkte relativ zur Basis-URL
+IMPFZENTREN = "assets/static/impfzentren.json"
+IMPFSTOFFE_LISTE = "assets/static/its/vaccination-list.json"
+LOGIN = "rest/login"
+SUCHE = "rest/suche/impfterminsuche"
+BUCHUNG = "rest/buchung"
+SMSPIN_ANFORDERUNG = "rest/smspin/anforderung"
+SMSPIN_VERIFIKATION = "rest/smspin/verifikation"
+
+
+class _Angebot:
+    """
+    Ein geplantes Terminpaar und wann es sichtbar wird.
+    """
+
+    __slots__ = ("plz", "terminpaar", "sichtbar_ab", "nach_anfragen", "dauer", "gebucht")
+
+    def __init__(self, plz: str, terminpaar: List[Dict],
+                 sichtbar_ab: Optional[float], nach_anfragen: Optional[int],
+                 dauer: Optional[float] = None):
+        self.plz = plz
+        self.terminpaar = terminpaar
+        self.sichtbar_ab = sichtbar_ab
+        self.nach_anfragen = nach_anfragen
+        self.dauer = dauer
+        self.gebucht = False
+
+    def sichtbar(self, jetzt: float) -> bool:
+        if self.gebucht or self.sichtbar_ab is None or self.sichtbar_ab > jetzt:
+            return False
+        return self.dauer is None or jetzt < self.sichtbar_ab + self.dauer
+
+    @property
+    def slot_ids(self):
+        return {termin["slotId"] for termin in self.terminpaar}
+
+
+class StandinServer:
+    """
+    HTTP-Server, der die Endpunkte des Impfterminservice nachbildet.
+
+    Alle Impfzentren liegen unter derselben Backend-URL, nämlich der des
+    Servers. Das Verhalten wird zur Laufzeit gesteuert:
+
+    - termine_anbieten: Terminpaare erscheinen nach einer Zeit oder nach
+      einer Anzahl Suchanfragen und verschwinden, sobald sie gebucht wurden.
+    - antworten_einplanen: Die nächsten Anfragen an einen Endpunkt werden
+      mit einem Statuscode (z. B. 401, 400, 429, 5xx) oder der HTML-Seite
+      des virtuellen Warteraums beantwortet.
+    - latenz / jitter: Verzögerung jeder Antwort in Sekunden.
+
+    Alle Zeitpunkte beziehen sich auf die übergebene Uhr (Default:
+    time.monotonic), gewartet wird mit schlafen. Mit tools.uhr.VirtuelleUhr
+    wird so ein ganzer Tag Terminangebot in Sekunden abgespielt. Gebuchte Termine landen samt Latenz zwischen
+    Erscheinen und Buchung in buchungen.
+    """
+
+    def __init__(self, plz: Iterable[str] = ("68163",), codes: Optional[Iterable[str]] = None,
+                 latenz: float = 0.0, jitter: float = 0.0, host: str = "127.0.0.1",
+                 port: int = 0, uhr: Callable[[], float] = time.monotonic,
+                 schlafen: Callable[[float], None] = time.sleep,
+                 zufall: random.Random = None):
+        """
+        :param plz: PLZs der emulierten Impfzentren
+        :param codes: Gültige Vermittlungscodes. Default: alle Codes gültig
+        :param latenz: Verzögerung jeder Antwort in Sekunden
+        :param jitter: Zusätzliche, gleichverteilte Verzögerung bis zu
+            dieser Dauer in Sekunden
+        :param port: Port des Servers. Default: beliebiger freier Port
+        :param uhr: Uhr für Sichtbarkeit und Latenz der Termine
+        :param schlafen: Funktion zum Warten für latenz und jitter
+        :param zufall: Zufallsgenerator für jitter, Default: random
+        """
+
+        self.plz = list(plz)
+        self.codes = None if codes is None else set(codes)
+        self.latenz = latenz
+        self.jitter = jitter
+        self.uhr = uhr
+        self.schlafen = schlafen
+        self.zufall = zufall or random
+
+        self.anfragen = Counter()
+        self.buchungen: List[Dict] = []
+        self.sms_anforderungen: List[Dict] = []
+
+        self._lock = threading.Lock()
+        self._angebote: List[_Angebot] = []
+        self._suchanfragen = Counter()
+        self._geplant: Dict[str, deque] = {}
+
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.standin = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self) -> "StandinServer":
+        self._thread = threading.Thread(
+            target=self._httpd.serve_forever, name="its-standin", daemon=True)
+        self._thread.start()
+        return self
+
+    def laufen(self):
+        """
+        Beantwortet Anfragen im aktuellen Thread, bis der Prozess beendet wird.
+        """
+        try:
+            self._httpd.serve_forever()
+        finally:
+            self._httpd.server_close()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "StandinServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def termine_anbieten(self, plz: str, terminpaar: Optional[List[Dict]] = None,
+                         nach_sekunden: float = 0.0,
+                         nach_anfragen: Optional[int] = None,
+                         dauer: Optional[float] = None) -> List[Dict]:
+        """
+        Plant ein Terminpaar ein.
+
+        :param plz: PLZ des Impfzentrums
+        :param terminpaar: Liste von Terminen mit "slotId", "begin" und
+            "bsnr". Default: zwei Termine in 7 und 49 Tagen um 10 Uhr
+        :param nach_sekunden: Terminpaar wird nach dieser Zeit sichtbar
+        :param nach_anfragen: Terminpaar wird sichtbar, sobald so viele
+            Suchanfragen für die PLZ beantwortet wurden. Hat Vorrang vor
+            nach_sekunden.
+        :param dauer: Terminpaar verschwindet so viele Sekunden nach dem
+            Erscheinen wieder. Default: erst mit der Buchung
+        :return: Das eingeplante Terminpaar
+        """
+
+        if terminpaar is None:
+            terminpaar = self.terminpaar_erzeugen()
+        sichtbar_ab = None if nach_anfragen is not None else self.uhr() + nach_sekunden
+        with self._lock:
+            self._angebote.append(_Angebot(plz, terminpaar, sichtbar_ab, nach_anfragen, dauer))
+        return terminpaar
+
+    @staticmethod
+    def terminpaar_erzeugen(tage: Iterable[int] = (7, 49), heute: Optional[datetime] = None,
+                            zufall: random.Random = None) -> List[Dict]:
+        """
+        :param tage: Abstand der Termine zu heute in Tagen
+        :param heute: Default: datetime.now()
+        :param zufall: Zufallsgenerator für reproduzierbare slotIds.
+            Default: uuid4
+        :return: Terminpaar mit je einem Termin um 10 Uhr in so vielen Tagen
+        """
+        heute = (heute or datetime.now()).replace(hour=10, minute=0, second=0, microsecond=0)
+        return [
+            {
+                "slotId": f"slot-{uuid.UUID(int=zufall.getrandbits(128)) if zufall else uuid.uuid4()}",
+                "begin": int((heute + timedelta(days=tag)).timestamp() * 1000),
+                "bsnr": "005221080"
+            }
+            for tag in tage
+        ]
+
+    def antworten_einplanen(self, pfad: str, status: int = 200, anzahl: int = 1,
+                            text: Optional[str] = None, warteraum: bool = False):
+        """
+        Beantwortet die nächsten Anfragen an einen Endpunkt abweichend.
+
+        :param pfad: Endpunkt relativ zur Basis-URL, z. B. "rest/buchung"
+        :param status: HTTP-Statuscode der Antworten
+        :param anzahl: Anzahl der betroffenen Anfragen
+        :param text: Body der Antworten. Default: Fehler-JSON
+        :param warteraum: Mit der HTML-Seite des virtuellen Warteraums
+            antworten (Status 200)
+        """
+
+        if warteraum:
+            status, text, typ = 200, WARTERAUM_HTML, "text/html; charset=utf-8"
+        else:
+            if text is None:
+                text = json.dumps({"errors": [{"code": "STANDIN", "text": f"Status {status}"}]})
+            typ = "application/json"
+        with self._lock:
+            self._geplant.setdefault(pfad, deque()).extend([(status, text, typ)] * anzahl)
+
+    def _geplante_antwort(self, pfad: str):
+        with self._lock:
+            geplant = self._geplant.get(pfad)
+            if geplant:
+                return geplant.popleft()
+        return None
+
+    def _code_gueltig(self, authorization: Optional[str]) -> bool:
+        if self.codes is None:
+            return True
+        try:
+            code = b64decode(authorization.split(" ", 1)[1]).decode("utf-8").lstrip(":")
+        except (AttributeError, IndexError, ValueError):
+            return False
+        return code in self.codes
+
+    def _impfzentren(self) -> Dict:
+        return {
+            "Stand-in": [
+                {
+                    "Zentrumsname": f"Stand-in {plz}",
+                    "PLZ": plz,
+                    "Ort": "Localhost",
+                    "Bundesland": "Stand-in",
+                    "URL": self.url,
+                    "Adresse": "Loopback 1"
+                }
+                for plz in self.plz
+            ]
+        }
+
+    def _suche(self, plz: str) -> Dict:
+        with self._lock:
+            jetzt = self.uhr()
+            termine = [
+                angebot.terminpaar for angebot in self._angebote
+                if angebot.plz == plz and angebot.sichtbar(jetzt)
+            ]
+            # Nach Anfragen geplante Termine erscheinen erst nach dieser
+            # Antwort
+            self._suchanfragen[plz] += 1
+            for angebot in self._angebote:
+                if angebot.plz == plz and angebot.sichtbar_ab is None \
+                        and self._suchanfragen[plz] >= angebot.nach_anfragen:
+                    angebot.sichtbar_ab = jetzt
+        return {"termine": termine, "termineTSS": [], "praxen": {}}
+
+    def _buchen(self, daten: Dict) -> bool:
+        slots = set(daten.get("slots", []))
+        with self._lock:
+            jetzt = self.uhr()
+            for angebot in self._angebote:
+                if angebot.plz == daten.get("plz") and angebot.slot_ids == slots \
+                        and angebot.sichtbar(jetzt):
+                    angebot.gebucht = True
+                    self.buchungen.append({
+                        "plz": angebot.plz,
+                        "slots": sorted(slots),
+                        "sichtbar_ab": angebot.sichtbar_ab,
+                        "gebucht": jetzt,
+                        "latenz": jetzt - angebot.sichtbar_ab,
+                        "kontakt": daten.get("contact"),
+                    })
+                    return True
+        return False
+
+    def antworten(self, methode: str, pfad: str, query: Dict, headers, body: bytes):
+        """
+        :return: Tupel aus Statuscode, Content-Type und Body der Antwort
+        """
+
+        self.anfragen[pfad] += 1
+        geplant = self._geplante_antwort(pfad)
+        if geplant is not None:
+            status, text, typ = geplant
+            return status, typ, text
+
+        if methode == "GET" and pfad == IMPFZENTREN:
+            return 200, "application/json", json.dumps(self._impfzentren())
+        if methode == "GET" and pfad == IMPFSTOFFE_LISTE:
+            return 200, "application/json", json.dumps(IMPFSTOFFE)
+
+        if methode == "GET" and pfad in (LOGIN, SUCHE):
+            plz = query.get("plz", [""])[0]
+            if plz not in self.plz:
+                return 404, "application/json", "{}"
+            if not self._code_gueltig(headers.get("Authorization")):
+                return 401, "application/json", "{}"
+            if pfad == LOGIN:
+                return 200, "application/json", json.dumps(
+                    {"kv": "52", "qualifikationen": ["L921"], "verknuepft": True})
+            return 200, "application/json", json.dumps(self._suche(plz))
+
+        if methode == "POST" and pfad == BUCHUNG:
+            try:
+                daten = json.loads(body or b"{}")
+            except ValueError:
+                return 400, "application/json", "{}"
+            if not self._code_gueltig(headers.get("Authorization")):
+                return 401, "application/json", "{}"
+            if self._buchen(daten):
+                return 201, "application/json", "{}"
+            return 400, "application/json", json.dumps(
+                {"errors": [{"code": "BU004", "text": "Slot nicht frei"}]})
+
+        if methode == "POST" and pfad == SMSPIN_ANFORDERUNG:
+            try:
+                daten = json.loads(body or b"{}")
+            except ValueError:
+                return 400, "application/json", "{}"
+            token = str(uuid.uuid4())
+            with self._lock:
+                self.sms_anforderungen.append({"token": token, **daten})
+            return 200, "application/json", json.dumps({"token": token})
+        if methode == "POST" and pfad == SMSPIN_VERIFIKATION:
+            return 200, "application/json", "{}"
+
+        return 404, "text/plain", "Not Found"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Header und Body werden getrennt geschrieben. Ohne TCP_NODELAY verzögern
+    # Nagle-Algorithmus und Delayed ACK jede Antwort um ca. 40 ms.
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self._antworten("GET")
+
+    def do_POST(self):
+        self._antworten("POST")
+
+    def _antworten(self, methode: str):
+        standin: StandinServer = self.server.standin
+        teile = urlparse(self.path)
+        laenge = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(laenge) if laenge else b""
+
+        verzoegerung = standin.latenz + standin.zufall.uniform(0, standin.jitter)
+        if verzoegerung > 0:
+            standin.schlafen(verzoegerung)
+
+        status, typ, text = standin.antworten(
+            methode, teile.path.lstrip("/"), parse_qs(teile.query), self.headers, body)
+        daten = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", typ)
+        self.send_header("Content-Length", str(len(daten)))
+        self.end_headers()
+        self.wfile.write(daten)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m tools.its_standin",
+        description="Lokalen Stand-in für den Impfterminservice starten")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--plz", nargs="+", default=["68163"],
+                        help="PLZs der emulierten Impfzentren")
+    parser.add_argument("--codes", nargs="+", default=None,
+                        help="Gültige Vermittlungscodes. Default: alle")
+    parser.add_argument("--latenz", type=float, default=0.0,
+                        help="Verzögerung jeder Antwort in Sekunden")
+    parser.add_argument("--termin-nach", type=float, default=None,
+                        help="In allen PLZs nach so vielen Sekunden ein Terminpaar anbieten")
+    args = parser.parse_args()
+
+    server = StandinServer(plz=args.plz, codes=args.codes, latenz=args.latenz,
+                           host=args.host, port=args.port)
+    if args.termin_nach is not None:
+        for plz in args.plz:
+            server.termine_anbieten(plz, nach_sekunden=args.termin_nach)
+    print(f"Stand-in läuft unter {server.url}")
+    try:
+        server.laufen()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -28,23 +28,35 @@ def get_kontaktdaten(filepath: str):
     """
 
     try:
-        with open(filepath, encoding='utf-8') as f:
-            try:
-                kontaktdaten = json.load(f)
-
-                # Backwards Compatibility: "code"
-                if "code" in kontaktdaten:
-                    code = kontaktdaten.pop("code")
-                    if "codes" not in kontaktdaten:
-                        kontaktdaten["codes"] = []
-                    kontaktdaten["codes"].append(code)
-
-                validate_kontaktdaten(kontaktdaten)
-                return kontaktdaten
-            except json.JSONDecodeError:
-                return {}
-    except FileNotFoundError:
+        kontaktdaten = read_kontaktdaten(filepath)
+    except (FileNotFoundError, json.JSONDecodeError):
         return {}
+    validate_kontaktdaten(kontaktdaten)
+    return kontaktdaten
+
+
+def read_kontaktdaten(filepath: str):
+    """
+    Lade Kontaktdaten aus Datei, ohne sie zu validieren.
+
+    :param filepath: Pfad zur JSON-Datei mit Kontaktdaten.
+    :return: Dictionary mit Kontaktdaten
+
+    :raise FileNotFoundError: Datei existiert nicht
+    :raise json.JSONDecodeError: Datei enthält kein gültiges JSON
+    """
+
+    with open(filepath, encoding='utf-8') as f:
+        kontaktdaten = json.load(f)
+
+    # Backwards Compatibility: "code"
+    if isinstance(kontaktdaten, dict) and "code" in kontaktdaten:
+        code = kontaktdaten.pop("code")
+        if "codes" not in kontaktdaten:
+            kontaktdaten["codes"] = []
+        kontaktdaten["codes"].append(code)
+
+    return kontaktdaten
 
 
 def check_kontaktdaten(kontaktdaten: dict, mode: Modus):
@@ -100,24 +112,36 @@ def validate_kontaktdaten(kontaktdaten: dict):
         raise ValidationError("Muss ein Dictionary sein")
 
     for key, value in kontaktdaten.items():
-        try:
-            if key == "codes":
-                validate_codes(value)
-            elif key == "plz_impfzentren":
-                validate_plz_impfzentren(value)
-            elif key == "kontakt":
-                validate_kontakt(value)
-            elif key == "notifications":
-                validate_notifications(value)
-            elif key == "zeitrahmen":
-                validate_zeitrahmen(value)
-            elif key == "notifications":
-                validate_notifications(value)
-            else:
-                raise ValidationError(f"Nicht unterstützter Key")
-        except ValidationError as exc:
-            raise ValidationError(
-                f"Ungültiger Key {json.dumps(key)}:\n{str(exc)}")
+        validate_abschnitt(key, value)
+
+
+def validate_abschnitt(key: str, value):
+    """
+    Validiert einen einzelnen Abschnitt der Kontaktdaten, z. B. beim
+    Nachladen nur die geänderten Abschnitte.
+
+    :raise ValidationError: Key ist unbekannt
+    :raise ValidationError: Value ist ungültig
+    """
+
+    try:
+        if key == "codes":
+            validate_codes(value)
+        elif key == "plz_impfzentren":
+            validate_plz_impfzentren(value)
+        elif key == "kontakt":
+            validate_kontakt(value)
+        elif key == "notifications":
+            validate_notifications(value)
+        elif key == "zeitrahmen":
+            validate_zeitrahmen(value)
+        elif key == "backoff":
+            validate_backoff(value)
+        else:
+            raise ValidationError(f"Nicht unterstützter Key")
+    except ValidationError as exc:
+        raise ValidationError(
+            f"Ungültiger Key {json.dumps(key)}:\n{str(exc)}")
 
 
 def validate_codes(codes: list):
@@ -367,6 +391,57 @@ def validate_notifications(notifications: dict):
                 f"Ungültiger Key {json.dumps(key)}:\n{str(exc)}")
 
 
+def validate_backoff(backoff: dict):
+    """
+    Validiert die Einstellungen für Wiederholungen nach Fehlern,
+    siehe tools.backoff.Richtlinie.aus_config.
+
+    :raise ValidationError: Typ ist nicht dict
+    :raise ValidationError: Einer der enthaltenen Keys ist unbekannt
+    :raise ValidationError: Eine der enthaltenen Values ist ungültig
+    """
+
+    if not isinstance(backoff, dict):
+        raise ValidationError("Muss ein Dictionary sein")
+
+    fehlerarten = ["verbindung", "timeout", "kein_json", "server"]
+
+    for key, value in backoff.items():
+        try:
+            if key == "basis":
+                if isinstance(value, dict):
+                    for art, sekunden in value.items():
+                        if art not in fehlerarten:
+                            raise ValidationError(
+                                f"Nicht unterstützte Fehlerart {json.dumps(art)}, "
+                                f"erlaubt: {', '.join(fehlerarten)}")
+                        validate_sekunden(sekunden)
+                else:
+                    validate_sekunden(value)
+            elif key == "maximum":
+                validate_sekunden(value)
+            elif key == "faktor":
+                if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 1:
+                    raise ValidationError("Muss eine Zahl größer oder gleich 1 sein")
+            elif key == "schwelle":
+                if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+                    raise ValidationError("Muss eine ganze Zahl größer 0 sein")
+            else:
+                raise ValidationError(f"Nicht unterstützter Key")
+        except ValidationError as exc:
+            raise ValidationError(
+                f"Ungültiger Key {json.dumps(key)}:\n{str(exc)}")
+
+
+def validate_sekunden(sekunden):
+    """
+    :raise ValidationError: Keine positive Zahl
+    """
+
+    if isinstance(sekunden, bool) or not isinstance(sekunden, (int, float)) or sekunden <= 0:
+        raise ValidationError("Muss eine Zahl größer 0 sein")
+
+
 def validate_pushover(pushover: dict):
     if not isinstance(pushover, dict):
         raise ValidationError("Muss ein Dictionary sein")
@@ -0,0 +1,274 @@
+"""
+Nachladen der Kontaktdaten während einer laufenden Terminsuche.
+
+Der DateiBeobachter meldet Änderungen an kontaktdaten.json, unter Linux per
+inotify, sonst durch Vergleich von mtime, Größe und Inode. Der
+KontaktdatenNachlader validiert nur die geänderten Abschnitte und übergibt
+sie gesammelt an eine Funktion, die sie übernimmt, z. B.
+ImpfterminService.kontaktdaten_anwenden.
+
+Beispiel:
+    nachlader = KontaktdatenNachlader("data/kontaktdaten.json", kontaktdaten, log=its.log)
+    while True:
+        nachlader.nachladen(its.kontaktdaten_anwenden)
+        ...
+    nachlader.schliessen()
+"""
+
+import copy
+import json
+import os
+import select
+import struct
+import sys
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from tools.exceptions import ValidationError
+from tools.kontaktdaten import read_kontaktdaten, validate_abschnitt
+
+# Intervall in Sekunden, in dem ohne inotify die Datei geprüft wird
+POLL_INTERVALL = 2.0
+
+# Abschnitte, die während der Suche geändert werden können. Fehlen optionale
+# Abschnitte, gelten sie als leer.
+ABSCHNITTE = ("codes", "plz_impfzentren", "kontakt", "notifications", "zeitrahmen")
+PFLICHT_ABSCHNITTE = ("codes", "plz_impfzentren", "kontakt")
+
+# Aus <sys/inotify.h>
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_DELETE = 0x00000200
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_EREIGNIS = struct.Struct("iIII")
+
+
+class DateiBeobachter:
+    """
+    Erkennt Änderungen an einer Datei, ohne die Suche zu blockieren.
+
+    Beobachtet wird der Ordner der Datei, da viele Editoren beim Speichern
+    eine neue Datei anlegen und umbenennen. Ohne inotify (nicht Linux, oder
+    das Limit an Watches ist erreicht) wird höchstens alle intervall
+    Sekunden ein stat() ausgeführt.
+    """
+
+    def __init__(self, pfad: str, intervall: float = POLL_INTERVALL,
+                 uhr: Callable[[], float] = time.monotonic):
+        """
+        :param pfad: Pfad zur beobachteten Datei
+        :param intervall: Intervall der Prüfung ohne inotify in Sekunden
+        :param uhr: Monotone Uhr für das Intervall
+        """
+        self.pfad = os.path.abspath(pfad)
+        self.intervall = intervall
+        self._uhr = uhr
+        self._name = os.fsencode(os.path.basename(self.pfad))
+        self._fd: Optional[int] = self._inotify_starten()
+        self._signatur = self._stat()
+        self._letzte_pruefung = uhr()
+
+    @property
+    def inotify(self) -> bool:
+        """
+        :return: True, falls Änderungen per inotify erkannt werden
+        """
+        return self._fd is not None
+
+    def geaendert(self) -> bool:
+        """
+        :return: True, falls die Datei seit dem letzten Aufruf geschrieben,
+            ersetzt oder gelöscht wurde
+        """
+        if self._fd is not None:
+            return self._ereignisse_lesen()
+
+        jetzt = self._uhr()
+        if jetzt - self._letzte_pruefung < self.intervall:
+            return False
+        self._letzte_pruefung = jetzt
+        signatur = self._stat()
+        if signatur == self._signatur:
+            return False
+        self._signatur = signatur
+        return True
+
+    def warten(self, timeout: float) -> bool:
+        """
+        Blockiert, bis die Datei geändert wurde, höchstens timeout Sekunden.
+
+        :return: True, falls die Datei geändert wurde
+        """
+        frist = self._uhr() + max(0.0, timeout)
+        while True:
+            if self.geaendert():
+                return True
+            verbleibend = frist - self._uhr()
+            if verbleibend <= 0:
+                return False
+            if self._fd is not None:
+                select.select([self._fd], [], [], verbleibend)
+            else:
+                naechste_pruefung = self._letzte_pruefung + self.intervall - self._uhr()
+                time.sleep(max(0.0, min(verbleibend, naechste_pruefung)))
+
+    def schliessen(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _stat(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(self.pfad)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def _inotify_starten(self) -> Optional[int]:
+        if not sys.platform.startswith("linux"):
+            return None
+        try:
+            import ctypes
+            libc = ctypes.CDLL(None, use_errno=True)
+            fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        except (OSError, AttributeError):
+            return None
+        if fd < 0:
+            return None
+        ordner = os.fsencode(os.path.dirname(self.pfad))
+        if libc.inotify_add_watch(fd, ordner, _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_DELETE) < 0:
+            os.close(fd)
+            return None
+        return fd
+
+    def _ereignisse_lesen(self) -> bool:
+        geaendert = False
+        while True:
+            try:
+                daten = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return geaendert
+            if not daten:
+                return geaendert
+
+            position = 0
+            while position + _EREIGNIS.size <= len(daten):
+                _, _, _, laenge = _EREIGNIS.unpack_from(daten, position)
+                position += _EREIGNIS.size
+                name = daten[position:position + laenge].rstrip(b"\0")
+                position += laenge
+                if name == self._name:
+                    geaendert = True
+
+
+class KontaktdatenNachlader:
+    """
+    Lädt geänderte Kontaktdaten nach und validiert dabei nur die Abschnitte,
+    die sich gegenüber dem zuletzt übernommenen Stand geändert haben.
+
+    Ungültige oder unvollständig geschriebene Dateien werden mit einer
+    Warnung ignoriert, die Suche läuft mit dem bisherigen Stand weiter.
+    """
+
+    def __init__(self, pfad: str, kontaktdaten: Dict, log=None, beobachter: DateiBeobachter = None):
+        """
+        :param pfad: Pfad zur JSON-Datei mit Kontaktdaten
+        :param kontaktdaten: Kontaktdaten, mit denen die Suche gestartet wurde
+        :param log: Optionaler CLogger
+        :param beobachter: Optionaler DateiBeobachter, standardmäßig für pfad
+        """
+        self.pfad = pfad
+        self.log = log
+        self.beobachter = beobachter or DateiBeobachter(pfad)
+        self._stand = _abschnitte(kontaktdaten)
+
+    @property
+    def stand(self) -> Dict[str, Any]:
+        """
+        :return: Kopie der zuletzt übernommenen Abschnitte
+        """
+        return copy.deepcopy(self._stand)
+
+    def nachladen(self, anwenden: Callable[[Dict[str, Any]], None]) -> bool:
+        """
+        Prüft auf Änderungen und übergibt die geänderten Abschnitte an
+        anwenden. Erzeugt anwenden einen ValueError, bleibt der bisherige
+        Stand bestehen.
+
+        :param anwenden: Funktion, die ein Dictionary der geänderten
+            Abschnitte übernimmt
+        :return: True, falls Änderungen übernommen wurden
+        """
+        if not self.beobachter.geaendert():
+            return False
+
+        try:
+            aenderungen = self.aenderungen()
+        except FileNotFoundError:
+            self._melden("warn", f"'{self.pfad}' wurde entfernt, Kontaktdaten bleiben unverändert")
+            return False
+        except json.JSONDecodeError as exc:
+            self._melden("warn", f"'{self.pfad}' ist kein gültiges JSON, Änderung ignoriert: {exc}")
+            return False
+        except ValidationError as exc:
+            self._melden("error", f"Geänderte Kontaktdaten sind ungültig, Änderung ignoriert:\n{exc}")
+            return False
+
+        if not aenderungen:
+            return False
+
+        try:
+            anwenden(copy.deepcopy(aenderungen))
+        except ValueError as exc:
+            self._melden("error", f"Geänderte Kontaktdaten nicht übernommen: {exc}")
+            return False
+
+        self._stand.update(aenderungen)
+        self._melden("info", f"Kontaktdaten neu geladen: {', '.join(sorted(aenderungen))}")
+        return True
+
+    def aenderungen(self) -> Dict[str, Any]:
+        """
+        Liest die Datei und validiert die geänderten Abschnitte.
+
+        :return: Geänderte Abschnitte mit ihrem neuen Wert
+        :raise FileNotFoundError: Datei existiert nicht
+        :raise json.JSONDecodeError: Datei enthält kein gültiges JSON
+        :raise ValidationError: Ein geänderter Abschnitt ist ungültig
+        """
+        kontaktdaten = read_kontaktdaten(self.pfad)
+        if not isinstance(kontaktdaten, dict):
+            raise ValidationError("Muss ein Dictionary sein")
+
+        for key in kontaktdaten:
+            if key not in ABSCHNITTE:
+                validate_abschnitt(key, kontaktdaten[key])
+
+        neu = _abschnitte(kontaktdaten)
+        aenderungen = {}
+        for key in ABSCHNITTE:
+            if neu[key] == self._stand[key]:
+                continue
+            if key in PFLICHT_ABSCHNITTE and key not in kontaktdaten:
+                raise ValidationError(f"Key {json.dumps(key)} fehlt")
+            validate_abschnitt(key, neu[key])
+            aenderungen[key] = neu[key]
+        return aenderungen
+
+    def schliessen(self):
+        self.beobachter.schliessen()
+
+    def _melden(self, level: str, msg: str):
+        if self.log is not None:
+            getattr(self.log, level)(msg)
+
+
+def _abschnitte(kontaktdaten: Dict) -> Dict[str, Any]:
+    """
+    :return: Kopie der änderbaren Abschnitte, fehlende optionale Abschnitte als {}
+    """
+    return {
+        key: copy.deepcopy(kontaktdaten.get(key, None if key in PFLICHT_ABSCHNITTE else {}))
+        for key in ABSCHNITTE
+    }
@@ -0,0 +1,412 @@
+"""
+Laufzeit-Metriken der Terminsuche.
+
+ImpfterminService zeichnet je Iteration die Dauer der einzelnen Phasen
+(Anfrage, JSON-Decodierung, Zeitrahmen-Filter, Benachrichtigung, Buchung,
+Schlafen), den Verbindungsaufbau und die Antworten nach Statuscode je
+Backend-URL auf.
+
+Jeder Prozess schreibt regelmäßig nach data/metriken/:
+    - vaccipy_<pid>.prom: Prometheus-Textformat, z. B. für den
+      Textfile-Collector des node_exporter. Wird beim Beenden der
+      Terminsuche entfernt.
+    - metriken.jsonl: Ein Snapshot je Zeile, für die Zusammenfassung
+
+Zusammenfassung über alle Prozesse:
+    python -m tools.metriken
+"""
+
+import argparse
+import bisect
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from tools.cache import ROOT_PATH
+
+# Obere Grenzen der Histogramm-Buckets in Sekunden. Der letzte Bucket (+Inf)
+# ist implizit.
+GRENZEN = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+           1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+# Standard-Intervall für das Exportieren in Sekunden
+DEFAULT_INTERVALL = 60
+
+# Ab dieser Größe wird metriken.jsonl nach metriken.jsonl.1 rotiert
+_MAX_JSONL_BYTES = 10 * 2 ** 20
+
+_BESCHREIBUNGEN = {
+    "phase_sekunden": ("histogram", "Dauer der Phasen der Terminsuche"),
+    "verbindung_sekunden": ("histogram", "Dauer des Verbindungsaufbaus (DNS und TCP bzw. TLS)"),
+    "antwortzeit_sekunden": ("histogram", "Zeit vom Senden der Anfrage bis zum Empfang der Header"),
+    "antworten_total": ("counter", "Antworten nach Statuscode je Backend-URL"),
+    "benachrichtigungen_total": ("counter", "Zugestellte und fehlgeschlagene Benachrichtigungen je Anbieter"),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class _Histogramm:
+    __slots__ = ("buckets", "summe", "anzahl")
+
+    def __init__(self):
+        self.buckets = [0] * (len(GRENZEN) + 1)
+        self.summe = 0.0
+        self.anzahl = 0
+
+    def beobachten(self, wert: float):
+        self.buckets[bisect.bisect_left(GRENZEN, wert)] += 1
+        self.summe += wert
+        self.anzahl += 1
+
+
+class Metriken:
+    """
+    Thread-sichere Sammlung von Histogrammen und Zählern eines Prozesses.
+
+    Beispiel:
+        metriken = Metriken(PATH)
+        with metriken.zeit("json"):
+            daten = res.json()
+        metriken.antwort(url, "suche", res.status_code)
+        metriken.vielleicht_exportieren()
+        ...
+        metriken.schliessen()
+    """
+
+    def __init__(self, PATH: Optional[str] = None, intervall: float = DEFAULT_INTERVALL):
+        """
+        :param PATH: Dateipfad zum vaccipy-Repo. Default: Elternordner von tools
+        :param intervall: Mindestabstand zwischen zwei Exporten in Sekunden
+        """
+        if PATH is None:
+            PATH = ROOT_PATH
+        self.ordner = os.path.join(PATH, "data", "metriken")
+        self.intervall = intervall
+        self.prozess = str(os.getpid())
+
+        self._lock = threading.Lock()
+        self._histogramme: Dict[Tuple[str, Labels], _Histogramm] = {}
+        self._zaehler: Dict[Tuple[str, Labels], float] = {}
+        self._letzter_export = time.monotonic()
+
+    def beobachten(self, name: str, wert: float, **labels):
+        schluessel = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogramm = self._histogramme.get(schluessel)
+            if histogramm is None:
+                histogramm = self._histogramme[schluessel] = _Histogramm()
+            histogramm.beobachten(wert)
+
+    def zaehlen(self, name: str, anzahl: float = 1, **labels):
+        schluessel = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._zaehler[schluessel] = self._zaehler.get(schluessel, 0) + anzahl
+
+    @contextmanager
+    def zeit(self, phase: str, **labels):
+        """
+        Misst die Dauer des with-Blocks als Phase der Terminsuche.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.beobachten("phase_sekunden", time.perf_counter() - start, phase=phase, **labels)
+
+    def antwort(self, url: str, endpunkt: str, status: str, dauer: Optional[float] = None):
+        """
+        Zählt eine Antwort des Servers.
+
+        :param url: Backend-URL
+        :param endpunkt: Kurzname des Endpunkts, z. B. "suche"
+        :param status: Statuscode oder "warteraum" bzw. "verbindungsfehler"
+        :param dauer: Antwortzeit in Sekunden, z. B. res.elapsed
+        """
+        self.zaehlen("antworten_total", url=url, endpunkt=endpunkt, status=str(status))
+        if dauer is not None:
+            self.beobachten("antwortzeit_sekunden", dauer, url=url, endpunkt=endpunkt)
+
+    def session_instrumentieren(self, session):
+        """
+        Misst den Verbindungsaufbau aller Verbindungen der requests-Session.
+        Muss vor der ersten Anfrage aufgerufen werden.
+        """
+        pool_klassen = _pool_klassen(self)
+        for adapter in session.adapters.values():
+            poolmanager = getattr(adapter, "poolmanager", None)
+            if poolmanager is not None:
+                poolmanager.pool_classes_by_scheme = pool_klassen
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "zeit": time.time(),
+                "prozess": self.prozess,
+                "histogramme": [
+                    {"name": name, "labels": dict(labels), "buckets": list(h.buckets),
+                     "summe": h.summe, "anzahl": h.anzahl}
+                    for (name, labels), h in self._histogramme.items()
+                ],
+                "zaehler": [
+                    {"name": name, "labels": dict(labels), "wert": wert}
+                    for (name, labels), wert in self._zaehler.items()
+                ],
+            }
+
+    def vielleicht_exportieren(self):
+        """
+        Exportiert, falls seit dem letzten Export das Intervall verstrichen ist.
+        """
+        if time.monotonic() - self._letzter_export >= self.intervall:
+            self.exportieren()
+
+    def exportieren(self):
+        """
+        Schreibt die Prometheus-Datei des Prozesses neu und hängt einen
+        Snapshot an metriken.jsonl an.
+        """
+        self._letzter_export = time.monotonic()
+        snapshot = self.snapshot()
+        os.makedirs(self.ordner, exist_ok=True)
+
+        prom_pfad = self._prom_pfad()
+        tmp_pfad = f"{prom_pfad}.tmp"
+        with open(tmp_pfad, "w", encoding="utf-8") as f:
+            f.write(prometheus_text(snapshot))
+        os.replace(tmp_pfad, prom_pfad)
+
+        jsonl_pfad = os.path.join(self.ordner, "metriken.jsonl")
+        try:
+            if os.path.getsize(jsonl_pfad) > _MAX_JSONL_BYTES:
+                os.replace(jsonl_pfad, f"{jsonl_pfad}.1")
+        except OSError:
+            pass
+        # Eine Zeile wird mit einem einzigen write im Append-Modus
+        # geschrieben, sodass parallele Prozesse sich nicht vermischen.
+        with open(jsonl_pfad, "a", encoding="utf-8") as f:
+            f.write(json.dumps(snapshot, ensure_ascii=False) + "\n")
+
+
+    def schliessen(self):
+        """
+        Exportiert ein letztes Mal und entfernt die Prometheus-Datei des
+        Prozesses, damit der Textfile-Collector keine beendeten Prozesse
+        weiter meldet. Der Snapshot in metriken.jsonl bleibt erhalten.
+        """
+        self.exportieren()
+        try:
+            os.remove(self._prom_pfad())
+        except FileNotFoundError:
+            pass
+
+    def _prom_pfad(self) -> str:
+        return os.path.join(self.ordner, f"vaccipy_{self.prozess}.prom")
+
+
+def _pool_klassen(metriken: Metriken) -> Dict:
+    """
+    :return: urllib3-Connection-Pools, deren Verbindungen ihren Aufbau in
+        metriken aufzeichnen
+    """
+    from urllib3.connection import HTTPConnection, HTTPSConnection
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+    class _Gemessen:
+        _tcp_dauer = None
+
+        def _new_conn(self):
+            # Namensauflösung und TCP-Verbindung
+            start = time.perf_counter()
+            try:
+                return super()._new_conn()
+            finally:
+                self._tcp_dauer = time.perf_counter() - start
+                metriken.beobachten("verbindung_sekunden", self._tcp_dauer,
+                                    host=self.host, schritt="tcp")
+
+        def connect(self):
+            start = time.perf_counter()
+            super().connect()
+            if isinstance(self, HTTPSConnection) and self._tcp_dauer is not None:
+                metriken.beobachten("verbindung_sekunden",
+                                    time.perf_counter() - start - self._tcp_dauer,
+                                    host=self.host, schritt="tls")
+
+    class _HTTPConnection(_Gemessen, HTTPConnection):
+        pass
+
+    class _HTTPSConnection(_Gemessen, HTTPSConnection):
+        pass
+
+    class _HTTPConnectionPool(HTTPConnectionPool):
+        ConnectionCls = _HTTPConnection
+
+    class _HTTPSConnectionPool(HTTPSConnectionPool):
+        ConnectionCls = _HTTPSConnection
+
+    return {"http": _HTTPConnectionPool, "https": _HTTPSConnectionPool}
+
+
+def _labels_text(labels: Dict[str, str], zusatz: Iterable[Tuple[str, str]] = ()) -> str:
+    teile = []
+    for schluessel, wert in list(labels.items()) + list(zusatz):
+        wert = str(wert).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        teile.append(f'{schluessel}="{wert}"')
+    return "{" + ",".join(teile) + "}"
+
+
+def _grenze_text(grenze: float) -> str:
+    return repr(float(grenze))
+
+
+def prometheus_text(snapshot: Dict) -> str:
+    """
+    :return: Snapshot im Prometheus-Textformat
+    """
+
+    zeilen = []
+    prozess = (("prozess", snapshot["prozess"]),)
+    beschrieben = set()
+
+    def kopf(name: str):
+        if name in beschrieben:
+            return
+        beschrieben.add(name)
+        typ, beschreibung = _BESCHREIBUNGEN.get(name, ("untyped", name))
+        zeilen.append(f"# HELP vaccipy_{name} {beschreibung}")
+        zeilen.append(f"# TYPE vaccipy_{name} {typ}")
+
+    for h in sorted(snapshot["histogramme"], key=lambda h: h["name"]):
+        kopf(h["name"])
+        kumuliert = 0
+        for grenze, anzahl in zip(list(GRENZEN) + ["+Inf"], h["buckets"]):
+            kumuliert += anzahl
+            le = grenze if grenze == "+Inf" else _grenze_text(grenze)
+            labels = _labels_text(h["labels"], prozess + (("le", le),))
+            zeilen.append(f"vaccipy_{h['name']}_bucket{labels} {kumuliert}")
+        labels = _labels_text(h["labels"], prozess)
+        zeilen.append(f"vaccipy_{h['name']}_sum{labels} {h['summe']}")
+        zeilen.append(f"vaccipy_{h['name']}_count{labels} {h['anzahl']}")
+
+    for z in sorted(snapshot["zaehler"], key=lambda z: z["name"]):
+        kopf(z["name"])
+        zeilen.append(f"vaccipy_{z['name']}{_labels_text(z['labels'], prozess)} {z['wert']}")
+
+    return "\n".join(zeilen) + "\n"
+
+
+def quantil(buckets: List[int], q: float) -> float:
+    """
+    Schätzt ein Quantil aus Histogramm-Buckets durch lineare Interpolation
+    innerhalb des Buckets, wie histogram_quantile in Prometheus.
+    """
+
+    anzahl = sum(buckets)
+    if anzahl == 0:
+        return float("nan")
+    rang = q * anzahl
+    kumuliert = 0
+    for i, n in enumerate(buckets):
+        if n and kumuliert + n >= rang:
+            if i == len(GRENZEN):
+                return GRENZEN[-1]
+            untere = GRENZEN[i - 1] if i > 0 else 0.0
+            return untere + (GRENZEN[i] - untere) * (rang - kumuliert) / n
+        kumuliert += n
+    return GRENZEN[-1]
+
+
+def letzte_snapshots(pfad: str, seit: Optional[float] = None) -> List[Dict]:
+    """
+    :return: Den jeweils letzten Snapshot jedes Prozesses aus metriken.jsonl
+    """
+    snapshots = {}
+    with open(pfad, encoding="utf-8") as f:
+        for zeile in f:
+            try:
+                snapshot = json.loads(zeile)
+            except ValueError:
+                continue
+            if seit is not None and snapshot["zeit"] < seit:
+                continue
+            snapshots[snapshot["prozess"]] = snapshot
+    return list(snapshots.values())
+
+
+def zusammenfassen(snapshots: List[Dict]) -> str:
+    """
+    :return: Übersicht über Phasen, Verbindungsaufbau und Antworten aller
+        Snapshots als Text
+    """
+
+    histogramme: Dict[Tuple[str, Labels], List] = {}
+    antworten: Dict[Tuple[str, str], Dict[str, float]] = {}
+    for snapshot in snapshots:
+        for h in snapshot["histogramme"]:
+            labels = dict(h["labels"])
+            labels.pop("url", None)
+            schluessel = (h["name"], tuple(sorted(labels.items())))
+            summe = histogramme.setdefault(schluessel, [[0] * (len(GRENZEN) + 1), 0.0])
+            summe[0] = [a + b for a, b in zip(summe[0], h["buckets"])]
+            summe[1] += h["summe"]
+        for z in snapshot["zaehler"]:
+            if z["name"] != "antworten_total":
+                continue
+            labels = z["labels"]
+            status = labels.get("status", "?")
+            if status.isdigit() and status.startswith("5"):
+                status = "5xx"
+            zeile = antworten.setdefault((labels.get("url", "?"), labels.get("endpunkt", "?")), {})
+            zeile[status] = zeile.get(status, 0) + z["wert"]
+
+    ausgabe = [f"{len(snapshots)} Prozess(e)", ""]
+    ausgabe.append(f"{'Messung':<42}{'Anzahl':>9}{'Mittel':>10}{'p50':>10}{'p95':>10}{'Summe':>11}")
+    for (name, labels), (buckets, summe) in sorted(histogramme.items()):
+        anzahl = sum(buckets)
+        if not anzahl:
+            continue
+        # Phase zuerst, übrige Labels alphabetisch
+        werte = sorted(labels, key=lambda label: label[0] != "phase")
+        titel = name.replace("_sekunden", "") + " " + " ".join(wert for _, wert in werte)
+        ausgabe.append(
+            f"{titel:<42}{anzahl:>9}{summe / anzahl * 1000:>8.1f}ms"
+            f"{quantil(buckets, 0.5) * 1000:>8.1f}ms{quantil(buckets, 0.95) * 1000:>8.1f}ms"
+            f"{summe:>10.1f}s")
+
+    if antworten:
+        spalten = sorted({status for zeile in antworten.values() for status in zeile})
+        ausgabe += ["", f"{'Antworten':<58}" + "".join(f"{status:>10}" for status in spalten)]
+        for (url, endpunkt), zeile in sorted(antworten.items()):
+            titel = f"{url} {endpunkt}"
+            ausgabe.append(f"{titel:<58}" + "".join(
+                f"{int(zeile.get(status, 0)):>10}" for status in spalten))
+
+    return "\n".join(ausgabe)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m tools.metriken",
+        description="Metriken der Terminsuche zusammenfassen")
+    parser.add_argument("--datei", default=os.path.join(ROOT_PATH, "data", "metriken", "metriken.jsonl"),
+                        help="Pfad zur metriken.jsonl")
+    parser.add_argument("--stunden", type=float, default=None,
+                        help="Nur Prozesse berücksichtigen, die in den letzten Stunden exportiert haben")
+    args = parser.parse_args()
+
+    seit = None if args.stunden is None else time.time() - args.stunden * 3600
+    try:
+        snapshots = letzte_snapshots(args.datei, seit)
+    except FileNotFoundError:
+        print(f"Keine Metriken unter {args.datei} gefunden", file=sys.stderr)
+        sys.exit(1)
+    print(zusammenfassen(snapshots))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Typisiertes Domänenmodell der Terminsuche und Decodierung der Antworten
+des Impfterminservice.
+
+Antworten werden genau einmal als Bytes ausgewertet: Die Seite des
+virtuellen Warteraums wird am ersten Zeichen erkannt, ohne den Body als
+Text zu decodieren, JSON wird mit orjson geparst, falls installiert.
+Zeitstempel der Termine werden beim Decodieren einmalig umgerechnet.
+
+Beispiel:
+    inhalt = res.content
+    if ist_warteraum(inhalt):
+        ...
+    terminpaare = terminpaare_aus_json(json_laden(inhalt).get("termine"))
+"""
+
+import json
+from base64 import b64encode
+from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import orjson
+
+    ENABLE_ORJSON = True
+except ImportError:
+    ENABLE_ORJSON = False
+
+_WARTERAUM = "Virtueller Warteraum".encode("utf-8")
+
+# So viele Bytes werden für die Erkennung des ersten Zeichens betrachtet
+_PRAEFIX = 64
+
+
+@dataclass(frozen=True)
+class Impfzentrum:
+    """
+    Impfzentrum aus impfzentren.json. Das ursprüngliche Dictionary bleibt
+    unter daten erhalten.
+    """
+
+    __slots__ = ("plz", "ort", "zentrumsname", "url", "daten")
+
+    plz: str
+    ort: str
+    zentrumsname: str
+    url: str
+    daten: Dict
+
+    @classmethod
+    def aus_dict(cls, daten: Dict) -> "Impfzentrum":
+        return cls(
+            plz=daten.get("PLZ"),
+            ort=daten.get("Ort"),
+            zentrumsname=(daten.get("Zentrumsname") or "").strip(),
+            url=daten["URL"],
+            daten=daten)
+
+    def __str__(self) -> str:
+        return f"'{self.zentrumsname}' in {self.plz} {self.ort}"
+
+
+@dataclass(frozen=True)
+class Termin:
+    """
+    Einzelner Termin einer "termine"-Antwort. begin ist der Zeitstempel in
+    Millisekunden wie vom Server geliefert, zeitpunkt die lokale Zeit.
+    """
+
+    __slots__ = ("slot_id", "begin", "bsnr", "zeitpunkt")
+
+    slot_id: str
+    begin: int
+    bsnr: Optional[str]
+    zeitpunkt: datetime
+
+    @classmethod
+    def aus_json(cls, daten: Dict) -> "Termin":
+        begin = int(daten["begin"])
+        return cls(
+            slot_id=daten.get("slotId"),
+            begin=begin,
+            bsnr=daten.get("bsnr"),
+            zeitpunkt=datetime.fromtimestamp(begin / 1000))
+
+    @property
+    def text(self) -> str:
+        return self.zeitpunkt.strftime('%d.%m.%Y um %H:%M Uhr')
+
+
+@dataclass(frozen=True)
+class Terminpaar:
+    """
+    Terminpaar (oder Einzeltermin) in der Reihenfolge der Impfungen.
+    """
+
+    __slots__ = ("termine", "begin")
+
+    termine: Tuple[Termin, ...]
+    begin: Tuple[int, ...]
+
+    @classmethod
+    def aus_json(cls, daten: List[Dict]) -> "Terminpaar":
+        termine = tuple(Termin.aus_json(termin) for termin in daten)
+        return cls(termine=termine, begin=tuple(termin.begin for termin in termine))
+
+    def __iter__(self) -> Iterator[Termin]:
+        return iter(self.termine)
+
+    def __len__(self) -> int:
+        return len(self.termine)
+
+    def __getitem__(self, index: int) -> Termin:
+        return self.termine[index]
+
+    @property
+    def slot_ids(self) -> List[str]:
+        return [termin.slot_id for termin in self.termine]
+
+
+@dataclass(frozen=True)
+class Codepoint:
+    """
+    Vermittlungscode für eine Backend-URL samt vorbereitetem
+    Authorization-Header.
+    """
+
+    __slots__ = ("url", "code", "headers")
+
+    url: str
+    code: str
+    headers: Dict[str, str]
+
+    @classmethod
+    def aus(cls, url: str, code: str) -> "Codepoint":
+        return cls(url=url, code=code, headers=auth_headers(code))
+
+
+@dataclass(frozen=True)
+class Reservierung:
+    """
+    Gefundenes Terminpaar, das mit dem Code im Impfzentrum gebucht werden soll.
+    """
+
+    __slots__ = ("codepoint", "impfzentrum", "terminpaar")
+
+    codepoint: Codepoint
+    impfzentrum: Impfzentrum
+    terminpaar: Terminpaar
+
+    @property
+    def code(self) -> str:
+        return self.codepoint.code
+
+    @property
+    def link(self) -> str:
+        return f"{self.impfzentrum.url}impftermine/suche/{self.code}/{self.impfzentrum.plz}"
+
+
+@lru_cache(maxsize=None)
+def auth_headers(code: str) -> Dict[str, str]:
+    """
+    :return: Authorization-Header für den Vermittlungscode. Das Dictionary
+        wird je Code nur einmal erstellt und darf nicht verändert werden.
+    """
+    b = bytes(f':{code}', encoding='utf-8')
+    bearer = f"Basic {b64encode(b).decode('utf-8')}"
+    return {"Authorization": bearer}
+
+
+def ist_warteraum(inhalt: bytes) -> bool:
+    """
+    :param inhalt: Body der Antwort, z. B. res.content
+    :return: True, falls es sich um die Seite des virtuellen Warteraums
+        handelt. JSON-Antworten werden am ersten Zeichen erkannt und nicht
+        durchsucht.
+    """
+    if inhalt[:_PRAEFIX].lstrip()[:1] in (b"{", b"["):
+        return False
+    return _WARTERAUM in inhalt
+
+
+def json_laden(inhalt: bytes) -> Any:
+    """
+    :param inhalt: Body der Antwort, z. B. res.content
+    :return: Deserialisiertes JSON
+    :raise json.JSONDecodeError: Kein gültiges JSON
+    """
+    if ENABLE_ORJSON:
+        # orjson.JSONDecodeError ist eine Unterklasse von json.JSONDecodeError
+        return orjson.loads(inhalt)
+    return json.loads(inhalt)
+
+
+def terminpaare_aus_json(terminpaare: Optional[List[List[Dict]]]) -> List[Terminpaar]:
+    """
+    :param terminpaare: Wert von "termine" einer Antwort von
+        rest/suche/impfterminsuche
+    :return: Terminpaare mit einmalig umgerechneten Zeitstempeln
+    """
+    return [Terminpaar.aus_json(tp) for tp in terminpaare or ()]
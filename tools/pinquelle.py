@@ -0,0 +1,327 @@
+"""
+Quellen für den SMS-Code bei der Generierung eines Vermittlungscodes.
+
+Der SMS-Code kann weiterhin im Browser-Fenster eingegeben werden. Zusätzlich
+wartet die Codegenerierung auf eine PinQuelle, die blockiert, bis ein Code
+eintrifft oder die Frist abläuft. Ein eingetroffener Code wird sofort im
+Browser eingetragen. So lässt sich der Code auch ohne Terminal übergeben,
+z. B. auf einem Server per Datei oder Unix-Socket:
+
+    python3 main.py code -r --pin-source socket:/tmp/vaccipy.sock
+    echo 123456 | nc -U /tmp/vaccipy.sock
+
+Beispiel:
+    quelle = pinquelle_erstellen("file:data/smspin.txt", abbruch=its.abbruch)
+    pin = quelle.warten(90)
+    quelle.schliessen()
+"""
+
+import os
+import queue
+import re
+import select
+import socket
+import stat
+import sys
+from abc import ABC, abstractmethod
+from typing import Optional
+
+from tools.abbruch import Abbruch
+from tools.kontaktdaten_beobachter import DateiBeobachter
+from tools.uhr import Uhr
+
+# Ein SMS-Code besteht aus sechs Ziffern
+PIN_MUSTER = re.compile(r"^\d{6}$")
+
+# Intervall in Sekunden, in dem ohne inotify die Datei geprüft wird
+DATEI_INTERVALL = 0.25
+
+# Intervall in Sekunden, in dem unter Windows die Konsole geprüft wird
+KONSOLE_INTERVALL = 0.05
+
+# Zeit in Sekunden, die ein Client des Sockets zum Senden des Codes hat
+SOCKET_TIMEOUT = 2.0
+
+
+class PinQuelle(ABC):
+    """
+    Basisklasse aller Quellen für den SMS-Code. Unterklassen implementieren
+    _lesen, das höchstens timeout Sekunden auf eine Eingabe wartet.
+    """
+
+    # Hinweis für den Nutzer, wo der Code eingegeben werden kann
+    hinweis = ""
+
+    def __init__(self, log=None, abbruch: Abbruch = None):
+        """
+        :param log: Optionaler CLogger für ungültige Eingaben
+        :param abbruch: Optionales Abbruch-Token, z. B. ImpfterminService.abbruch.
+            Frist und Wartezeiten laufen dann auf dessen Uhr.
+        """
+        self.log = log
+        self.abbruch = abbruch
+        self.uhr = abbruch.uhr if abbruch is not None else Uhr()
+
+    def warten(self, timeout: float) -> Optional[str]:
+        """
+        Blockiert, bis ein gültiger SMS-Code eintrifft, höchstens timeout
+        Sekunden. Ungültige Eingaben werden gemeldet und verworfen.
+
+        :return: Sechsstelliger SMS-Code oder None nach Ablauf der Frist
+        :raise Abgebrochen: Abbruch wurde vor oder während der Wartezeit ausgelöst
+        """
+        frist = self.uhr.monotonic() + timeout
+        while True:
+            if self.abbruch is not None:
+                self.abbruch.pruefen()
+            verbleibend = frist - self.uhr.monotonic()
+            if verbleibend <= 0:
+                return None
+            eingabe = self._lesen(verbleibend)
+            if eingabe is None:
+                continue
+            pin = pin_normalisieren(eingabe)
+            if pin is not None:
+                return pin
+            if self.log is not None and eingabe.strip():
+                self.log.warn("Ungültiger SMS-Code, bitte die sechs Ziffern aus der SMS eingeben")
+
+    def schliessen(self):
+        pass
+
+    def _schlafen(self, sekunden: float):
+        """
+        Wartet sekunden, bei einem Abbruch sofort mit Abgebrochen.
+        """
+        if self.abbruch is not None:
+            self.abbruch.warten(sekunden)
+        else:
+            self.uhr.schlafen(sekunden)
+
+    @abstractmethod
+    def _lesen(self, timeout: float) -> Optional[str]:
+        """
+        :return: Eingabe oder None, falls innerhalb von timeout Sekunden
+            nichts eingetroffen ist
+        """
+
+    def __enter__(self) -> "PinQuelle":
+        return self
+
+    def __exit__(self, *exc):
+        self.schliessen()
+
+
+class StdinPinQuelle(PinQuelle):
+    """
+    Liest den SMS-Code zeilenweise von der Standardeingabe. Unter Windows
+    wird die Konsole über msvcrt geprüft, sonst per select auf stdin
+    gewartet. Es wird nur gelesen, solange gewartet wird, sodass spätere
+    Eingaben nicht verloren gehen.
+    """
+
+    hinweis = "im Terminal"
+
+    def __init__(self, log=None, abbruch: Abbruch = None):
+        super().__init__(log, abbruch)
+        self._windows = os.name == "nt"
+        self._zeile = ""
+        # Unter Windows kann nur die Konsole ohne Blockieren gelesen werden
+        self._ende = self._windows and not sys.stdin.isatty()
+
+    def _lesen(self, timeout: float) -> Optional[str]:
+        if self._ende:
+            self._schlafen(timeout)
+            return None
+        if self._windows:
+            return self._konsole_lesen(timeout)
+
+        bereit, _, _ = select.select([sys.stdin], [], [], timeout)
+        if not bereit:
+            return None
+        zeile = sys.stdin.readline()
+        if not zeile:
+            # EOF, z. B. bei umgeleiteter Eingabe
+            self._ende = True
+            return None
+        return zeile
+
+    def _konsole_lesen(self, timeout: float) -> Optional[str]:
+        import msvcrt
+
+        frist = self.uhr.monotonic() + timeout
+        while self.uhr.monotonic() < frist:
+            while msvcrt.kbhit():
+                zeichen = msvcrt.getwche()
+                if zeichen in ("\r", "\n"):
+                    print()
+                    zeile, self._zeile = self._zeile, ""
+                    return zeile
+                if zeichen == "\b":
+                    self._zeile = self._zeile[:-1]
+                else:
+                    self._zeile += zeichen
+            self._schlafen(KONSOLE_INTERVALL)
+        return None
+
+
+class GuiPinQuelle(PinQuelle):
+    """
+    Nimmt den SMS-Code aus einem anderen Thread entgegen, z. B. aus einem
+    Dialog der GUI. eingeben kann direkt mit einem Signal verbunden werden.
+
+    Beispiel:
+        dialog.textValueSelected.connect(quelle.eingeben)
+    """
+
+    hinweis = "im Dialog"
+
+    def __init__(self, log=None, abbruch: Abbruch = None):
+        super().__init__(log, abbruch)
+        self._eingaben: "queue.Queue[str]" = queue.Queue()
+
+    def eingeben(self, pin: str):
+        """
+        Übergibt einen SMS-Code an den wartenden Thread.
+        """
+        self._eingaben.put(pin)
+
+    def _lesen(self, timeout: float) -> Optional[str]:
+        try:
+            return self._eingaben.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class DateiPinQuelle(PinQuelle):
+    """
+    Liest den SMS-Code aus einer Datei, sobald diese geschrieben wird.
+    Unter Linux wird per inotify gewartet, sonst alle DATEI_INTERVALL
+    Sekunden geprüft. Eine beim Start vorhandene Datei wird ignoriert, eine
+    gelesene Datei wird gelöscht, damit der Code nicht erneut verwendet wird.
+    """
+
+    def __init__(self, pfad: str, log=None, abbruch: Abbruch = None):
+        """
+        :param pfad: Pfad zur Datei, in die der SMS-Code geschrieben wird
+        """
+        super().__init__(log, abbruch)
+        self.pfad = os.path.abspath(pfad)
+        self.hinweis = f"in der Datei '{self.pfad}'"
+        self._beobachter = DateiBeobachter(self.pfad, intervall=DATEI_INTERVALL)
+
+    def _lesen(self, timeout: float) -> Optional[str]:
+        if not self._beobachter.warten(timeout):
+            return None
+        try:
+            with open(self.pfad, encoding="utf-8") as f:
+                inhalt = f.read()
+        except OSError:
+            return None
+        try:
+            os.remove(self.pfad)
+        except OSError:
+            pass
+        return inhalt
+
+    def schliessen(self):
+        self._beobachter.schliessen()
+
+
+class SocketPinQuelle(PinQuelle):
+    """
+    Nimmt den SMS-Code über einen lokalen Unix-Socket entgegen. Jeder Client
+    sendet eine Zeile und erhält "OK" oder "UNGUELTIG" zurück. Der Socket
+    ist nur für den eigenen Nutzer beschreibbar.
+    """
+
+    def __init__(self, pfad: str, log=None, abbruch: Abbruch = None):
+        """
+        :param pfad: Pfad des Unix-Sockets
+        :raise ValueError: Unix-Sockets werden nicht unterstützt oder unter
+            pfad existiert eine Datei, die kein Socket ist
+        """
+        super().__init__(log, abbruch)
+        if not hasattr(socket, "AF_UNIX"):
+            raise ValueError("Unix-Sockets werden auf diesem System nicht unterstützt")
+
+        self.pfad = os.path.abspath(pfad)
+        self.hinweis = f"über den Socket '{self.pfad}' (z. B. echo 123456 | nc -U {self.pfad})"
+        if os.path.exists(self.pfad):
+            if not stat.S_ISSOCK(os.stat(self.pfad).st_mode):
+                raise ValueError(f"'{self.pfad}' existiert bereits und ist kein Socket")
+            os.remove(self.pfad)
+
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        maske = os.umask(0o177)
+        try:
+            self._socket.bind(self.pfad)
+        finally:
+            os.umask(maske)
+        self._socket.listen(1)
+
+    def _lesen(self, timeout: float) -> Optional[str]:
+        bereit, _, _ = select.select([self._socket], [], [], timeout)
+        if not bereit:
+            return None
+
+        verbindung, _ = self._socket.accept()
+        with verbindung:
+            verbindung.settimeout(SOCKET_TIMEOUT)
+            daten = b""
+            try:
+                while b"\n" not in daten and len(daten) < 64:
+                    teil = verbindung.recv(64)
+                    if not teil:
+                        break
+                    daten += teil
+            except OSError:
+                return None
+
+            eingabe = daten.decode("utf-8", errors="replace")
+            try:
+                verbindung.sendall(b"OK\n" if pin_normalisieren(eingabe) else b"UNGUELTIG\n")
+            except OSError:
+                pass
+        return eingabe
+
+    def schliessen(self):
+        self._socket.close()
+        try:
+            os.remove(self.pfad)
+        except OSError:
+            pass
+
+
+def pin_normalisieren(eingabe: str) -> Optional[str]:
+    """
+    :return: SMS-Code ohne Leerzeichen oder None, falls die Eingabe keine
+        sechs Ziffern enthält
+    """
+    pin = re.sub(r"\s", "", eingabe)
+    return pin if PIN_MUSTER.match(pin) else None
+
+
+def pinquelle_erstellen(angabe: Optional[str], log=None,
+                        abbruch: Abbruch = None) -> Optional[PinQuelle]:
+    """
+    :param angabe: "stdin", "file:PFAD", "socket:PFAD" oder "browser", wie
+        bei --pin-source
+    :param log: Optionaler CLogger
+    :param abbruch: Optionales Abbruch-Token
+    :return: PinQuelle oder None, falls der Code nur im Browser eingegeben
+        werden soll
+    :raise ValueError: Unbekannte Angabe
+    """
+    if not angabe or angabe == "browser":
+        return None
+    if angabe == "stdin":
+        return StdinPinQuelle(log=log, abbruch=abbruch)
+
+    art, _, pfad = angabe.partition(":")
+    if art == "file" and pfad:
+        return DateiPinQuelle(pfad, log=log, abbruch=abbruch)
+    if art == "socket" and pfad:
+        return SocketPinQuelle(pfad, log=log, abbruch=abbruch)
+    raise ValueError(f"Unbekannte PIN-Quelle {angabe!r}. "
+                     "Erlaubt sind stdin, browser, file:PFAD und socket:PFAD")
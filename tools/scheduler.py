@@ -0,0 +1,248 @@
+import heapq
+import random
+import time
+from itertools import count
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from tools.utils import unique
+
+
+class CodepointScheduler:
+    """
+    Verwaltet, welcher Vermittlungscode für welche Backend-URL wann verwendet
+    werden darf.
+
+    Die Codes selbst werden nur einmal gespeichert. Je URL wird lediglich die
+    Abweichung vom Ausgangszustand festgehalten (aussortierte Codes,
+    pausierte Codes, Rotation), sodass der Speicherbedarf nicht mit
+    Codes × URLs wächst.
+    Pausen liegen in einer Prioritätswarteschlange nach Freigabezeitpunkt,
+    damit die Terminsuche genau bis zur nächsten Freigabe schlafen kann.
+
+    Alle Zeitpunkte beziehen sich auf die übergebene Uhr (Default:
+    time.monotonic) und sind damit unabhängig von Änderungen der Systemzeit.
+    """
+
+    def __init__(self, codes: Iterable[str], urls: Iterable[str],
+                 uhr: Callable[[], float] = time.monotonic):
+        self._codes: Tuple[str, ...] = tuple(unique(list(codes)))
+        self._urls: Tuple[str, ...] = tuple(urls)
+        self._uhr = uhr
+
+        # Überlagerungen je URL, werden erst bei Bedarf angelegt
+        self._entfernt: Dict[str, Set[str]] = {}
+        self._pausiert: Dict[str, Dict[str, float]] = {}
+        self._rotation: Dict[str, int] = {}
+
+        # Heap aus (Freigabezeitpunkt, Laufnummer, URL, Code).
+        # Veraltete Einträge werden beim Entnehmen übersprungen.
+        self._pausen: List[Tuple[float, int, str, str]] = []
+        self._laufnummer = count()
+
+    @property
+    def urls(self) -> Tuple[str, ...]:
+        return self._urls
+
+    def codes(self, url: str) -> List[str]:
+        """
+        :return: Alle nicht aussortierten Codes der URL in der Reihenfolge,
+            in der sie als nächstes verwendet werden
+        """
+        entfernt = self._entfernt.get(url, ())
+        start = self._rotation.get(url, 0)
+        reihenfolge = self._codes[start:] + self._codes[:start]
+        return [code for code in reihenfolge if code not in entfernt]
+
+    def hat_codes(self, url: str) -> bool:
+        """
+        :return: True, falls für die URL noch nicht alle Codes aussortiert
+            wurden
+        """
+        return len(self._entfernt.get(url, ())) < len(self._codes)
+
+    def naechster_code(self, url: str) -> Optional[str]:
+        """
+        :return: Nächster sofort verwendbarer Code für die URL oder None
+        """
+        self._freigeben()
+        entfernt = self._entfernt.get(url, ())
+        pausiert = self._pausiert.get(url, {})
+        anzahl = len(self._codes)
+        start = self._rotation.get(url, 0)
+        for i in range(anzahl):
+            code = self._codes[(start + i) % anzahl]
+            if code not in entfernt and code not in pausiert:
+                return code
+        return None
+
+    def pausieren(self, url: str, code: str, sekunden: float):
+        """
+        Unterbindet die Verwendung des Codes für die URL für die gegebene
+        Dauer.
+        """
+        freigabe = self._uhr() + sekunden
+        self._pausiert.setdefault(url, {})[code] = freigabe
+        heapq.heappush(self._pausen, (freigabe, next(self._laufnummer), url, code))
+
+    def entfernen(self, url: str, code: str):
+        """
+        Sortiert den Code für die URL endgültig aus.
+        """
+        self._entfernt.setdefault(url, set()).add(code)
+        self._pausiert.get(url, {}).pop(code, None)
+
+    def rotieren(self, url: str):
+        """
+        Rotiert die Codes der URL, um in der nächsten Iteration einen
+        anderen Code zu verwenden.
+        """
+        if self._codes:
+            self._rotation[url] = (self._rotation.get(url, 0) + 1) % len(self._codes)
+
+    def codes_setzen(self, codes: Iterable[str]):
+        """
+        Ersetzt die Liste der Codes, z. B. nach dem Nachladen der
+        Kontaktdaten. Pausen und Aussortierungen verbleibender Codes
+        bleiben erhalten, die Rotation beginnt je URL weiterhin beim selben
+        Code, sofern dieser noch existiert.
+        """
+        neu = tuple(unique(list(codes)))
+        behalten = set(neu)
+
+        for url, start in list(self._rotation.items()):
+            bisher = self._codes[start] if start < len(self._codes) else None
+            if bisher in behalten:
+                self._rotation[url] = neu.index(bisher)
+            else:
+                del self._rotation[url]
+
+        for url in list(self._entfernt):
+            self._entfernt[url] &= behalten
+            if not self._entfernt[url]:
+                del self._entfernt[url]
+
+        # Veraltete Einträge im Heap werden beim Freigeben übersprungen
+        for url in list(self._pausiert):
+            pausiert = self._pausiert[url]
+            for code in [code for code in pausiert if code not in behalten]:
+                del pausiert[code]
+            if not pausiert:
+                del self._pausiert[url]
+
+        self._codes = neu
+
+    def zustand(self) -> Dict:
+        """
+        :return: Aussortierte und pausierte Codes je URL als JSON-fähiges
+            Dictionary. Freigabezeitpunkte beziehen sich auf die Uhr des
+            Schedulers.
+        """
+        self._freigeben()
+        return {
+            "entfernt": {url: sorted(codes) for url, codes in self._entfernt.items() if codes},
+            "pausiert": {url: dict(pausiert) for url, pausiert in self._pausiert.items() if pausiert},
+        }
+
+    def zustand_laden(self, zustand: Dict):
+        """
+        Übernimmt einen mit zustand gesicherten Stand. Unbekannte Codes und
+        URLs werden ignoriert, abgelaufene Pausen verworfen.
+        """
+        codes = set(self._codes)
+        urls = set(self._urls)
+        for url, entfernt in zustand.get("entfernt", {}).items():
+            if url in urls:
+                for code in entfernt:
+                    if code in codes:
+                        self.entfernen(url, code)
+
+        jetzt = self._uhr()
+        for url, pausiert in zustand.get("pausiert", {}).items():
+            if url not in urls:
+                continue
+            for code, freigabe in pausiert.items():
+                if code in codes and freigabe > jetzt and code not in self._entfernt.get(url, ()):
+                    self._pausiert.setdefault(url, {})[code] = freigabe
+                    heapq.heappush(self._pausen, (freigabe, next(self._laufnummer), url, code))
+
+    def naechste_freigabe(self, urls: Iterable[str] = None) -> Optional[float]:
+        """
+        :param urls: URLs, die berücksichtigt werden sollen. Default: alle
+        :return: Zeitpunkt, ab dem für mindestens eine der URLs wieder ein
+            Code verwendbar ist. None, falls alle Codes aussortiert wurden.
+        """
+        if urls is None:
+            urls = self._urls
+        jetzt = self._uhr()
+        freigabe = None
+        for url in urls:
+            if self.naechster_code(url) is not None:
+                return jetzt
+            pausiert = self._pausiert.get(url)
+            if pausiert:
+                frueheste = min(pausiert.values())
+                if freigabe is None or frueheste < freigabe:
+                    freigabe = frueheste
+        return freigabe
+
+    def _freigeben(self):
+        """
+        Hebt alle abgelaufenen Pausen auf.
+        """
+        jetzt = self._uhr()
+        while self._pausen and self._pausen[0][0] <= jetzt:
+            freigabe, _, url, code = heapq.heappop(self._pausen)
+            pausiert = self._pausiert.get(url)
+            if pausiert is not None and pausiert.get(code) == freigabe:
+                del pausiert[code]
+                if not pausiert:
+                    del self._pausiert[url]
+
+
+class Taktgeber:
+    """
+    Hält die Periode der Terminsuche ein, ohne dass sie sich um die Dauer
+    der Anfragen verschiebt.
+
+    Die Fristen werden auf einer monotonen Uhr fortgeschrieben. Dauert eine
+    Iteration länger als die Periode, folgt die nächste sofort, aber es
+    werden keine verpassten Iterationen nachgeholt - die Anfragerate steigt
+    also nie über die konfigurierte.
+    """
+
+    def __init__(self, periode: float, percent_max_deviation: int = 10,
+                 uhr: Callable[[], float] = time.monotonic,
+                 schlafen: Callable[[float], None] = time.sleep,
+                 zufall: random.Random = None):
+        self.periode = periode
+        self.percent_max_deviation = percent_max_deviation
+        self._uhr = uhr
+        self._schlafen = schlafen
+        self._zufall = zufall or random
+        self._frist = uhr()
+
+    @property
+    def frist(self) -> float:
+        return self._frist
+
+    def weiter(self):
+        """
+        Setzt die Frist für die nächste Iteration, zufällig um bis zu
+        percent_max_deviation Prozent der Periode verschoben.
+        """
+        abweichung = self._zufall.randrange(-self.percent_max_deviation, self.percent_max_deviation)
+        periode = self.periode * (1.0 + abweichung / 100.0)
+        self._frist = max(self._frist + periode, self._uhr())
+
+    def warten(self, fruehestens: Optional[float] = None):
+        """
+        Schläft bis zur aktuellen Frist.
+
+        :param fruehestens: Zeitpunkt, vor dem keinesfalls weitergemacht
+            werden soll, z. B. die nächste Freigabe eines Codes
+        """
+        if fruehestens is not None and fruehestens > self._frist:
+            self._frist = fruehestens
+        dauer = self._frist - self._uhr()
+        if dauer > 0:
+            self._schlafen(dauer)
@@ -0,0 +1,93 @@
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from tools.modell import Terminpaar
+
+# Nach dieser Zeit in Sekunden wird ein abgelehntes Terminpaar erneut
+# ausgewertet und gemeldet
+DEFAULT_TTL = 6 * 60 * 60
+
+# Höchstens so viele abgelehnte Terminpaare werden je PLZ gespeichert
+DEFAULT_MAX_EINTRAEGE = 5000
+
+
+class AbgelehnteTerminpaare:
+    """
+    Merkt sich je PLZ die slotId-Paare bereits abgelehnter Terminpaare.
+
+    Außerhalb des Zeitrahmens liegende Termine bleiben oft stundenlang
+    gelistet. Bekannte Terminpaare werden vor Zeitrahmen-Filter, Formatierung
+    und Logging aussortiert, sodass nur neue Termine piepen und gemeldet
+    werden. Einträge verfallen nach ttl Sekunden, bei mehr als max_eintraege
+    Einträgen je PLZ fallen die am längsten nicht gesehenen heraus.
+    Ändert sich der Zeitrahmen, muss der Cache geleert werden.
+
+    Beispiel:
+        terminpaare = abgelehnt.unbekannte(plz, terminpaare)
+        angenommen, abgelehnte = zeitrahmen.aufteilen(terminpaare)
+        abgelehnt.merken(plz, abgelehnte)
+    """
+
+    def __init__(self, ttl: float = DEFAULT_TTL, max_eintraege: int = DEFAULT_MAX_EINTRAEGE,
+                 uhr: Callable[[], float] = time.monotonic):
+        """
+        :param ttl: Gültigkeit eines Eintrags in Sekunden
+        :param max_eintraege: Maximale Anzahl an Einträgen je PLZ
+        :param uhr: Monotone Uhr für die Gültigkeit
+        """
+        self.ttl = ttl
+        self.max_eintraege = max(1, max_eintraege)
+        self._uhr = uhr
+        self._nach_plz: Dict[str, "OrderedDict[Tuple, float]"] = {}
+
+    def unbekannte(self, plz: str, terminpaare: Iterable[Terminpaar]) -> List[Terminpaar]:
+        """
+        :return: Alle Terminpaare, die für die PLZ nicht bereits abgelehnt
+            wurden, in der ursprünglichen Reihenfolge
+        """
+        eintraege = self._nach_plz.get(plz)
+        if not eintraege:
+            return list(terminpaare)
+
+        jetzt = self._uhr()
+        unbekannt = []
+        for tp in terminpaare:
+            schluessel = _schluessel(tp)
+            ablauf = eintraege.get(schluessel)
+            if ablauf is None:
+                unbekannt.append(tp)
+            elif ablauf <= jetzt:
+                del eintraege[schluessel]
+                unbekannt.append(tp)
+            else:
+                eintraege.move_to_end(schluessel)
+        return unbekannt
+
+    def merken(self, plz: str, terminpaare: Iterable[Terminpaar]):
+        """
+        Merkt sich die Terminpaare als abgelehnt.
+        """
+        eintraege = self._nach_plz.setdefault(plz, OrderedDict())
+        ablauf = self._uhr() + self.ttl
+        for tp in terminpaare:
+            schluessel = _schluessel(tp)
+            eintraege[schluessel] = ablauf
+            eintraege.move_to_end(schluessel)
+        while len(eintraege) > self.max_eintraege:
+            eintraege.popitem(last=False)
+
+    def leeren(self):
+        """
+        Vergisst alle abgelehnten Terminpaare, z. B. nach einer Änderung des
+        Zeitrahmens.
+        """
+        self._nach_plz.clear()
+
+    def __len__(self) -> int:
+        return sum(len(eintraege) for eintraege in self._nach_plz.values())
+
+
+def _schluessel(tp: Terminpaar) -> Tuple:
+    # Ohne slotId wird der Beginn verwendet
+    return tuple(termin.slot_id or termin.begin for termin in tp)
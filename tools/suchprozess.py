@@ -0,0 +1,139 @@
+"""
+Einstiegspunkt für Terminsuchen, die von der GUI in eigenen Prozessen
+gestartet werden. Der Prozess lädt weder PyQt5 noch ein eigenes Fenster,
+sondern schickt Ereignisse über eine Pipe an das Hauptfenster:
+
+- {"typ": "log", "zeile": str}: Eine Zeile der Konsolenausgabe
+- {"typ": "status", "status": str, ...}: Zustandswechsel der Suche
+- {"typ": "ergebnis", "erfolg": bool, "fehler": str | None}: Ende der Suche
+
+Beispiel:
+    kontext = suchprozess.kontext()
+    empfang, senden = kontext.Pipe(duplex=False)
+    prozess = kontext.Process(target=suchprozess.suchen, args=(senden, kontaktdaten, ...))
+    prozess.start()
+    senden.close()
+"""
+
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+from multiprocessing.connection import Connection
+from typing import Dict
+
+# Module, die der Forkserver vorab lädt, damit jede Suche nur noch einen
+# Fork statt eines neuen Interpreters kostet
+PRELOAD = ["tools.its", "tools.suchprozess"]
+
+
+def kontext() -> multiprocessing.context.BaseContext:
+    """
+    :return: Forkserver-Kontext mit vorab geladenen Modulen, unter Windows
+        und in gebündelten Programmen (PyInstaller) ein Spawn-Kontext
+    """
+    if sys.platform == "win32" or getattr(sys, "frozen", False):
+        return multiprocessing.get_context("spawn")
+
+    ctx = multiprocessing.get_context("forkserver")
+    ctx.set_forkserver_preload(PRELOAD)
+    return ctx
+
+
+class _EreignisSender:
+    """
+    Schickt Ereignisse über die Pipe. Connection ist nicht threadsicher,
+    Log-Zeilen kommen aber aus dem Listener-Thread des Loggers.
+    """
+
+    def __init__(self, verbindung: Connection):
+        self.verbindung = verbindung
+        self._lock = threading.Lock()
+
+    def senden(self, **ereignis):
+        with self._lock:
+            try:
+                self.verbindung.send(ereignis)
+            except (OSError, ValueError):
+                # Hauptfenster geschlossen, die Suche läuft bis zum Beenden weiter
+                pass
+
+
+class _EreignisStream:
+    """
+    Ersatz für sys.stdout / sys.stderr, der vollständige Zeilen als
+    log-Ereignis verschickt.
+    """
+
+    def __init__(self, sender: _EreignisSender):
+        self._sender = sender
+        self._rest = ""
+        self._lock = threading.Lock()
+
+    def write(self, text) -> int:
+        text = str(text)
+        with self._lock:
+            teile = (self._rest + text).split("\n")
+            self._rest = teile.pop()
+        for zeile in teile:
+            self._sender.senden(typ="log", zeile=zeile)
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self) -> bool:
+        return False
+
+
+def suchen(verbindung: Connection, kontaktdaten: Dict, notifications: Dict, zeitrahmen: Dict,
+           ROOT_PATH: str, check_delay: int, kontaktdaten_pfad: str = None):
+    """
+    Führt ImpfterminService.terminsuche aus und meldet Ausgabe, Status und
+    Ergebnis über die Pipe.
+
+    :param verbindung: Sendendes Ende einer multiprocessing.Pipe
+    :param kontaktdaten: Kontaktdaten aus kontaktdaten.json
+    :param notifications: Daten der Benachrichtigungs-Provider
+    :param zeitrahmen: Zeitrahmen aus kontaktdaten.json
+    :param ROOT_PATH: Pfad zur main.py / gui.py
+    :param check_delay: Intervall in Sekunden zwischen jeder Terminsuche
+    :param kontaktdaten_pfad: Pfad zur kontaktdaten.json, deren Änderungen
+        während der Suche übernommen werden
+    """
+
+    sender = _EreignisSender(verbindung)
+
+    # Vor dem Erstellen der Logger umleiten, da diese sys.stdout beim
+    # Erstellen übernehmen
+    sys.stdout = sys.stderr = _EreignisStream(sender)
+    sender.senden(typ="status", status="gestartet", pid=os.getpid())
+
+    from tools.abbruch import Abbruch
+    from tools.clog import stop_all
+    from tools.exceptions import Abgebrochen
+    from tools.its import ImpfterminService
+
+    # Process.terminate() der GUI beendet die Suche sofort, Browser werden
+    # dabei noch geschlossen
+    abbruch = Abbruch()
+    abbruch.bei_signal(signal.SIGTERM)
+
+    erfolg, fehler = True, None
+    try:
+        ImpfterminService.terminsuche(
+            codes=kontaktdaten["codes"], plz_impfzentren=kontaktdaten["plz_impfzentren"],
+            kontakt=kontaktdaten["kontakt"], notifications=notifications, PATH=ROOT_PATH,
+            check_delay=check_delay, zeitrahmen=zeitrahmen, kontaktdaten_pfad=kontaktdaten_pfad,
+            backoff=kontaktdaten.get("backoff"), abbruch=abbruch)
+    except Abgebrochen:
+        erfolg, fehler = False, "Suche abgebrochen"
+    except Exception as error:
+        erfolg, fehler = False, str(error)
+
+    # Ausstehende Log-Zeilen vor dem Ergebnis verschicken
+    stop_all()
+    sender.senden(typ="ergebnis", erfolg=erfolg, fehler=fehler)
+    verbindung.close()
+    sys.exit(0 if erfolg else 1)
@@ -0,0 +1,120 @@
+"""
+Uhr und Zufallsgenerator der Terminsuche.
+
+ImpfterminService, Scheduler, Backoff, Abbruch und Stand-in-Server lesen
+Zeit und Zufall über eine Uhr statt direkt über time, datetime und random.
+Im Normalbetrieb ist das die echte Uhr. Die VirtuelleUhr schläft nicht,
+sondern springt sofort zum Ende der Wartezeit, und ihr Zufallsgenerator hat
+einen festen Seed. So lässt sich eine Terminsuche über viele Stunden
+zusammen mit einem geplanten Terminangebot des Stand-in-Servers in Sekunden
+und reproduzierbar abspielen, siehe tools.benchmark simulation.
+
+Beispiel:
+    uhr = VirtuelleUhr(seed=1)
+    with StandinServer(uhr=uhr.monotonic, schlafen=uhr.schlafen) as server:
+        server.termine_anbieten("68163", nach_sekunden=6 * 60 * 60)
+        ImpfterminService.terminsuche(..., basis_url=server.url, uhr=uhr)
+"""
+
+import random
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+
+class Uhr:
+    """
+    Echte Uhr. Alle Zeitpunkte für Pausen und Fristen stammen aus
+    monotonic, Zeitpunkte für Dateien und Anzeige aus zeit bzw. jetzt.
+    """
+
+    # True, falls Wartezeiten nicht tatsächlich abgewartet werden
+    simuliert = False
+
+    def __init__(self, zufall: random.Random = None):
+        """
+        :param zufall: Zufallsgenerator für Jitter und Auswahl von Terminen,
+            Default: random
+        """
+        self.zufall = zufall or random
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+    def zeit(self) -> float:
+        """
+        :return: Systemzeit in Sekunden seit der Epoche
+        """
+        return time.time()
+
+    def jetzt(self) -> datetime:
+        return datetime.now()
+
+    def schlafen(self, sekunden: float):
+        if sekunden > 0:
+            time.sleep(sekunden)
+
+    def warten(self, ereignis: threading.Event, sekunden: float) -> bool:
+        """
+        Wartet höchstens sekunden auf das Ereignis.
+
+        :return: True, falls das Ereignis gesetzt ist
+        """
+        return ereignis.wait(max(0.0, sekunden))
+
+
+class VirtuelleUhr(Uhr):
+    """
+    Uhr, die nur beim Schlafen vorgestellt wird. Eine Wartezeit kostet keine
+    echte Zeit, der Zufallsgenerator ist mit seed initialisiert. Mehrere
+    Threads dürfen die Uhr gleichzeitig verwenden, z. B. Terminsuche und
+    Stand-in-Server.
+    """
+
+    simuliert = True
+
+    def __init__(self, start: Optional[datetime] = None, seed: Optional[int] = 0):
+        """
+        :param start: Systemzeit zu Beginn. Default: jetzt, auf die volle
+            Stunde abgerundet
+        :param seed: Seed des Zufallsgenerators
+        """
+        super().__init__(random.Random(seed))
+        if start is None:
+            start = datetime.now().replace(minute=0, second=0, microsecond=0)
+        self._start = start.timestamp()
+        self._vergangen = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def vergangen(self) -> float:
+        """
+        :return: Seit dem Start simulierte Sekunden
+        """
+        return self._vergangen
+
+    def monotonic(self) -> float:
+        return self._vergangen
+
+    def zeit(self) -> float:
+        return self._start + self._vergangen
+
+    def jetzt(self) -> datetime:
+        return datetime.fromtimestamp(self.zeit())
+
+    def schlafen(self, sekunden: float):
+        self.vorstellen(sekunden)
+
+    def warten(self, ereignis: threading.Event, sekunden: float) -> bool:
+        if not ereignis.is_set():
+            self.vorstellen(sekunden)
+        return ereignis.is_set()
+
+    def vorstellen(self, sekunden: float):
+        """
+        Stellt die Uhr um sekunden vor.
+        """
+        if sekunden > 0:
+            with self._lock:
+                self._vergangen += sekunden
@@ -1,82 +1,12 @@
 import os
-import time
 import traceback
 import random
-from json import JSONDecodeError
 from pathlib import Path
 from threading import Thread
 
-import requests
-from plyer import notification
-from requests.exceptions import ReadTimeout, ConnectionError, ConnectTimeout
-
 from tools.exceptions import DesktopNotificationError, PushoverNotificationError, TelegramNotificationError
-
-
-def retry_on_failure(retries=10):
-    """Decorator zum Errorhandling beim Ausführen einer Methode im Loop.
-    Timeout's, wie beispiel bei Serverüberlastung, werden ignoriert.
-
-    :param retries: Anzahl der Wiederholungsversuche, bevor abgebrochen wird.
-    :return:
-    """
-
-    def retry_function(function):
-        def wrapper(self, *args, **kwargs):
-            total_rounds = retries
-            rounds = total_rounds
-            while rounds > 0:
-                r = total_rounds - rounds + 1
-                try:
-                    return function(self, *args, **kwargs)
-
-                except (TimeoutError, ReadTimeout):
-                    # ein Timeout-Error kann passieren,
-                    # wenn die Server überlastet sind sind
-                    # hier erfolgt ein Timeout-Error meist,
-                    # wenn die Cookies abgelaufen sind
-
-                    self.log.error("Timeout exception raised", prefix=function.__name__)
-
-                    if function.__name__ != "renew_cookies":
-                        self.renew_cookies()
-
-                except (ConnectTimeout, ConnectionError):
-                    # Keine Internetverbindung
-                    self.log.error("Connection exception | Es besteht keine Internetverbindung,"
-                                   "erneuter Versuch in 30 Sekunden",
-                                   prefix=function.__name__)
-                    time.sleep(30)
-
-                except JSONDecodeError:
-                    # die API gibt eine nicht-JSON-Response,
-                    # wenn die IP (temporär) gebannt ist, oder die Website
-                    # sich im Wartungsmodus befindet
-
-                    self.log.error("JSON parsing exception | IP gebannt oder Website down, "
-                                   "erneuter Versuch in 30 Sekunden",
-                                   prefix=function.__name__)
-                    time.sleep(30)
-
-                    # Cookies erneuern bei der Terminsuche
-                    if function.__name__ == "terminsuche":
-                        self.renew_cookies()
-
-                except Exception as e:
-                    exc = type(e).__name__
-                    self.log.error(f"{exc} exception raised - retry {r}",
-                                   prefix=function.__name__)
-                    if rounds == 1:
-                        err = "\n".join(
-                            x.strip() for x in traceback.format_exc().splitlines()[-3:])
-                        self.log.error(err)
-                        return False
-                    rounds -= 1
-            return False
-
-        return wrapper
-
-    return retry_function
+from tools.cache import BASIS_URL, JsonCache, impfzentren_url
+from tools.impfzentren import Impfzentren
 
 
 def remove_prefix(text, prefix):
@@ -88,20 +18,30 @@ def remove_prefix(text, prefix):
     return text
 
 
-def desktop_notification(operating_system: str, title: str, message: str):
+def desktop_notification(operating_system: str, title: str, message: str,
+                         blockierend: bool = False):
     """
-    Starts a thread and creates a desktop notification using plyer.notification
+    Creates a desktop notification using plyer.notification
+
+    Args:
+        blockierend (bool, optional): Im aufrufenden Thread anzeigen statt in
+            einem eigenen Thread. Defaults to False.
     """
 
     if 'windows' not in operating_system:
         return
 
+    from plyer import notification
+
+    kwargs = dict(
+        app_name="Impfterminservice",
+        title=title,
+        message=message)
     try:
-        Thread(target=notification.notify(
-            app_name="Impfterminservice",
-            title=title,
-            message=message)
-        ).start()
+        if blockierend:
+            notification.notify(**kwargs)
+        else:
+            Thread(target=notification.notify, kwargs=kwargs, daemon=True).start()
     except Exception as exc:
         raise DesktopNotificationError(
             "Error in _desktop_notification: " + str(exc.__class__.__name__)
@@ -118,6 +58,33 @@ def create_missing_dirs(base_path):
     Path(os.path.join(base_path, "data")).mkdir(parents=True, exist_ok=True)
 
 
+def get_impfzentren(PATH: str = None) -> Impfzentren:
+    """
+    Lädt alle Impfzentren in ein Impfzentren-Verzeichnis.
+    Die impfzentren.json wird über den gemeinsamen Cache unter data/cache
+    geladen und nur bei Änderungen erneut heruntergeladen. Wie die
+    Terminsuche verwendet sie VACCIPY_BASIS_URL, falls gesetzt.
+
+    Args:
+        PATH (str, optional): Pfad zum vaccipy-Ordner. Defaults to None.
+
+    Returns:
+        Impfzentren: Verzeichnis mit Indizes nach URL, PLZ und Bundesland
+    """
+
+    import requests
+
+    session = requests.Session()
+    session.headers.update({
+        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 11_2_3) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/89.0.4389.82 Safari/537.36',
+    })
+    url = impfzentren_url(os.getenv("VACCIPY_BASIS_URL") or BASIS_URL)
+    try:
+        return Impfzentren(JsonCache(PATH).laden(url, session))
+    except RuntimeError:
+        return Impfzentren({})
+
+
 def get_grouped_impfzentren() -> dict:
     """
     Gibt ein dict mit allen Impfzentren Grupiert nach den gültigen Codes
@@ -126,26 +93,7 @@ def get_grouped_impfzentren() -> dict:
         dict: Informationen über die Impfzentren
     """
 
-    url = "https://www.impfterminservice.de/assets/static/impfzentren.json"
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 11_2_3) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/89.0.4389.82 Safari/537.36',
-    }
-    impfzentren_sortiert = {}
-    res = requests.get(url, timeout=15, headers=headers)
-    if res.ok:
-        for bundesland, impfzentren in res.json().items():
-            for impfzentrum in impfzentren:
-                url = impfzentrum["URL"]
-                # liste von impfzentren_sortiert oder leere liste
-                impfzentren_gruppiert = impfzentren_sortiert.get(url, [])
-                # impfzentrum zur liste hinzufügen
-                impfzentren_gruppiert.append(impfzentrum)
-                # liste in dict abspeichern
-                impfzentren_sortiert[url] = impfzentren_gruppiert
-    result = {}
-    for gruppe, impfzentren in enumerate(impfzentren_sortiert.values(), start=1):
-        result[f"Gruppe {gruppe}"] = impfzentren
-    return result
+    return get_impfzentren().gruppiert()
 
 
 def update_available():
@@ -169,15 +117,21 @@ def get_current_version():
 
 
 def get_latest_version():
+    import requests
+
     json_url = 'https://api.github.com/repos/iamnotturner/vaccipy/releases/latest'
     latest_version = requests.get(json_url).json()['tag_name']
     return latest_version
 
 
-def pushover_notification(notifications: dict, title: str, message: str):
+def pushover_notification(notifications: dict, title: str, message: str,
+                          session=None, timeout: float = 10):
     if 'app_token' not in notifications or 'user_key' not in notifications:
         return
 
+    if session is None:
+        import requests as session
+
     url = f'https://api.pushover.net/1/messages.json'
     data = {
         'token': notifications['app_token'],
@@ -188,7 +142,7 @@ def pushover_notification(notifications: dict, title: str, message: str):
         'message': message
     }
 
-    r = requests.post(url, data=data)
+    r = session.post(url, data=data, timeout=timeout)
     if r.status_code != 200:
         raise PushoverNotificationError(r.status_code, r.text)
 
@@ -200,10 +154,14 @@ def pushover_validation(notifications: dict):
     return validation_code
 
 
-def telegram_notification(notifications: dict, message: str):
+def telegram_notification(notifications: dict, message: str,
+                          session=None, timeout: float = 10):
     if 'api_token' not in notifications or 'chat_id' not in notifications:
         return
 
+    if session is None:
+        import requests as session
+
     headers = {
         'Accept': 'application/json',
         'User-Agent': 'vaccipy'
@@ -216,7 +174,7 @@ def telegram_notification(notifications: dict, message: str):
         'text': message
     }
 
-    r = requests.get(url, params=params, headers=headers)
+    r = session.get(url, params=params, headers=headers, timeout=timeout)
     if r.status_code != 200:
         raise TelegramNotificationError(r.status_code, r.text)
 
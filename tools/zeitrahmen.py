@@ -0,0 +1,272 @@
+import time
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, List, Sequence, Tuple, Union
+
+from tools.kontaktdaten import decode_wochentag
+from tools.modell import Terminpaar
+
+try:
+    import numpy as np
+
+    ENABLE_NUMPY = True
+except ImportError:
+    ENABLE_NUMPY = False
+
+_MS_PRO_TAG = 24 * 60 * 60 * 1000
+
+# Außerhalb dieser Spanne wird nicht mehr angenommen, dass innerhalb eines
+# Terminsuche-Ergebnisses höchstens ein Wechsel der Zeitzone
+# (Sommer-/Winterzeit) liegt.
+_MAX_SPANNE_KONSTANTER_OFFSET_MS = 60 * _MS_PRO_TAG
+
+# Entspricht date.min / date.max, passt aber in einen int64
+_MIN_MS = -(2 ** 62)
+_MAX_MS = 2 ** 62
+
+# Der 01.01.1970 war ein Donnerstag
+_WOCHENTAG_EPOCHE = 3
+
+
+@lru_cache(maxsize=4096)
+def _utc_offset_ms(viertelstunde: int) -> int:
+    """
+    :param viertelstunde: Zeitpunkt in Viertelstunden seit der Epoche
+    :return: Offset der lokalen Zeitzone zu UTC zu diesem Zeitpunkt in ms
+    """
+    return time.localtime(viertelstunde * 900).tm_gmtoff * 1000
+
+
+def _offset(begin_ms: int) -> int:
+    return _utc_offset_ms(begin_ms // 900000)
+
+
+def _konstanter_offset(min_ms: int, max_ms: int):
+    """
+    :return: Offset zu UTC in ms, falls dieser für alle Zeitpunkte zwischen
+        min_ms und max_ms gleich ist, sonst None
+    """
+    if max_ms - min_ms > _MAX_SPANNE_KONSTANTER_OFFSET_MS:
+        return None
+    offset = _offset(min_ms)
+    return offset if _offset(max_ms) == offset else None
+
+
+class _Termine:
+    """
+    Spaltenweise Darstellung einer "termine"-Antwort: Beginn, lokale
+    Tageszeit und Wochentag je Terminpaar und Position im Terminpaar.
+    Wird einmal je Antwort erstellt und von beliebig vielen
+    ZeitrahmenMatchern ausgewertet.
+    """
+
+    __slots__ = ("anzahl", "breite", "begin", "vorhanden", "tageszeit", "wochentag")
+
+    def __init__(self, terminpaare: Sequence[Union[Terminpaar, Sequence[Dict]]]):
+        self.anzahl = len(terminpaare)
+        self.breite = max((len(tp) for tp in terminpaare), default=0)
+
+        begin = [[0] * self.breite for _ in range(self.anzahl)]
+        vorhanden = [[False] * self.breite for _ in range(self.anzahl)]
+        min_ms, max_ms = _MAX_MS, _MIN_MS
+        for i, tp in enumerate(terminpaare):
+            # Terminpaare aus tools.modell bringen die Zeitstempel bereits mit
+            beginne = tp.begin if isinstance(tp, Terminpaar) else [int(termin["begin"]) for termin in tp]
+            for j, ms in enumerate(beginne):
+                begin[i][j] = ms
+                vorhanden[i][j] = True
+                min_ms = min(min_ms, ms)
+                max_ms = max(max_ms, ms)
+
+        offset = _konstanter_offset(min_ms, max_ms) if self.anzahl else 0
+
+        if ENABLE_NUMPY:
+            self.begin = np.array(begin, dtype=np.int64).reshape(self.anzahl, self.breite)
+            self.vorhanden = np.array(vorhanden, dtype=bool).reshape(self.anzahl, self.breite)
+            if offset is None:
+                offsets = np.vectorize(_offset, otypes=[np.int64])(self.begin)
+            else:
+                offsets = offset
+            lokal = self.begin + offsets
+            self.tageszeit = lokal % _MS_PRO_TAG
+            self.wochentag = (lokal // _MS_PRO_TAG + _WOCHENTAG_EPOCHE) % 7
+        else:
+            self.begin = begin
+            self.vorhanden = vorhanden
+            lokal = [
+                [ms + (_offset(ms) if offset is None else offset) for ms in zeile]
+                for zeile in begin
+            ]
+            self.tageszeit = [[ms % _MS_PRO_TAG for ms in zeile] for zeile in lokal]
+            self.wochentag = [
+                [(ms // _MS_PRO_TAG + _WOCHENTAG_EPOCHE) % 7 for ms in zeile]
+                for zeile in lokal
+            ]
+
+
+class ZeitrahmenMatcher:
+    """
+    Vorkompilierter Zeitrahmen.
+
+    Die Grenzen des validierten Zeitrahmens werden einmalig in
+    Epoch-Millisekunden, eine Bitmaske der erlaubten Wochentage und ein
+    Tageszeit-Fenster umgerechnet. Damit wird eine komplette
+    "termine"-Antwort in einem Durchlauf in angenommene und abgelehnte
+    Terminpaare aufgeteilt - vektorisiert, falls NumPy installiert ist.
+
+    Beispiel:
+        matcher = ZeitrahmenMatcher({'einhalten_bei': '1', 'wochentage': ['Mo']})
+        angenommen, abgelehnt = matcher.aufteilen(res.json()["termine"])
+    """
+
+    __slots__ = ("zeitrahmen", "positionen", "von_ms", "bis_ms",
+                 "von_tageszeit_ms", "bis_tageszeit_ms", "wochentage_maske",
+                 "uneingeschraenkt")
+
+    def __init__(self, zeitrahmen: Dict):
+        """
+        :param zeitrahmen: Zeitrahmen-Dictionary, zum Format siehe
+            tools.kontaktdaten.validate_zeitrahmen
+        """
+
+        self.zeitrahmen = zeitrahmen
+        self.uneingeschraenkt = not zeitrahmen  # Teste auf leeres dict
+        if self.uneingeschraenkt:
+            self.positionen = ()
+            return
+
+        assert zeitrahmen["einhalten_bei"] in ["1", "2", "beide"]
+
+        # Positionen im Terminpaar (0-basiert), für die der Zeitrahmen gilt.
+        # None steht für alle Positionen.
+        einhalten_bei = zeitrahmen["einhalten_bei"]
+        self.positionen = None if einhalten_bei == "beide" else (int(einhalten_bei) - 1,)
+
+        # Datumsgrenzen als lokale Mitternacht in Epoch-Millisekunden,
+        # die obere Grenze exklusiv
+        self.von_ms = _MIN_MS
+        if "von_datum" in zeitrahmen:
+            von_datum = datetime.strptime(zeitrahmen["von_datum"], "%d.%m.%Y")
+            self.von_ms = int(von_datum.timestamp() * 1000)
+        self.bis_ms = _MAX_MS
+        if "bis_datum" in zeitrahmen:
+            bis_datum = datetime.strptime(zeitrahmen["bis_datum"], "%d.%m.%Y")
+            self.bis_ms = int((bis_datum + timedelta(days=1)).timestamp() * 1000)
+
+        # Tageszeit-Fenster in Millisekunden seit Mitternacht, beide Grenzen
+        # inklusiv. "bis_uhrzeit" schließt die gesamte Minute mit ein.
+        self.von_tageszeit_ms = 0
+        if "von_uhrzeit" in zeitrahmen:
+            von_uhrzeit = datetime.strptime(zeitrahmen["von_uhrzeit"], "%H:%M")
+            self.von_tageszeit_ms = (von_uhrzeit.hour * 3600 + von_uhrzeit.minute * 60) * 1000
+        self.bis_tageszeit_ms = _MS_PRO_TAG - 1
+        if "bis_uhrzeit" in zeitrahmen:
+            bis_uhrzeit = datetime.strptime(zeitrahmen["bis_uhrzeit"], "%H:%M")
+            self.bis_tageszeit_ms = (bis_uhrzeit.hour * 3600 + bis_uhrzeit.minute * 60 + 59) * 1000
+
+        self.wochentage_maske = 0b1111111
+        if "wochentage" in zeitrahmen:
+            self.wochentage_maske = 0
+            for wt in zeitrahmen["wochentage"]:
+                self.wochentage_maske |= 1 << decode_wochentag(wt)
+
+    @classmethod
+    def aus(cls, zeitrahmen: Union[Dict, "ZeitrahmenMatcher"]) -> "ZeitrahmenMatcher":
+        """
+        :return: Kompilierter Zeitrahmen; bereits kompilierte Zeitrahmen
+            werden unverändert zurückgegeben.
+        """
+        if isinstance(zeitrahmen, cls):
+            return zeitrahmen
+        return cls(zeitrahmen)
+
+    def __bool__(self) -> bool:
+        return not self.uneingeschraenkt
+
+    def __repr__(self) -> str:
+        return f"ZeitrahmenMatcher({self.zeitrahmen!r})"
+
+    def passt(self, terminpaar: Sequence[Dict]) -> bool:
+        """
+        Checken ob Terminpaar im Zeitrahmen liegt
+
+        :param terminpaar: Terminpaar wie in ImpfterminService.reservierung_finden_mit_code
+        :return: True oder False
+        """
+        return self.aufteilen([terminpaar])[0] != []
+
+    def aufteilen(self, terminpaare: Sequence[Sequence[Dict]]) -> Tuple[List, List]:
+        """
+        Teilt alle Terminpaare einer "termine"-Antwort in einem Durchlauf auf.
+
+        :param terminpaare: Liste an Terminpaaren (tools.modell.Terminpaar
+            oder Listen von Termin-Dictionaries wie in der Antwort)
+        :return: Tupel aus angenommenen und abgelehnten Terminpaaren, jeweils
+            in der ursprünglichen Reihenfolge
+        """
+        if self.uneingeschraenkt:
+            return list(terminpaare), []
+        return self._aufteilen(terminpaare, _Termine(terminpaare))
+
+    @staticmethod
+    def aufteilen_mehrere(matchers: Sequence["ZeitrahmenMatcher"],
+                          terminpaare: Sequence[Sequence[Dict]]) -> List[Tuple[List, List]]:
+        """
+        Wertet eine "termine"-Antwort gegen mehrere Zeitrahmen aus. Die
+        Antwort wird dabei nur einmal aufbereitet.
+
+        :return: Je Matcher ein Tupel wie bei aufteilen
+        """
+        termine = _Termine(terminpaare)
+        return [
+            (list(terminpaare), []) if matcher.uneingeschraenkt
+            else matcher._aufteilen(terminpaare, termine)
+            for matcher in matchers
+        ]
+
+    def _aufteilen(self, terminpaare, termine: _Termine) -> Tuple[List, List]:
+        angenommen, abgelehnt = [], []
+        for tp, ok in zip(terminpaare, self._maske(termine)):
+            (angenommen if ok else abgelehnt).append(tp)
+        return angenommen, abgelehnt
+
+    def _spalten(self, termine: _Termine):
+        if self.positionen is None:
+            return range(termine.breite)
+        return [p for p in self.positionen if p < termine.breite]
+
+    def _maske(self, termine: _Termine) -> List[bool]:
+        """
+        :return: Für jedes Terminpaar, ob es im Zeitrahmen liegt
+        """
+
+        if ENABLE_NUMPY:
+            ok = np.ones(termine.anzahl, dtype=bool)
+            for p in self._spalten(termine):
+                begin = termine.begin[:, p]
+                tageszeit = termine.tageszeit[:, p]
+                im_zeitrahmen = (
+                    (self.von_ms <= begin) & (begin < self.bis_ms)
+                    & (self.von_tageszeit_ms <= tageszeit)
+                    & (tageszeit <= self.bis_tageszeit_ms)
+                    & ((self.wochentage_maske >> termine.wochentag[:, p]) & 1).astype(bool)
+                )
+                ok &= im_zeitrahmen | ~termine.vorhanden[:, p]
+            return ok.tolist()
+
+        spalten = self._spalten(termine)
+        ok = []
+        for i in range(termine.anzahl):
+            begin = termine.begin[i]
+            tageszeit = termine.tageszeit[i]
+            wochentag = termine.wochentag[i]
+            vorhanden = termine.vorhanden[i]
+            ok.append(all(
+                not vorhanden[p] or (
+                    self.von_ms <= begin[p] < self.bis_ms
+                    and self.von_tageszeit_ms <= tageszeit[p] <= self.bis_tageszeit_ms
+                    and (self.wochentage_maske >> wochentag[p]) & 1
+                )
+                for p in spalten
+            ))
+        return ok